@@ -0,0 +1,179 @@
+"""
+Admission control for the model and OCR stages.
+
+Every simplification and OCR call passes through a process-wide
+AdmissionStage before it is queued. A stage counts the requests it has let
+in and estimates how long a new one would wait from the live completion
+rate. Past the degrade threshold requests are served in a cheaper mode
+(greedy decoding, shorter output); past the reject threshold, or when the
+stage is full, they are turned away at once instead of slowing everyone.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from metrics import METRICS
+from ocr_engine import OCR_POOL_SIZE
+
+# Completions considered for the live throughput estimate
+THROUGHPUT_WINDOW_SECONDS = 60.0
+
+# Cheaper decoding used when the model queue is long
+DEGRADED_GENERATION_KWARGS = {
+    "num_beams": 1,
+    "max_new_tokens": int(os.environ.get("DEGRADED_MAX_NEW_TOKENS", "128"))
+}
+
+class Overloaded(Exception):
+    """Request rejected because the stage is past its limits"""
+
+    def __init__(self, stage: str, estimated_wait: float):
+        super().__init__(f"{stage} is overloaded (estimated wait {estimated_wait:.0f} s)")
+        self.stage = stage
+        self.estimated_wait = estimated_wait
+
+class Ticket:
+    """
+    An admitted request; degraded requests should use the cheaper mode.
+
+    Call abandon() for requests that end without a result (cancelled,
+    failed), so they are not counted as completions in the wait estimate.
+    """
+
+    def __init__(self, degraded: bool, estimated_wait: float):
+        self.degraded = degraded
+        self.estimated_wait = estimated_wait
+        self.abandoned = False
+
+    def abandon(self):
+        self.abandoned = True
+
+class AdmissionStage:
+    """
+    Bounded admission for one stage.
+
+    max_queue caps requests admitted and not yet finished. Waits are
+    estimated as (requests ahead) / (completions per busy second over the
+    last THROUGHPUT_WINDOW_SECONDS), or from the mean service time over
+    `concurrency` workers before enough completions have been seen.
+    degrade_wait=None disables the degraded mode.
+    """
+
+    def __init__(self, name: str, max_queue: int, reject_wait: float, degrade_wait: Optional[float] = None,
+                 concurrency: int = 1, metrics=METRICS):
+        self.name = name
+        self.max_queue = max_queue
+        self.reject_wait = reject_wait
+        self.degrade_wait = degrade_wait
+        self.concurrency = max(1, concurrency)
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # (finished at, busy seconds since the previous completion)
+        self._completions = deque()
+        self._busy_since = None
+        self._last_completion = None
+        self._service_seconds = None
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def throughput(self) -> Optional[float]:
+        """Completions per busy second over the window (None until two completions)"""
+        with self._lock:
+            return self._throughput(time.monotonic())
+
+    def _throughput(self, now: float) -> Optional[float]:
+        while self._completions and now - self._completions[0][0] > THROUGHPUT_WINDOW_SECONDS:
+            self._completions.popleft()
+        if len(self._completions) < 2:
+            return None
+        # Idle time between bursts is not counted
+        busy = max(sum(interval for _, interval in self._completions), 1e-3)
+        return len(self._completions) / busy
+
+    def _estimate(self, ahead: int, now: float) -> float:
+        if not ahead:
+            return 0.0
+        rate = self._throughput(now)
+        if rate is not None:
+            return ahead / rate
+        if self._service_seconds is not None:
+            return ahead * self._service_seconds / self.concurrency
+        return 0.0
+
+    def estimated_wait(self) -> float:
+        """Seconds a request admitted now would wait before being served"""
+        with self._lock:
+            return self._estimate(max(0, self._in_flight - self.concurrency + 1), time.monotonic())
+
+    def _admit(self) -> Ticket:
+        with self._lock:
+            now = time.monotonic()
+            ahead = max(0, self._in_flight - self.concurrency + 1)
+            wait = self._estimate(ahead, now)
+            if self._in_flight >= self.max_queue or wait >= self.reject_wait:
+                rejected = True
+            else:
+                rejected = False
+                if not self._in_flight:
+                    self._busy_since = now
+                self._in_flight += 1
+                depth = self._in_flight
+        self.metrics.set(f"admission.{self.name}.estimated_wait_seconds", wait)
+        if rejected:
+            self.metrics.inc(f"admission.{self.name}.rejected")
+            raise Overloaded(self.name, wait)
+        degraded = self.degrade_wait is not None and wait >= self.degrade_wait
+        self.metrics.inc(f"admission.{self.name}.degraded" if degraded else f"admission.{self.name}.admitted")
+        self.metrics.set(f"admission.{self.name}.depth", depth)
+        return Ticket(degraded, wait)
+
+    def _release(self, started: float, completed: bool):
+        finished = time.monotonic()
+        with self._lock:
+            self._in_flight -= 1
+            depth = self._in_flight
+            if completed:
+                since = max(self._busy_since, self._last_completion or self._busy_since)
+                self._completions.append((finished, finished - since))
+                self._last_completion = finished
+                seconds = finished - started
+                self._service_seconds = seconds if self._service_seconds is None else (
+                    0.8 * self._service_seconds + 0.2 * seconds
+                )
+        self.metrics.set(f"admission.{self.name}.depth", depth)
+
+    @contextmanager
+    def admit(self):
+        """Context manager yielding a Ticket; raises Overloaded when shedding"""
+        ticket = self._admit()
+        started = time.monotonic()
+        completed = False
+        try:
+            yield ticket
+            completed = not ticket.abandoned
+        finally:
+            self._release(started, completed)
+
+def _stage_from_env(name: str, max_queue: int, reject_wait: float, degrade_wait: Optional[float],
+                    concurrency: int = 1) -> AdmissionStage:
+    prefix = name.upper()
+    degrade = os.environ.get(f"{prefix}_DEGRADE_WAIT_SECONDS")
+    return AdmissionStage(
+        name,
+        max_queue=int(os.environ.get(f"{prefix}_MAX_QUEUE", max_queue)),
+        reject_wait=float(os.environ.get(f"{prefix}_REJECT_WAIT_SECONDS", reject_wait)),
+        degrade_wait=float(degrade) if degrade else degrade_wait,
+        concurrency=concurrency
+    )
+
+# Process-wide stages shared by all sessions
+SIMPLIFY_ADMISSION = _stage_from_env("simplify", max_queue=32, reject_wait=60.0, degrade_wait=15.0)
+OCR_ADMISSION = _stage_from_env("ocr", max_queue=16, reject_wait=30.0, degrade_wait=None,
+                                concurrency=OCR_POOL_SIZE)
@@ -6,8 +6,37 @@ import io
 import base64
 import tempfile
 import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import ExitStack
 from typing import Optional
 
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from admission import DEGRADED_GENERATION_KWARGS, OCR_ADMISSION, SIMPLIFY_ADMISSION, Overloaded
+from assisted_decoding import DRAFT_MODEL, attach_draft_model, generate_assisted, load_draft_model
+from batch_upload import build_archive, process_files
+from boilerplate import BOILERPLATE_INDEX, BOILERPLATE_STRIP, load_index, strip_boilerplate
+from cancellation import (REQUEST_TIMEOUT_SECONDS, CancelCriteria, CancelToken, GenerationCancelled,
+                          record_abandoned, watch_script_run)
+from compiled_inference import COMPILED_INFERENCE, SEQUENCE_BUCKETS, compile_model, pad_to_bucket
+from corpus import CORPUS_PATH, SOURCE_COLUMN, TARGET_COLUMN, load_corpus
+from decode_tuner import load_decoding_config
+from distill import STUDENT_MODEL_DIR, load_student_model
+from image_ingest import SESSION_IMAGE_PAGES, ImageBudgetError, SessionImageBudget, ingest_image
+from inference_scheduler import InferenceScheduler
+from kv_cache_pool import STATIC_KV_CACHE, generate_with_static_cache
+from layout_ocr import recognize_layout
+from memory_monitor import MEMORY
+from metrics import METRICS
+from near_duplicates import NEAR_DUP_SEED_CORPUS, NEAR_DUP_THRESHOLD, NearDuplicateIndex
+from ocr_engine import OCR_POOL_SIZE, TESSEROCR_AVAILABLE, create_ocr_engine
+from pdf_ingest import MAX_PDF_PAGES, PYMUPDF_AVAILABLE, extract_pdf_pages, pdf_pages_text
+from replica_pool import DEFAULT_LOADER, REPLICA_TIMEOUT_SECONDS, ReplicaPool
+from report_sections import SECTION_PRIORITY, SECTION_TITLES, parse_sections, prioritize_sections
+from vocab_shortlist import VOCAB_SHORTLIST, generate_with_shortlist, load_shortlist
+
 # Optional imports with graceful fallbacks
 try:
     import spacy
@@ -23,7 +52,7 @@ except ImportError:
 
 try:
     import torch
-    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, StoppingCriteriaList
     TORCH_AVAILABLE = True
 except ImportError:
     TORCH_AVAILABLE = False
@@ -49,714 +78,41 @@ def check_spacy_model():
 
 # Check Tesseract availability
 def check_tesseract():
-    """Check if Tesseract is available"""
-    if not TESSERACT_AVAILABLE:
-        return False
-    
-    try:
-        pytesseract.get_tesseract_version()
-        return True
-    except Exception:
-        return False
+    """Check if Tesseract is available (probed once per process, not per session)"""
+    return load_ocr_engine() is not None
 
-# Store Tesseract availability in session state
-if 'tesseract_available' not in st.session_state:
-    st.session_state.tesseract_available = check_tesseract()
-
-# Page configuration
-st.set_page_config(
-    page_title="Medical Report Simplification",
-    page_icon="🏥",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Custom CSS for better styling
-st.markdown("""
-<style>
-    /* Main background */
-    .main .block-container {
-        background-color: #ffffff;
-        padding-top: 2rem;
-        padding-bottom: 2rem;
-    }
-    
-    /* Full page white background */
-    .stApp {
-        background-color: #ffffff;
-    }
-    
-    .stApp > header {
-        background-color: #ffffff;
-    }
-    
-    .stApp > div {
-        background-color: #ffffff;
-    }
-    
-    /* Sidebar background - gray styling */
-    .css-1d391kg {
-        background-color: #f3f4f6 !important;
-    }
-    
-    .css-1lcbmhc {
-        background-color: #f3f4f6 !important;
-    }
-    
-    /* Additional sidebar selectors */
-    section[data-testid="stSidebar"] {
-        background-color: #f3f4f6 !important;
-    }
-    
-    section[data-testid="stSidebar"] > div {
-        background-color: #f3f4f6 !important;
-    }
-    
-    .css-1v0mbdj {
-        background-color: #f3f4f6 !important;
-    }
-    
-    .css-1v0mbdj > div {
-        background-color: #f3f4f6 !important;
-    }
-    
-    /* Sidebar content styling */
-    .css-1v0mbdj .css-1v0mbdj {
-        background-color: #f3f4f6 !important;
-    }
-    
-    /* Sidebar text styling */
-    .css-1v0mbdj h1,
-    .css-1v0mbdj h2,
-    .css-1v0mbdj h3,
-    .css-1v0mbdj p,
-    .css-1v0mbdj div {
-        color: #000000 !important;
-    }
-    
-    /* Radio button styling */
-    .stRadio > div > label > div[data-testid="stMarkdownContainer"] {
-        color: #000000 !important;
-        font-weight: 500;
-    }
-    
-    .stRadio > div > label > div[data-testid="stMarkdownContainer"]:hover {
-        color: #374151 !important;
-    }
-    
-    /* Sidebar section headers */
-    .css-1v0mbdj h2 {
-        color: #000000 !important;
-        font-weight: 700;
-        margin-bottom: 1rem;
-    }
-    
-    /* Sidebar tips styling */
-    .css-1v0mbdj h3 {
-        color: #000000 !important;
-        font-weight: 600;
-        margin-top: 1.5rem;
-        margin-bottom: 0.5rem;
-    }
-    
-    /* Sidebar list styling */
-    .css-1v0mbdj ul {
-        color: #374151 !important;
-        line-height: 1.6;
-    }
-    
-    .css-1v0mbdj li {
-        margin-bottom: 0.5rem;
-        color: #374151 !important;
-    }
-    
-    /* Main content area */
-    .main .block-container {
-        background-color: #ffffff;
-    }
-    
-    /* Report view */
-    .reportview-container {
-        background-color: #ffffff;
-    }
-    
-    .reportview-container .main .block-container {
-        background-color: #ffffff;
-    }
-    
-    /* Header styling */
-    .main-header {
-        font-size: 3.5rem;
-        color: #000000 !important;
-        text-align: center;
-        margin-bottom: 1rem;
-        font-weight: 800;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .subtitle {
-        font-size: 1.3rem;
-        color: #000000 !important;
-        text-align: center;
-        margin-bottom: 3rem;
-        font-weight: 500;
-        letter-spacing: 0.5px;
-    }
-    
-    /* Section styling */
-    .input-section {
-        background-color: #ffffff;
-        padding: 2rem;
-        border-radius: 12px;
-        margin-bottom: 2rem;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-        border: 1px solid #e5e7eb;
-    }
-    
-    .output-section {
-        background-color: #ffffff;
-        padding: 2rem;
-        border-radius: 12px;
-        border: 1px solid #e5e7eb;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-    }
-    
-    /* Button styling */
-    .stButton > button {
-        width: 100%;
-        background-color: #2563eb;
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.75rem 1.5rem;
-        font-size: 1rem;
-        font-weight: 600;
-        transition: all 0.2s ease;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-    }
-    
-    .stButton > button:hover {
-        background-color: #1d4ed8;
-        transform: translateY(-1px);
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.15);
-    }
-    
-    .stButton > button:active {
-        transform: translateY(0);
-    }
-    
-    /* Download button styling */
-    .stDownloadButton > button {
-        width: 100%;
-        background-color: #059669 !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 8px !important;
-        padding: 0.75rem 1.5rem !important;
-        font-size: 1rem !important;
-        font-weight: 600 !important;
-        transition: all 0.2s ease !important;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1) !important;
-        margin-top: 1rem !important;
-    }
-    
-    .stDownloadButton > button:hover {
-        background-color: #047857 !important;
-        transform: translateY(-1px) !important;
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.15) !important;
-    }
-    
-    .stDownloadButton > button:active {
-        transform: translateY(0) !important;
-    }
-    
-    /* Ensure download button text is visible */
-    .stDownloadButton > button > div {
-        color: white !important;
-    }
-    
-    .stDownloadButton > button > div > div {
-        color: white !important;
-    }
-    
-    /* Sidebar styling */
-    .css-1d391kg {
-        background-color: #f3f4f6;
-    }
-    
-    /* Text area styling */
-    .stTextArea > div > div > textarea {
-        border-radius: 8px;
-        border: 1px solid #d1d5db;
-        font-size: 1rem;
-        line-height: 1.5;
-        background-color: #ffffff;
-        color: #000000 !important;
-        transition: all 0.2s ease;
-    }
-    
-    .stTextArea > div > div > textarea:focus {
-        border-color: #2563eb;
-        box-shadow: 0 0 0 2px rgba(37, 99, 235, 0.1);
-        outline: none;
-        color: #000000 !important;
-    }
-    
-    .stTextArea > div > div > textarea:hover {
-        border-color: #9ca3af;
-        color: #000000 !important;
-    }
-    
-    /* Force dark text in all text areas */
-    .stTextArea textarea {
-        color: #000000 !important;
-    }
-    
-    .stTextArea textarea::placeholder {
-        color: #6b7280 !important;
-    }
-    
-    /* Override any text selection highlighting */
-    .stTextArea textarea::selection {
-        background-color: #d1d5db !important;
-        color: #000000 !important;
-    }
-    
-    /* Ensure text in disabled text areas is also dark */
-    .stTextArea textarea:disabled {
-        color: #000000 !important;
-        background-color: #f9fafb !important;
-    }
-    
-    /* Specific styling for extracted text area */
-    .stTextArea[data-testid="stTextArea"] textarea {
-        color: #000000 !important;
-        background-color: #ffffff !important;
-    }
-    
-    /* Override any highlighting or selection in text areas */
-    .stTextArea textarea::-moz-selection {
-        background-color: #d1d5db !important;
-        color: #000000 !important;
-    }
-    
-    .stTextArea textarea::-webkit-selection {
-        background-color: #d1d5db !important;
-        color: #000000 !important;
-    }
-    
-    /* Force dark text in all text area content */
-    .stTextArea * {
-        color: #000000 !important;
-    }
-    
-    /* Override any Streamlit default text styling */
-    .stTextArea .stMarkdown {
-        color: #000000 !important;
-    }
-    
-    .stTextArea .stMarkdown * {
-        color: #000000 !important;
-    }
-    
-    /* Remove any background highlighting */
-    .stTextArea textarea {
-        background-color: #ffffff !important;
-        background-image: none !important;
-    }
-    
-    /* Additional overrides for extracted text specifically */
-    div[data-testid="stTextArea"] textarea {
-        color: #000000 !important;
-        background-color: #ffffff !important;
-        background-image: none !important;
-    }
-    
-    /* Override any markdown rendering in text areas */
-    .stTextArea .markdown-text {
-        color: #000000 !important;
-    }
-    
-    /* Force all text content to be black */
-    .stTextArea .stText {
-        color: #000000 !important;
-    }
-    
-    /* Remove any text highlighting effects */
-    .stTextArea textarea:not(:focus) {
-        color: #000000 !important;
-        background-color: #ffffff !important;
-    }
-    
-    /* Override any Streamlit default text colors */
-    .stTextArea .stTextInput > div > div > input,
-    .stTextArea .stTextInput > div > div > textarea {
-        color: #000000 !important;
-    }
-    
-    /* Specific styling for extracted text display */
-    .stTextArea textarea[disabled] {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-        opacity: 1 !important;
-    }
-    
-    /* Force black text in disabled text areas */
-    .stTextArea textarea:disabled {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-        opacity: 1 !important;
-    }
-    
-    /* Override any white text in text areas */
-    .stTextArea textarea {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-    }
-    
-    /* Target the specific extracted text area */
-    div[data-testid="stTextArea"] textarea[disabled] {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-        opacity: 1 !important;
-    }
-    
-    /* Override any CSS that might be making text white */
-    .stTextArea textarea,
-    .stTextArea textarea:disabled,
-    .stTextArea textarea:read-only {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-        opacity: 1 !important;
-    }
-    
-    /* Additional overrides for Streamlit text areas */
-    .stTextArea .stTextInput textarea {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-    }
-    
-    /* Force text color in all possible text area states */
-    .stTextArea textarea[readonly],
-    .stTextArea textarea[disabled="true"],
-    .stTextArea textarea[aria-readonly="true"] {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-        opacity: 1 !important;
-    }
-    
-    /* Override any Streamlit default disabled text styling */
-    .stTextArea .stTextInput > div > div > textarea[disabled] {
-        color: #000000 !important;
-        -webkit-text-fill-color: #000000 !important;
-        opacity: 1 !important;
-    }
-    
-    /* Universal text color override for text areas */
-    .stTextArea * {
-        color: #000000 !important;
-    }
-    
-    /* Specific override for extracted text content */
-    .stTextArea .stMarkdown,
-    .stTextArea .stMarkdown *,
-    .stTextArea .stText,
-    .stTextArea .stText * {
-        color: #000000 !important;
-    }
-    
-    /* File uploader styling */
-    .stFileUploader > div {
-        border-radius: 8px;
-        border: 2px dashed #d1d5db;
-        background-color: #ffffff !important;
-        transition: all 0.2s ease;
-        padding: 1.5rem;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
-    }
-    
-    .stFileUploader > div:hover {
-        border-color: #9ca3af;
-        background-color: #ffffff !important;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-    }
-    
-    /* Force white background for all file uploader containers */
-    .stFileUploader > div > div {
-        background-color: #ffffff !important;
-    }
-    
-    .stFileUploader > div > div > div {
-        background-color: #ffffff !important;
-    }
-    
-    /* File uploader text styling */
-    .stFileUploader label {
-        color: #374151 !important;
-    }
-    
-    .stFileUploader p {
-        color: #6b7280 !important;
-    }
-    
-    .stFileUploader div {
-        color: #6b7280 !important;
-    }
-    
-    /* File uploader button styling */
-    .stFileUploader button {
-        background-color: #f3f4f6 !important;
-        color: #374151 !important;
-        border: 1px solid #d1d5db !important;
-        border-radius: 6px !important;
-    }
-    
-    .stFileUploader button:hover {
-        background-color: #e5e7eb !important;
-        color: #1f2937 !important;
-    }
-    
-    /* Additional file uploader styling */
-    .stFileUploader .uploadedFile {
-        background-color: #f9fafb !important;
-        border: 1px solid #d1d5db !important;
-        color: #374151 !important;
-    }
-    
-    .stFileUploader .uploadedFile:hover {
-        background-color: #f3f4f6 !important;
-    }
-    
-    /* File uploader icon styling */
-    .stFileUploader svg {
-        color: #6b7280 !important;
-    }
-    
-    /* File uploader drag and drop text */
-    .stFileUploader .uploadedFileData {
-        color: #374151 !important;
-    }
-    
-    /* File uploader status messages */
-    .stFileUploader .uploadedFileStatus {
-        color: #6b7280 !important;
-    }
-    
-    /* Comprehensive file uploader white background */
-    .stFileUploader * {
-        background-color: #ffffff !important;
-    }
-    
-    /* Override any dark backgrounds in file uploader */
-    .stFileUploader .uploadedFile {
-        background-color: #ffffff !important;
-    }
-    
-    .stFileUploader .uploadedFileData {
-        background-color: #ffffff !important;
-    }
-    
-    /* File uploader drag area */
-    .stFileUploader .uploadedFileData > div {
-        background-color: #ffffff !important;
-    }
-    
-    /* File uploader content area */
-    .stFileUploader .uploadedFileData > div > div {
-        background-color: #ffffff !important;
-    }
-    
-    /* Success/Error messages */
-    .stSuccess {
-        background-color: #d4edda;
-        border: 1px solid #c3e6cb;
-        border-radius: 10px;
-        padding: 1rem;
-    }
-    
-    .stError {
-        background-color: #f8d7da;
-        border: 1px solid #f5c6cb;
-        border-radius: 10px;
-        padding: 1rem;
-    }
-    
-    .stWarning {
-        background-color: #fff3cd;
-        border: 1px solid #ffeaa7;
-        border-radius: 10px;
-        padding: 1rem;
-    }
-    
-    /* Footer styling */
-    .footer {
-        background-color: #ffffff;
-        color: #6b7280 !important;
-        padding: 1rem 2rem;
-        margin-top: 3rem;
-        text-align: center;
-        border-top: 1px solid #e5e7eb;
-        font-size: 0.9rem;
-    }
-    
-    .team-names {
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        gap: 1rem;
-        flex-wrap: wrap;
-        margin-top: 0.5rem;
-    }
-    
-    .team-member {
-        color: #6b7280 !important;
-        font-weight: 500;
-    }
-    
-    /* Instructions styling */
-    .instructions {
-        background-color: #f8fafc;
-        padding: 2rem;
-        border-radius: 8px;
-        border-left: 4px solid #2563eb;
-        margin-top: 2rem;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
-    }
-    
-    /* Additional white background coverage */
-    body {
-        background-color: #ffffff !important;
-        color: #000000 !important;
-    }
-    
-    /* Global text color override */
-    * {
-        color: #000000 !important;
-    }
-    
-    /* Specific text elements */
-    h1, h2, h3, h4, h5, h6 {
-        color: #000000 !important;
-    }
-    
-    p, div, span, label {
-        color: #000000 !important;
-    }
-    
-    /* Streamlit specific text elements */
-    .stMarkdown {
-        color: #000000 !important;
-    }
-    
-    .stMarkdown p {
-        color: #000000 !important;
-    }
-    
-    .stMarkdown h1,
-    .stMarkdown h2,
-    .stMarkdown h3,
-    .stMarkdown h4,
-    .stMarkdown h5,
-    .stMarkdown h6 {
-        color: #000000 !important;
-    }
-    
-    /* Main content text */
-    .main .block-container * {
-        color: #000000 !important;
-    }
-    
-    /* Sidebar text */
-    .css-1d391kg * {
-        color: #000000 !important;
-    }
-    
-    /* Additional sidebar elements */
-    section[data-testid="stSidebar"] * {
-        color: #000000 !important;
-    }
-    
-    /* Sidebar radio buttons */
-    .stRadio > div {
-        background-color: #f3f4f6 !important;
-    }
-    
-    /* Sidebar markdown elements */
-    .css-1v0mbdj .stMarkdown {
-        color: #000000 !important;
-    }
-    
-    .css-1v0mbdj .stMarkdown * {
-        color: #000000 !important;
-    }
-    
-    /* Instructions text */
-    .instructions * {
-        color: #000000 !important;
-    }
-    
-    /* Footer text */
-    .footer * {
-        color: #000000 !important;
-    }
-    
-    .stApp > div > div > div > div {
-        background-color: #ffffff;
-    }
-    
-    .stApp > div > div > div > div > div {
-        background-color: #ffffff;
-    }
-    
-    /* Ensure all containers are white */
-    div[data-testid="stAppViewContainer"] {
-        background-color: #ffffff;
-    }
-    
-    div[data-testid="stSidebar"] {
-        background-color: #ffffff;
-    }
-    
-    div[data-testid="stSidebar"] > div {
-        background-color: #ffffff;
-    }
-    
-    /* Ensure sidebar is visible on Streamlit Cloud */
-    .css-1d391kg {
-        display: block !important;
-        visibility: visible !important;
-    }
+@st.cache_resource
+def load_ocr_engine():
+    """Persistent OCR engine shared by all sessions (tesserocr handle pool, pytesseract fallback)"""
+    return create_ocr_engine()
+
+# Static page assets (CSS/JS) live next to the app
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+@st.cache_resource
+def load_page_assets() -> str:
+    """Read the custom CSS/JS once per process and build the markup injected into the page"""
+    with open(os.path.join(ASSETS_DIR, "styles.css"), "r") as f:
+        css = f.read()
+    with open(os.path.join(ASSETS_DIR, "sidebar.js"), "r") as f:
+        js = f.read()
+    return f"<style>\n{css}</style>\n\n<script>\n{js}</script>\n"
+
+def configure_page():
+    """Page configuration, custom styling and per-session checks"""
+    st.set_page_config(
+        page_title="Medical Report Simplification",
+        page_icon="🏥",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
     
-    .css-1lcbmhc {
-        display: block !important;
-        visibility: visible !important;
-    }
+    # Custom CSS for better styling (read from disk only once per process)
+    st.markdown(load_page_assets(), unsafe_allow_html=True)
     
-    section[data-testid="stSidebar"] {
-        display: block !important;
-        visibility: visible !important;
-    }
-    
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-</style>
-
-<script>
-// Force sidebar to be visible on Streamlit Cloud
-window.addEventListener('load', function() {
-    setTimeout(function() {
-        const sidebar = document.querySelector('section[data-testid="stSidebar"]');
-        if (sidebar) {
-            sidebar.style.display = 'block';
-            sidebar.style.visibility = 'visible';
-            sidebar.style.width = '21rem';
-        }
-    }, 1000);
-});
-</script>
-""", unsafe_allow_html=True)
+    # Store Tesseract availability in session state
+    if 'tesseract_available' not in st.session_state:
+        st.session_state.tesseract_available = check_tesseract()
 
 @st.cache_resource
 def load_spacy_model():
@@ -769,8 +125,11 @@ def load_spacy_model():
         # Return None silently - no warning message
         return None
 
+# "lora" (FLAN-T5-base with LoRA adapters) or "student" (distilled model from distill.py)
+MODEL_VARIANT = os.environ.get("MODEL_VARIANT", "lora")
+
 @st.cache_resource
-def load_medical_model():
+def load_medical_model(variant: str = MODEL_VARIANT):
     """Load the trained medical simplification model"""
     if not TORCH_AVAILABLE:
         st.warning("⚠️ PyTorch and Transformers not available. Model loading disabled.")
@@ -778,6 +137,14 @@ def load_medical_model():
     
     import os  # Import os at the top of the function
     try:
+        if variant == "student":
+            if not os.path.exists(STUDENT_MODEL_DIR):
+                st.error(f"Student model directory not found: {STUDENT_MODEL_DIR}")
+                return None, None
+            model, tokenizer = load_student_model(STUDENT_MODEL_DIR)
+            st.success("✅ Loaded distilled student model")
+            return model, tokenizer
+        
         # Check if the model directory exists
         model_path = "./medical_lora_adapters"
         if not os.path.exists(model_path):
@@ -890,15 +257,29 @@ def load_medical_model():
         st.error(f"Error loading medical model: {str(e)}")
         return None, None
 
+# Split large pages into text blocks before OCR (set LAYOUT_OCR=0 for whole-page --psm 6)
+LAYOUT_OCR = os.environ.get("LAYOUT_OCR", "1") != "0"
+
+def recognize_text(image: Image.Image, engine) -> str:
+    """OCR behind the admission stage; raises on errors (no UI calls, safe in worker threads)"""
+    with OCR_ADMISSION.admit(), MEMORY.stage("ocr"):
+        # Images are passed to Tesseract in memory (no temp files with tesserocr)
+        if LAYOUT_OCR:
+            # Large pages: text blocks are recognized in parallel and joined in reading order
+            return recognize_layout(image, engine)["text"]
+        return engine.recognize(image, psm=6)
+
 def extract_text_from_image(image: Image.Image) -> str:
     """Extract text from image using OCR (Tesseract)"""
-    if not TESSERACT_AVAILABLE:
+    engine = load_ocr_engine()
+    if engine is None:
         return "Error: Tesseract OCR not available. Please install tesseract-ocr system package."
     
     try:
-        # Convert PIL image to format suitable for Tesseract
-        text = pytesseract.image_to_string(image, config='--psm 6')
-        return text.strip()
+        return recognize_text(image, engine)
+    except Overloaded as e:
+        st.warning(f"⏳ OCR is busy right now (estimated wait {e.estimated_wait:.0f} s). Please try again in a minute.")
+        return ""
     except Exception as e:
         error_msg = str(e)
         if "tesseract is not installed" in error_msg.lower() or "tesseract" in error_msg.lower():
@@ -924,18 +305,203 @@ def preprocess_text(text: str, nlp) -> str:
         return text
     
     try:
-        doc = nlp(text)
-        # Basic preprocessing - remove extra whitespace and clean up
-        processed_text = " ".join([token.text for token in doc if not token.is_space])
+        with MEMORY.stage("preprocess"):
+            doc = nlp(text)
+            # Basic preprocessing - remove extra whitespace and clean up
+            processed_text = " ".join([token.text for token in doc if not token.is_space])
         return processed_text
     except Exception as e:
         st.warning(f"Text preprocessing failed: {str(e)}")
         return text
 
-def simplify_medical_report(text: str, model, tokenizer) -> str:
+@st.cache_resource
+def get_token_counter():
+    """Input token count with the model's tokenizer (None if it cannot be loaded)"""
+    if not TORCH_AVAILABLE:
+        return None
+    for source in ("./medical_lora_adapters", "google/flan-t5-base"):
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(source)
+            return lambda text: len(tokenizer(text)["input_ids"])
+        except Exception:
+            continue
+    return None
+
+def remove_boilerplate(text: str):
+    """(text, stats) with page numbers and learned boilerplate removed before preprocessing"""
+    if not BOILERPLATE_STRIP:
+        return text, None
+    index = load_index(BOILERPLATE_INDEX) if BOILERPLATE_INDEX else None
+    cleaned, stats = strip_boilerplate(text, index, count_tokens=get_token_counter(), max_tokens=MAX_INPUT_TOKENS)
+    # Nothing but boilerplate: better to simplify it as it is
+    if not stats["removed"] or not cleaned.strip():
+        return text, None
+    return cleaned, stats
+
+# Decoding settings shared by every simplification
+# Hand-picked settings; decode_tuner.py measures its baseline with these
+DEFAULT_GENERATION_KWARGS = {
+    "max_new_tokens": 256,
+    "num_beams": 4,
+    "early_stopping": True,
+    "do_sample": False,
+    "temperature": 0.7,
+    "repetition_penalty": 1.1
+}
+GENERATION_KWARGS = dict(DEFAULT_GENERATION_KWARGS)
+
+# Prompt truncation length in tokens
+DEFAULT_MAX_INPUT_TOKENS = 512
+MAX_INPUT_TOKENS = DEFAULT_MAX_INPUT_TOKENS
+
+# Operating points chosen by decode_tuner.py (DECODING_CONFIG), if it has been run
+DECODING_SETTINGS = load_decoding_config()
+if DECODING_SETTINGS:
+    GENERATION_KWARGS.update(DECODING_SETTINGS["generation_kwargs"])
+    MAX_INPUT_TOKENS = DECODING_SETTINGS.get("max_input_tokens", MAX_INPUT_TOKENS)
+    DEGRADED_GENERATION_KWARGS.update(DECODING_SETTINGS.get("degraded_generation_kwargs", {}))
+
+def generate_simplifications(texts, model, tokenizer, generation_kwargs: Optional[dict] = None,
+                             cancel_tokens: Optional[list] = None) -> list:
+    """
+    Run one batched generate call and return the simplified text for each input
+
+    With one cancel token per text, decoding stops early once all of them
+    are cancelled (the outputs are then incomplete).
+    """
+    # Add a prompt to help the model understand the task better
+    prompts = [f"Simplify this medical text for patients: {text}" for text in texts]
+    
+    # Tokenize input (padded to the longest report in the batch)
+    inputs = tokenizer(prompts, return_tensors="pt", max_length=MAX_INPUT_TOKENS, truncation=True, padding=True)
+    buckets = getattr(model, "_sequence_buckets", None) or (SEQUENCE_BUCKETS if STATIC_KV_CACHE else None)
+    if buckets:
+        # Compiled models only see the warmed-up lengths; static caches are pooled by shape
+        inputs = pad_to_bucket(inputs, buckets, tokenizer.pad_token_id)
+    
+    # Move to same device as model
+    device = next(model.parameters()).device
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+    
+    # Generate simplified text; with a draft attached, assisted decoding replaces beam search
+    # (it reproduces greedy output) unless the caller asks for beams
+    assisted = getattr(model, "_draft_model", None) is not None
+    generation_kwargs = {**GENERATION_KWARGS, **({"num_beams": 1} if assisted else {}), **(generation_kwargs or {})}
+    if cancel_tokens and all(token is not None for token in cancel_tokens):
+        generation_kwargs["stopping_criteria"] = StoppingCriteriaList([CancelCriteria(cancel_tokens)])
+    with torch.no_grad(), MEMORY.stage("generation"):
+        if assisted and generation_kwargs.get("num_beams", 1) == 1:
+            outputs = generate_assisted(model, inputs, generation_kwargs)
+        elif VOCAB_SHORTLIST:
+            outputs = generate_with_shortlist(
+                model, inputs, generation_kwargs, load_shortlist(VOCAB_SHORTLIST),
+                generate_with_static_cache if STATIC_KV_CACHE else None
+            )
+        elif STATIC_KV_CACHE:
+            outputs = generate_with_static_cache(model, inputs, generation_kwargs)
+        else:
+            outputs = model.generate(**inputs, **generation_kwargs)
+    
+    # Decode the output
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+def get_model_type(model) -> str:
+    """Check if we're using LoRA model or base model"""
+    if hasattr(model, '_model_type'):
+        # Set by loaders that rebuild the model (e.g. merged shared weights)
+        return model._model_type
+    elif hasattr(model, 'peft_config'):
+        return "LoRA-adapted FLAN-T5 (PEFT)"
+    elif hasattr(model, '_lora_weights_available') and model._lora_weights_available:
+        return "LoRA-adapted FLAN-T5 (Direct weights)"
+    else:
+        return "Base FLAN-T5"
+
+# Model worker processes: unset/0 runs the model in this process, "auto" sizes from
+# the core count and the throughput measured by `python replica_pool.py --measure`
+REPLICA_WORKERS = os.environ.get("REPLICA_WORKERS", "0")
+
+# How replicas load the model, e.g. "shared_weights:load_shared_model" for memory-mapped weights
+REPLICA_LOADER = os.environ.get("REPLICA_LOADER", DEFAULT_LOADER)
+
+@st.cache_resource
+def get_replica_pool():
+    """Pinned model worker processes shared by all sessions"""
+    return ReplicaPool(None if REPLICA_WORKERS == "auto" else int(REPLICA_WORKERS), loader=REPLICA_LOADER)
+
+def replica_simplify(pool, text: str, generation_kwargs: Optional[dict] = None,
+                     timeout: float = REPLICA_TIMEOUT_SECONDS) -> dict:
+    """pool.simplify(), with a dead, missing or hung replica reported like any other model error"""
+    try:
+        return pool.simplify(text, timeout=timeout or None, generation_kwargs=generation_kwargs)
+    except Exception as e:
+        return {
+            "error": True,
+            "error_message": (f"The model did not answer within {timeout:.0f} seconds. Please try again."
+                              if isinstance(e, FutureTimeoutError) else str(e)),
+            "original_text": text,
+            "simplified_text": None,
+            "model_type": None,
+            "original_length": len(text),
+            "simplified_length": 0,
+            "reduction_percentage": 0
+        }
+
+@st.cache_resource
+def get_compiled_model(_model, _tokenizer):
+    """Compiled, warmed-up copy of the shared model, built once (COMPILED_INFERENCE=1)"""
+    if _model is None or _tokenizer is None:
+        return _model
+    with st.spinner("Compiling the model (one-time warm-up)..."):
+        model = compile_model(_model, _tokenizer, generation_kwargs=GENERATION_KWARGS,
+                              model_type=get_model_type(_model))
+    if model._compile_report["mode"] != "compiled":
+        st.warning(f"⚠️ Compiled inference unavailable, using eager mode: {model._compile_report['error']}")
+    return model
+
+@st.cache_resource
+def get_assisted_model(_model):
+    """Attach the DRAFT_MODEL draft for assisted greedy decoding"""
+    if _model is None:
+        return _model
+    try:
+        with st.spinner("Loading draft model..."):
+            return attach_draft_model(_model, load_draft_model(DRAFT_MODEL))
+    except Exception as e:
+        st.warning(f"⚠️ Draft model unavailable, using standard decoding: {str(e)}")
+        return _model
+
+@st.cache_resource
+def get_inference_scheduler(_model, _tokenizer):
+    """Single scheduler thread that owns the shared model for all sessions"""
+    if _model is None or _tokenizer is None:
+        return None
+    return InferenceScheduler(
+        lambda texts, generation_kwargs, cancel_tokens: generate_simplifications(
+            texts, _model, _tokenizer, generation_kwargs, cancel_tokens
+        ),
+        cancellable=True
+    )
+
+def get_session_id() -> Optional[str]:
+    """Streamlit session id of the current script run (None outside Streamlit)"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+def simplify_medical_report(text: str, model, tokenizer, scheduler=None, session_id: Optional[str] = None,
+                            generation_kwargs: Optional[dict] = None, submitted: Optional[tuple] = None) -> str:
     """
     Simplify medical report using the trained LoRA model
+    
+    With a scheduler the request is queued behind other sessions' requests and
+    batched with them; without one the model is called directly. The request
+    is abandoned when the calling script run is stopped (new submit, closed
+    tab) or after REQUEST_TIMEOUT_SECONDS. `submitted` is a (future, cancel
+    token) pair already queued with the scheduler.
     """
+    cancel_token = submitted[1] if submitted else CancelToken(
+        REQUEST_TIMEOUT_SECONDS, watch_script_run(get_script_run_ctx(suppress_warning=True))
+    )
     try:
         if model is None or tokenizer is None:
             return {
@@ -949,38 +515,19 @@ def simplify_medical_report(text: str, model, tokenizer) -> str:
                 "reduction_percentage": 0
             }
         
-        # Add a prompt to help the model understand the task better
-        prompt = f"Simplify this medical text for patients: {text}"
-        
-        # Tokenize input
-        inputs = tokenizer(prompt, return_tensors="pt", max_length=512, truncation=True)
-        
-        # Move to same device as model
-        device = next(model.parameters()).device
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Generate simplified text
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=256,
-                num_beams=4,
-                early_stopping=True,
-                do_sample=False,
-                temperature=0.7,
-                repetition_penalty=1.1
+        if scheduler is not None:
+            future = submitted[0] if submitted else scheduler.submit(
+                text, session_id, generation_kwargs, cancel_token=cancel_token
             )
-        
-        # Decode the output
-        simplified_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Check if we're using LoRA model or base model
-        if hasattr(model, 'peft_config'):
-            model_type = "LoRA-adapted FLAN-T5 (PEFT)"
-        elif hasattr(model, '_lora_weights_available') and model._lora_weights_available:
-            model_type = "LoRA-adapted FLAN-T5 (Direct weights)"
+            simplified_text = scheduler.result(future, cancel_token)
         else:
-            model_type = "Base FLAN-T5"
+            started = time.perf_counter()
+            simplified_text = generate_simplifications([text], model, tokenizer, generation_kwargs, [cancel_token])[0]
+            if cancel_token.cancelled:
+                record_abandoned(cancel_token, time.perf_counter() - started)
+                raise GenerationCancelled(cancel_token.reason)
+        
+        model_type = get_model_type(model)
         
         # Return a structured result for Streamlit display
         return {
@@ -992,6 +539,19 @@ def simplify_medical_report(text: str, model, tokenizer) -> str:
             "original_text": text
         }
         
+    except GenerationCancelled as e:
+        return {
+            "error": True,
+            "cancel_reason": e.reason,
+            "error_message": (f"The model took longer than {REQUEST_TIMEOUT_SECONDS:.0f} seconds. Please try again or shorten the report."
+                              if e.reason == "deadline" else str(e)),
+            "original_text": text,
+            "simplified_text": None,
+            "model_type": None,
+            "original_length": len(text),
+            "simplified_length": 0,
+            "reduction_percentage": 0
+        }
     except Exception as e:
         return {
             "error": True,
@@ -1004,7 +564,596 @@ def simplify_medical_report(text: str, model, tokenizer) -> str:
             "reduction_percentage": 0
         }
 
+def simplify_medical_reports(texts: list, model, tokenizer, scheduler, session_id: Optional[str] = None,
+                             generation_kwargs: Optional[dict] = None) -> list:
+    """
+    Simplify a group of reports together: all of them are queued with the
+    scheduler before waiting, so they share a batch (callers group them by
+    length). One result dict per text, as simplify_medical_report returns.
+    """
+    if model is None or tokenizer is None:
+        return [simplify_medical_report(text, model, tokenizer) for text in texts]
+    submitted = []
+    for text in texts:
+        cancel_token = CancelToken(REQUEST_TIMEOUT_SECONDS, watch_script_run(get_script_run_ctx(suppress_warning=True)))
+        submitted.append((scheduler.submit(text, session_id, generation_kwargs, cancel_token=cancel_token), cancel_token))
+    return [
+        simplify_medical_report(text, model, tokenizer, scheduler, session_id, generation_kwargs, submitted=pair)
+        for text, pair in zip(texts, submitted)
+    ]
+
+def overloaded_result(text: str, e: Overloaded) -> dict:
+    return {
+        "error": True,
+        "overloaded": True,
+        "error_message": f"The service is busy right now (estimated wait {e.estimated_wait:.0f} s). Please try again in a minute.",
+        "original_text": text,
+        "simplified_text": None,
+        "model_type": None,
+        "original_length": len(text),
+        "simplified_length": 0,
+        "reduction_percentage": 0
+    }
+
+def admitted_simplify(simplify, text: str) -> dict:
+    """
+    Run simplify(text, generation_kwargs) behind the model admission stage:
+    degraded decoding when the queue is long, an immediate error when full
+    """
+    try:
+        with SIMPLIFY_ADMISSION.admit() as ticket:
+            result = simplify(text, DEGRADED_GENERATION_KWARGS if ticket.degraded else None)
+            if result.get("error"):
+                # Cancelled or failed: not a completion for the throughput estimate
+                ticket.abandon()
+    except Overloaded as e:
+        return overloaded_result(text, e)
+    if ticket.degraded and not result.get("error"):
+        result["degraded"] = True
+    return result
+
+def admitted_simplify_batch(simplify_batch, texts: list) -> list:
+    """
+    admitted_simplify for a group run as one batch, simplify_batch(texts,
+    generation_kwargs): each text is admitted on its own; the group is
+    degraded if any of them is
+    """
+    results = [None] * len(texts)
+    with ExitStack() as stack:
+        admitted = []
+        for i, text in enumerate(texts):
+            try:
+                admitted.append((i, stack.enter_context(SIMPLIFY_ADMISSION.admit())))
+            except Overloaded as e:
+                results[i] = overloaded_result(text, e)
+        if admitted:
+            degraded = any(ticket.degraded for _, ticket in admitted)
+            outputs = simplify_batch([texts[i] for i, _ in admitted], DEGRADED_GENERATION_KWARGS if degraded else None)
+            for (i, ticket), result in zip(admitted, outputs):
+                if result.get("error"):
+                    ticket.abandon()
+                elif degraded:
+                    result["degraded"] = True
+                results[i] = result
+    return results
+
+@st.cache_resource
+def get_near_duplicate_index():
+    """Process-wide index of past simplifications (optionally seeded with the training pairs)"""
+    index = NearDuplicateIndex()
+    if NEAR_DUP_SEED_CORPUS:
+        try:
+            with st.spinner("Indexing training pairs..."):
+                corpus = load_corpus(CORPUS_PATH)
+                index.seed(corpus[SOURCE_COLUMN].tolist(), corpus[TARGET_COLUMN].tolist())
+        except Exception as e:
+            st.warning(f"⚠️ Could not index the training pairs: {str(e)}")
+    return index
+
+def reused_result(text: str, match: dict) -> dict:
+    simplified_text = match["simplified_text"]
+    return {
+        "simplified_text": simplified_text,
+        "model_type": "Reused earlier simplification",
+        "reused_from": match["model_type"],
+        "original_length": len(text),
+        "simplified_length": len(simplified_text),
+        "reduction_percentage": ((len(text) - len(simplified_text)) / len(text) * 100),
+        "original_text": text,
+        "near_duplicate": match["similarity"]
+    }
+
+def remember_result(index, text: str, result: dict):
+    # Degraded output is not worth repeating
+    if not result.get("error") and not result.get("degraded"):
+        index.add(text, result["simplified_text"], result["model_type"])
+
+def simplify_with_reuse(simplify, index, text: str) -> dict:
+    """Serve near-duplicates of earlier reports from the index; otherwise simplify and remember the result"""
+    match = index.lookup(text)
+    if match is not None:
+        return reused_result(text, match)
+    result = simplify(text)
+    remember_result(index, text, result)
+    return result
+
+def simplify_batch_with_reuse(simplify_batch, index, texts: list) -> list:
+    """simplify_with_reuse for a group: only the texts without a near-duplicate go to the model"""
+    results = [None] * len(texts)
+    misses = []
+    for i, text in enumerate(texts):
+        match = index.lookup(text)
+        if match is not None:
+            results[i] = reused_result(text, match)
+        else:
+            misses.append(i)
+    if misses:
+        for i, result in zip(misses, simplify_batch([texts[i] for i in misses])):
+            remember_result(index, texts[i], result)
+            results[i] = result
+    return results
+
+INPUT_TYPES = ["📝 Text Input", "📷 Image Upload"]
+
+def get_image_budget() -> SessionImageBudget:
+    """Decoded image memory held by this session (single upload and batch reads)"""
+    if 'image_budget' not in st.session_state:
+        st.session_state.image_budget = SessionImageBudget()
+    return st.session_state.image_budget
+
+def get_uploaded_image(uploaded_file):
+    """Decode an uploaded image once per upload and session.
+    
+    Returns the reduced grayscale image used for OCR and a small JPEG thumbnail
+    for display, so reruns neither re-open the file nor re-encode the preview.
+    Decoded image memory is charged against the session's image budget.
+    """
+    get_image_budget()
+    cached = st.session_state.get("uploaded_image")
+    if cached is None or cached["file_id"] != uploaded_file.file_id:
+        # Drop the previous upload before charging the new one
+        st.session_state.uploaded_image = None
+        st.session_state.image_budget.release("upload")
+        ingested = ingest_image(uploaded_file, st.session_state.image_budget, "upload")
+        cached = {"file_id": uploaded_file.file_id, **ingested}
+        st.session_state.uploaded_image = cached
+    return cached["ocr_image"], cached["thumbnail"]
+
+def request_simplification(text: str):
+    """Store submitted text and flag the output panel to run the model"""
+    st.session_state.input_text = text
+    st.session_state.simplify_requested = True
+
+def render_text_input():
+    """Text area inside a form - typing does not rerun the page until submit"""
+    st.markdown('<p style="color: #000000 !important;"><strong>Enter your medical report text:</strong></p>', unsafe_allow_html=True)
+    if "text_input_area" not in st.session_state:
+        st.session_state.text_input_area = st.session_state.input_text
+    
+    with st.form("text_input_form", border=False):
+        input_text = st.text_area(
+            "Medical Report Text",
+            height=300,
+            placeholder="Paste your medical report text here...",
+            help="Enter the medical report text that you want to simplify",
+            key="text_input_area"
+        )
+        submitted = st.form_submit_button("🚀 Simplify Medical Report")
+    
+    if submitted:
+        request_simplification(input_text)
+
+IMAGE_TYPES = ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff']
+
+def store_extracted_text(extracted_text: str):
+    """Store extracted text in session state and in the editable text area"""
+    st.session_state.input_text = extracted_text
+    st.session_state.extracted_text_area = extracted_text
+
+def render_image_upload(uploaded_file):
+    """Image branch: thumbnail preview and OCR on demand"""
+    # Display the uploaded image (thumbnail - OCR uses a separate reduced decode)
+    try:
+        image, preview = get_uploaded_image(uploaded_file)
+    except ImageBudgetError as e:
+        st.error(f"❌ {str(e)}")
+        return
+    except Exception as e:
+        st.error(f"Error reading image: {str(e)}")
+        return
+    st.image(preview, caption="Uploaded Image", width='stretch')
+    
+    # Extract text using OCR
+    if st.button("🔍 Extract Text from Image"):
+        with st.spinner("Extracting text from image..."):
+            extracted_text = extract_text_from_image(image)
+        if extracted_text:
+            st.success("Text extracted successfully!")
+            store_extracted_text(extracted_text)
+        else:
+            st.error("No text could be extracted from the image.")
+
+def truncation_warning(name: str, truncated: int) -> str:
+    return (f"⚠️ {name}: only the first {MAX_PDF_PAGES} pages were read; "
+            f"{truncated} later page{'s were' if truncated != 1 else ' was'} skipped.")
+
+def read_uploaded_file(uploaded_file, engine, budget: Optional[SessionImageBudget] = None,
+                       truncated: Optional[dict] = None) -> str:
+    """
+    Text of an uploaded image or PDF for batch processing (engine=None: PDF text layers only)
+
+    PDFs cut off at MAX_PDF_PAGES record the number of skipped pages in
+    truncated under the file name.
+    """
+    ocr = (lambda image: recognize_text(image, engine)) if engine is not None else None
+    if uploaded_file.name.lower().endswith(".pdf"):
+        pages, skipped = extract_pdf_pages(uploaded_file.getvalue(), ocr=ocr)
+        if skipped and truncated is not None:
+            truncated[uploaded_file.name] = skipped
+        return pdf_pages_text(pages)
+    if ocr is None:
+        raise RuntimeError("OCR is not available")
+    # Charged to the session's budget only while it is being recognized
+    key = f"batch:{uploaded_file.file_id}"
+    try:
+        return ocr(ingest_image(uploaded_file, budget, key)["ocr_image"])
+    finally:
+        if budget is not None:
+            budget.release(key)
+
+def render_batch_upload(uploaded_files, nlp, simplify, simplify_batch=None):
+    """Many files: reading, preprocessing and simplification overlap; one zip download"""
+    file_ids = [uploaded_file.file_id for uploaded_file in uploaded_files]
+    if st.button(f"🚀 Extract and Simplify {len(uploaded_files)} Files"):
+        engine = load_ocr_engine() if st.session_state.tesseract_available else None
+        progress = st.progress(0.0, text="Processing files...")
+        table = st.empty()
+        rows = [{"File": uploaded_file.name, "Status": "⏳ Waiting", "Seconds": None} for uploaded_file in uploaded_files]
+        table.dataframe(pd.DataFrame(rows), hide_index=True)
+        
+        # Worker threads keep this run's context, so a rerun still cancels their requests
+        ctx = get_script_run_ctx()
+        budget = get_image_budget()
+        truncated = {}
+        entries = []
+        for i, entry in enumerate(process_files(
+            uploaded_files,
+            lambda uploaded_file: read_uploaded_file(uploaded_file, engine, budget, truncated),
+            lambda text: preprocess_text(remove_boilerplate(text)[0], nlp),
+            simplify,
+            # Images being read, plus the single upload, must fit the session's image budget
+            read_workers=min(OCR_POOL_SIZE, max(1, SESSION_IMAGE_PAGES - 1)),
+            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+            # Texts waiting for the model are batched in length buckets
+            simplify_batch=simplify_batch,
+            count_tokens=get_token_counter()
+        )):
+            report = entry["report"]
+            if entry["error"]:
+                rows[i]["Status"] = f"❌ {entry['error']}"
+            elif report.get("near_duplicate"):
+                rows[i]["Status"] = "♻️ Reused"
+            else:
+                rows[i]["Status"] = "⚡ Simplified (fast mode)" if report.get("degraded") else "✅ Simplified"
+            rows[i]["Seconds"] = round(entry["read_seconds"] + entry["simplify_seconds"], 1)
+            entries.append(entry)
+            progress.progress(len(entries) / len(rows), text=f"Processing files ({len(entries)}/{len(rows)})...")
+            table.dataframe(pd.DataFrame(rows), hide_index=True)
+        progress.progress(1.0, text="Done")
+        st.session_state.batch_results = {
+            "file_ids": file_ids,
+            "entries": entries,
+            "truncated": truncated,
+            "archive": build_archive(entries, report_download_text)
+        }
+    
+    batch = st.session_state.get("batch_results")
+    if not batch or batch["file_ids"] != file_ids:
+        return
+    succeeded = [entry for entry in batch["entries"] if not entry["error"]]
+    if succeeded:
+        st.success(f"{len(succeeded)} of {len(batch['entries'])} files simplified.")
+    for name, skipped in batch["truncated"].items():
+        st.warning(truncation_warning(name, skipped))
+    for entry in batch["entries"]:
+        with st.expander(f"{'✅' if not entry['error'] else '❌'} {entry['name']}", expanded=False):
+            if entry["error"]:
+                st.error(entry["error"])
+            else:
+                st.info(entry["report"]["simplified_text"])
+    st.download_button(
+        label="📦 Download All Reports (zip)",
+        data=batch["archive"],
+        file_name="simplified_medical_reports.zip",
+        mime="application/zip"
+    )
+
+def render_pdf_upload(uploaded_file):
+    """PDF branch: embedded text layer first, OCR only for image-only pages"""
+    if st.button("🔍 Extract Text from PDF"):
+        ocr = extract_text_from_image if st.session_state.tesseract_available else None
+        with st.spinner("Extracting text from PDF..."):
+            try:
+                pages, truncated = extract_pdf_pages(uploaded_file.getvalue(), ocr=ocr)
+            except Exception as e:
+                st.error(f"Error reading PDF: {str(e)}")
+                return
+        st.session_state.pdf_pages = {"file_id": uploaded_file.file_id, "pages": pages, "truncated": truncated}
+        extracted_text = pdf_pages_text(pages)
+        if extracted_text:
+            st.success("Text extracted successfully!")
+            store_extracted_text(extracted_text)
+        else:
+            st.error("No text could be extracted from the PDF.")
+    
+    # Per-page summary of how the text was obtained
+    cached = st.session_state.get("pdf_pages")
+    if cached and cached["file_id"] == uploaded_file.file_id:
+        pages = cached["pages"]
+        methods = [page["method"] for page in pages]
+        with st.expander(f"📑 {len(pages)} pages - {methods.count('text')} text layer, {methods.count('ocr')} OCR", expanded=False):
+            st.dataframe(pd.DataFrame([{
+                "Page": page["page"],
+                "Method": page["method"],
+                "Characters": page["chars"],
+                "Repeated lines removed": page.get("repeated_lines", 0),
+                "Time (ms)": round(page["seconds"] * 1000, 1)
+            } for page in pages]), hide_index=True)
+        if methods.count("skipped"):
+            st.warning(f"{methods.count('skipped')} image-only pages were skipped because OCR is not available.")
+        if cached["truncated"]:
+            st.warning(truncation_warning(uploaded_file.name, cached["truncated"]))
+
+@st.fragment
+def render_image_input(nlp, simplify, simplify_batch=None):
+    """Image/PDF upload region - uploads and OCR only rerun this fragment"""
+    upload_types = (IMAGE_TYPES if st.session_state.tesseract_available else []) + (['pdf'] if PYMUPDF_AVAILABLE else [])
+    if upload_types:
+        st.markdown('<p style="color: #000000 !important;"><strong>Upload an image or PDF containing medical text:</strong></p>', unsafe_allow_html=True)
+        uploaded_files = st.file_uploader(
+            "Choose image or PDF files",
+            type=upload_types,
+            accept_multiple_files=True,
+            help="Upload one or more images or PDFs containing medical text. PDF text layers are read directly; images and scanned pages use OCR."
+        )
+        if not st.session_state.tesseract_available:
+            st.caption("OCR is not available - only PDFs with a text layer can be read.")
+    else:
+        st.markdown('<p style="color: #000000 !important;"><strong>Image Upload Not Available</strong></p>', unsafe_allow_html=True)
+        st.info("""
+        **OCR (Tesseract) is not available on this platform.**
+        
+        Please use the "Text Input" option instead, or copy and paste text from your images manually.
+        """)
+        uploaded_files = []
+    
+    if not uploaded_files:
+        return
+    if len(uploaded_files) > 1:
+        render_batch_upload(uploaded_files, nlp, simplify, simplify_batch)
+        return
+    
+    uploaded_file = uploaded_files[0]
+    if uploaded_file.name.lower().endswith(".pdf"):
+        render_pdf_upload(uploaded_file)
+    else:
+        render_image_upload(uploaded_file)
+    
+    # Show extracted text area if there's text in session state (for editing)
+    if st.session_state.input_text and st.session_state.input_text.strip():
+        if "extracted_text_area" not in st.session_state:
+            st.session_state.extracted_text_area = st.session_state.input_text
+        
+        st.markdown('<h4 style="color: #000000 !important;">📄 Extracted Text:</h4>', unsafe_allow_html=True)
+        with st.form("extracted_text_form", border=False):
+            edited_text = st.text_area(
+                "Extracted Text",
+                height=200,
+                key="extracted_text_area",
+                help="You can edit the extracted text here. Changes are applied when you click Simplify."
+            )
+            submitted = st.form_submit_button("🚀 Simplify Medical Report")
+        
+        if submitted:
+            request_simplification(edited_text)
+            # The output panel lives outside this fragment
+            st.rerun()
+
+def render_simplified_report(simplified_report):
+    """Display a stored simplification result"""
+    st.markdown("### ✅ Simplified Report")
+    
+    if isinstance(simplified_report, dict) and simplified_report.get("error"):
+        # Display error
+        st.error(f"❌ {simplified_report['error_message']}")
+        if simplified_report.get("original_text"):
+            with st.expander("📄 Original Text", expanded=False):
+                st.text(simplified_report["original_text"])
+        return
+    
+    # Display successful result
+    # Header with model info
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown("#### 🏥 Simplified Medical Report")
+        st.markdown("*Patient-Friendly Version*")
+    with col2:
+        st.success(f"🤖 {simplified_report['model_type']}")
+    if simplified_report.get("near_duplicate"):
+        source = f" ({simplified_report['reused_from']})" if simplified_report.get("reused_from") else ""
+        st.caption(f"♻️ Reused the simplification of a {simplified_report['near_duplicate']:.0%} similar report{source}, "
+                   "with its names, dates and times updated. The model did not run for this report.")
+    if simplified_report.get("degraded"):
+        st.caption("⚡ Served in fast mode because the service is busy - results may be shorter than usual.")
+    boilerplate = simplified_report.get("boilerplate")
+    if boilerplate:
+        saved = f" ({boilerplate['tokens_saved']} fewer input tokens)" if "tokens_saved" in boilerplate else ""
+        st.caption(f"🧹 Left out {len(boilerplate['removed'])} boilerplate lines before simplifying{saved}.")
+    
+    # Main simplified text
+    st.markdown("---")
+    st.markdown("### 📝 Simplified Text")
+    if simplified_report.get("sections"):
+        render_section_results(simplified_report["sections"])
+    else:
+        st.info(simplified_report["simplified_text"])
+    
+    # Statistics
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Original Length", f"{simplified_report['original_length']} chars")
+    with col2:
+        st.metric("Simplified Length", f"{simplified_report['simplified_length']} chars")
+    with col3:
+        st.metric("Reduction", f"{simplified_report['reduction_percentage']:.1f}%")
+    
+    # Original text expander
+    with st.expander("📄 View Original Text", expanded=False):
+        st.text(simplified_report["original_text"])
+    
+    # Download option
+    st.download_button(
+        label="📥 Download Simplified Report",
+        data=report_download_text(simplified_report),
+        file_name="simplified_medical_report.txt",
+        mime="text/plain"
+    )
+
+def report_download_text(simplified_report) -> str:
+    """Plain-text download of a simplification result"""
+    return f"""Simplified Medical Report
+Generated by: {simplified_report['model_type']}
+
+SIMPLIFIED TEXT:
+{simplified_report['simplified_text']}
+
+STATISTICS:
+- Original Length: {simplified_report['original_length']} characters
+- Simplified Length: {simplified_report['simplified_length']} characters
+- Reduction: {simplified_report['reduction_percentage']:.1f}%
+
+ORIGINAL TEXT:
+{simplified_report['original_text']}
+"""
+
+def render_section_results(sections):
+    """Simplified sections, most important first"""
+    for section in sections:
+        st.markdown(f"**{SECTION_TITLES[section['name']]}**")
+        if section.get("error"):
+            st.error(f"❌ {section['error_message']}")
+        else:
+            st.info(section["simplified_text"])
+
+def combine_section_reports(sections, original_text: str) -> dict:
+    """Merge per-section results into one report dict (same keys as simplify_medical_report)"""
+    succeeded = [section for section in sections if not section.get("error")]
+    if not succeeded:
+        return {
+            "error": True,
+            "error_message": sections[0]["error_message"] if sections else "No sections selected.",
+            "original_text": original_text,
+            "simplified_text": None,
+            "model_type": None,
+            "original_length": len(original_text),
+            "simplified_length": 0,
+            "reduction_percentage": 0
+        }
+    
+    simplified_text = "\n\n".join(
+        f"{SECTION_TITLES[section['name']]}: {section['simplified_text']}" for section in succeeded
+    )
+    return {
+        "simplified_text": simplified_text,
+        "model_type": succeeded[0]["model_type"],
+        "original_length": len(original_text),
+        "simplified_length": len(simplified_text),
+        "reduction_percentage": ((len(original_text) - len(simplified_text)) / len(original_text) * 100),
+        "original_text": original_text,
+        "sections": sections,
+        "degraded": any(section.get("degraded") for section in succeeded)
+    }
+
+def simplify_by_section(text: str, nlp, simplify, selected) -> dict:
+    """
+    Simplify sections in priority order, showing each one as soon as it is done.
+    Returns None if a section was abandoned for a rerun or stopped.
+    """
+    sections = prioritize_sections(parse_sections(text), selected)
+    progress = st.empty()
+    done = []
+    for i, section in enumerate(sections, start=1):
+        with progress.container():
+            render_section_results(done)
+            st.caption(f"⏳ Simplifying {SECTION_TITLES[section['name']].lower()} ({i}/{len(sections)})...")
+        result = simplify(preprocess_text(section["text"], nlp))
+        if result.get("cancel_reason") in ("rerun", "stopped"):
+            # The rerun decides what to show; the remaining sections would be cancelled too
+            progress.empty()
+            return None
+        done.append({"name": section["name"], "header": section["header"], **result})
+    # The stored report is drawn below
+    progress.empty()
+    return combine_section_reports(done, text)
+
+def render_output_panel(nlp, simplify):
+    """Run the model only on an explicit submit; otherwise redraw the stored result"""
+    if st.session_state.pop("simplify_requested", False):
+        text = st.session_state.input_text
+        if text.strip():
+            text, boilerplate = remove_boilerplate(text)
+            if st.session_state.get("section_mode", True) and len(parse_sections(text)) > 1:
+                report = simplify_by_section(
+                    text, nlp, simplify, st.session_state.get("selected_sections", SECTION_PRIORITY)
+                )
+                if report is not None:
+                    st.session_state.simplified_report = {**report, "boilerplate": boilerplate}
+            else:
+                with st.spinner("Processing medical report..."):
+                    # Preprocess text if spaCy is available
+                    processed_text = preprocess_text(text, nlp)
+                    
+                    # Generate simplified report using the trained model
+                    result = simplify(processed_text)
+                    # Abandoned for a rerun: the rerun decides what to show
+                    if result.get("cancel_reason") not in ("rerun", "stopped"):
+                        st.session_state.simplified_report = {**result, "boilerplate": boilerplate}
+        else:
+            st.warning("Please provide some text to process.")
+    
+    if st.session_state.get("simplified_report") is not None:
+        render_simplified_report(st.session_state.simplified_report)
+
+def render_server_metrics():
+    """Sidebar summary of the shared inference queue"""
+    MEMORY.sample()
+    snapshot = METRICS.snapshot()
+    latency = snapshot["histograms"].get("inference.latency_seconds")
+    with st.sidebar.expander("📊 Server Load", expanded=False):
+        st.metric("Queued requests", int(snapshot["gauges"].get("inference.queue_depth", 0)))
+        st.metric("Completed requests", int(snapshot["counters"].get("inference.jobs_completed", 0)))
+        if latency:
+            st.metric("p95 latency", f"{latency['p95']:.1f} s")
+        st.metric("Estimated wait", f"{SIMPLIFY_ADMISSION.estimated_wait():.0f} s")
+        shed = snapshot["counters"].get("admission.simplify.rejected", 0) + snapshot["counters"].get("admission.ocr.rejected", 0)
+        if shed or snapshot["counters"].get("admission.simplify.degraded"):
+            st.metric("Shed / degraded requests", f"{int(shed)} / {int(snapshot['counters'].get('admission.simplify.degraded', 0))}")
+        if snapshot["counters"].get("inference.jobs_abandoned"):
+            st.metric("Abandoned requests", int(snapshot["counters"]["inference.jobs_abandoned"]))
+        if "assisted.acceptance_rate" in snapshot["gauges"]:
+            st.metric("Draft acceptance", f"{snapshot['gauges']['assisted.acceptance_rate']:.0%}")
+        if "memory.rss_bytes" in snapshot["gauges"]:
+            st.metric("Memory (RSS)", f"{snapshot['gauges']['memory.rss_bytes'] / 2 ** 20:.0f} MB")
+            st.caption(f"Peak {snapshot['gauges']['memory.rss_peak_bytes'] / 2 ** 20:.0f} MB, "
+                       f"steady {snapshot['gauges']['memory.rss_steady_bytes'] / 2 ** 20:.0f} MB; session state "
+                       f"{snapshot['gauges'].get('memory.session_state.total_bytes', 0) / 1024:.0f} KB over "
+                       f"{int(snapshot['gauges'].get('memory.session_state.sessions', 0))} sessions")
+        if "compile.enabled" in snapshot["gauges"]:
+            st.caption("⚡ Compiled inference" if snapshot["gauges"]["compile.enabled"] else "🐢 Eager inference (compile fallback)")
+
 def main():
+    configure_page()
+    
     # Header
     st.markdown('<h1 class="main-header">🏥 Medical Report Simplification</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">Transform complex medical reports into patient-friendly language</p>', unsafe_allow_html=True)
@@ -1013,7 +1162,7 @@ def main():
     if not TORCH_AVAILABLE:
         st.error("⚠️ **PyTorch and Transformers not available.** The AI model functionality will be disabled. Please ensure all dependencies are installed.")
     
-    if not TESSERACT_AVAILABLE:
+    if not TESSERACT_AVAILABLE and not TESSEROCR_AVAILABLE:
         st.warning("⚠️ **Tesseract OCR not available.** Image upload functionality will be limited.")
     
     if not SPACY_AVAILABLE:
@@ -1021,33 +1170,54 @@ def main():
     
     # Load models
     nlp = load_spacy_model()
-    medical_model, medical_tokenizer = load_medical_model()
-    
-    # Sidebar for input selection
-    st.sidebar.markdown("## ⚙️ Input Options")
-    st.sidebar.markdown("---")
-    
-    input_type = st.sidebar.radio(
-        "Choose input type:",
-        ["📝 Text Input", "📷 Image Upload"],
-        help="Select whether you want to input text directly or upload an image containing medical text"
-    )
-    
-    # Fallback: Also show input selection in main area if sidebar is not visible
+    if REPLICA_WORKERS not in ("", "0"):
+        # The model lives in the worker processes
+        pool = get_replica_pool()
+        SIMPLIFY_ADMISSION.concurrency = pool.size
+        run = lambda text, generation_kwargs: replica_simplify(pool, text, generation_kwargs)
+        run_batch = None
+    else:
+        medical_model, medical_tokenizer = load_medical_model()
+        if COMPILED_INFERENCE:
+            medical_model = get_compiled_model(medical_model, medical_tokenizer)
+        if DRAFT_MODEL:
+            medical_model = get_assisted_model(medical_model)
+        scheduler = get_inference_scheduler(medical_model, medical_tokenizer)
+        session_id = get_session_id()
+        run = lambda text, generation_kwargs: simplify_medical_report(
+            text, medical_model, medical_tokenizer, scheduler=scheduler, session_id=session_id,
+            generation_kwargs=generation_kwargs
+        )
+        # Multi-file uploads queue each length bucket together so it becomes one batch
+        run_batch = lambda texts, generation_kwargs: simplify_medical_reports(
+            texts, medical_model, medical_tokenizer, scheduler, session_id=session_id,
+            generation_kwargs=generation_kwargs
+        )
+    simplify = lambda text: admitted_simplify(run, text)
+    simplify_batch = (lambda texts: admitted_simplify_batch(run_batch, texts)) if run_batch is not None else None
+    if NEAR_DUP_THRESHOLD:
+        index = get_near_duplicate_index()
+        simplify_model = simplify
+        simplify = lambda text: simplify_with_reuse(simplify_model, index, text)
+        if simplify_batch is not None:
+            simplify_batch_model = simplify_batch
+            simplify_batch = lambda texts: simplify_batch_with_reuse(simplify_batch_model, index, texts)
+    
+    # Input selection (a single radio - the sidebar only carries tips)
     st.markdown("---")
     st.markdown("### 📋 Input Selection")
-    input_type_main = st.radio(
+    input_type = st.radio(
         "Choose input type:",
-        ["📝 Text Input", "📷 Image Upload"],
+        INPUT_TYPES,
         help="Select whether you want to input text directly or upload an image containing medical text",
         key="input_type_main"
     )
     
-    # Use the main area selection if sidebar is not working
-    if input_type_main != input_type:
-        input_type = input_type_main
+    # Sidebar
+    st.sidebar.markdown("## ⚙️ Input Options")
+    st.sidebar.markdown("---")
     
-    if input_type == "📷 Image Upload" and not st.session_state.tesseract_available:
+    if input_type == "📷 Image Upload" and not st.session_state.tesseract_available and not PYMUPDF_AVAILABLE:
         st.sidebar.error("""
         **Image Upload Not Available**
         
@@ -1070,175 +1240,58 @@ def main():
         - Copy and paste text from images manually
         """)
     
+    st.sidebar.markdown("### 🧩 Report Sections")
+    st.sidebar.toggle(
+        "Simplify section by section",
+        value=True,
+        key="section_mode",
+        help="Reports with headers (FINDINGS, IMPRESSION, ...) are simplified one section at a time, impression first"
+    )
+    st.sidebar.multiselect(
+        "Sections to simplify",
+        SECTION_PRIORITY,
+        default=SECTION_PRIORITY,
+        format_func=lambda name: SECTION_TITLES[name],
+        key="selected_sections"
+    )
+    
+    render_server_metrics()
+    
+    # Initialize input_text in session state if not exists
+    if 'input_text' not in st.session_state:
+        st.session_state.input_text = ""
+    
     # Main content area
     col1, col2 = st.columns([1, 1])
     
     with col1:
         st.markdown('<h3 style="color: #000000 !important;">📥 Input</h3>', unsafe_allow_html=True)
         
-        # Initialize input_text in session state if not exists
-        if 'input_text' not in st.session_state:
-            st.session_state.input_text = ""
-        
         if input_type == "📝 Text Input":
-            st.markdown('<p style="color: #000000 !important;"><strong>Enter your medical report text:</strong></p>', unsafe_allow_html=True)
-            input_text = st.text_area(
-                "Medical Report Text",
-                value=st.session_state.input_text,
-                height=300,
-                placeholder="Paste your medical report text here...",
-                help="Enter the medical report text that you want to simplify",
-                key="text_input_area"
-            )
-            # Update session state when text changes
-            st.session_state.input_text = input_text
-            
+            render_text_input()
         else:  # Image Upload
-            if st.session_state.tesseract_available:
-                st.markdown('<p style="color: #000000 !important;"><strong>Upload an image containing medical text:</strong></p>', unsafe_allow_html=True)
-                uploaded_file = st.file_uploader(
-                    "Choose an image file",
-                    type=['png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'],
-                    help="Upload an image file containing medical text. The app will extract text using OCR."
-                )
-            else:
-                st.markdown('<p style="color: #000000 !important;"><strong>Image Upload Not Available</strong></p>', unsafe_allow_html=True)
-                st.info("""
-                **OCR (Tesseract) is not available on this platform.**
-                
-                Please use the "Text Input" option instead, or copy and paste text from your images manually.
-                """)
-                uploaded_file = None
-            
-            if uploaded_file is not None:
-                # Display the uploaded image
-                image = Image.open(uploaded_file)
-                st.image(image, caption="Uploaded Image", width='stretch')
-                
-                # Extract text using OCR
-                if st.button("🔍 Extract Text from Image"):
-                    with st.spinner("Extracting text from image..."):
-                        extracted_text = extract_text_from_image(image)
-                        if extracted_text:
-                            st.success("Text extracted successfully!")
-                            # Store extracted text in session state
-                            st.session_state.input_text = extracted_text
-                            
-                            # Show extracted text
-                            st.markdown('<h4 style="color: #000000 !important;">📄 Extracted Text:</h4>', unsafe_allow_html=True)
-                            edited_text = st.text_area(
-                                "Extracted Text", 
-                                value=st.session_state.input_text, 
-                                height=200, 
-                                disabled=False,
-                                key="extracted_text_area_1",
-                                help="You can edit the extracted text here. Changes will be saved automatically."
-                            )
-                            # Update session state when text is edited
-                            st.session_state.input_text = edited_text
-                        else:
-                            st.error("No text could be extracted from the image.")
-                
-                # Show extracted text area if there's text in session state (for editing)
-                if st.session_state.input_text and st.session_state.input_text.strip():
-                    st.markdown('<h4 style="color: #000000 !important;">📄 Extracted Text:</h4>', unsafe_allow_html=True)
-                    edited_text = st.text_area(
-                        "Extracted Text", 
-                        value=st.session_state.input_text, 
-                        height=200, 
-                        disabled=False,
-                        key="extracted_text_area_2",
-                        help="You can edit the extracted text here. Changes will be saved automatically."
-                    )
-                    # Update session state when text is edited
-                    st.session_state.input_text = edited_text
+            render_image_input(nlp, simplify, simplify_batch)
     
     with col2:
         st.markdown('<h3 style="color: #000000 !important;">📤 Output</h3>', unsafe_allow_html=True)
-        
-        # Process button
-        if st.button("🚀 Simplify Medical Report", disabled=not st.session_state.input_text.strip()):
-            if st.session_state.input_text.strip():
-                with st.spinner("Processing medical report..."):
-                    # Preprocess text if spaCy is available
-                    processed_text = preprocess_text(st.session_state.input_text, nlp)
-                    
-                    # Generate simplified report using the trained model
-                    simplified_report = simplify_medical_report(processed_text, medical_model, medical_tokenizer)
-                    
-                    # Display results
-                    st.markdown("### ✅ Simplified Report")
-                    
-                    if isinstance(simplified_report, dict) and simplified_report.get("error"):
-                        # Display error
-                        st.error(f"❌ {simplified_report['error_message']}")
-                        if simplified_report.get("original_text"):
-                            with st.expander("📄 Original Text", expanded=False):
-                                st.text(simplified_report["original_text"])
-                    else:
-                        # Display successful result
-                        # Header with model info
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.markdown("#### 🏥 Simplified Medical Report")
-                            st.markdown("*Patient-Friendly Version*")
-                        with col2:
-                            st.success(f"🤖 {simplified_report['model_type']}")
-                        
-                        # Main simplified text
-                        st.markdown("---")
-                        st.markdown("### 📝 Simplified Text")
-                        st.info(simplified_report["simplified_text"])
-                        
-                        # Statistics
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("Original Length", f"{simplified_report['original_length']} chars")
-                        with col2:
-                            st.metric("Simplified Length", f"{simplified_report['simplified_length']} chars")
-                        with col3:
-                            st.metric("Reduction", f"{simplified_report['reduction_percentage']:.1f}%")
-                        
-                        # Original text expander
-                        with st.expander("📄 View Original Text", expanded=False):
-                            st.text(simplified_report["original_text"])
-                    
-                    # Download option
-                    if isinstance(simplified_report, dict) and not simplified_report.get("error"):
-                        download_text = f"""Simplified Medical Report
-Generated by: {simplified_report['model_type']}
-
-SIMPLIFIED TEXT:
-{simplified_report['simplified_text']}
-
-STATISTICS:
-- Original Length: {simplified_report['original_length']} characters
-- Simplified Length: {simplified_report['simplified_length']} characters
-- Reduction: {simplified_report['reduction_percentage']:.1f}%
-
-ORIGINAL TEXT:
-{simplified_report['original_text']}
-"""
-                    st.download_button(
-                        label="📥 Download Simplified Report",
-                            data=download_text,
-                        file_name="simplified_medical_report.txt",
-                        mime="text/plain"
-                    )
-            else:
-                st.warning("Please provide some text to process.")
+        render_output_panel(nlp, simplify)
+    
+    # Per-session memory accounting, after this run's changes to the state
+    MEMORY.record_session(get_session_id(), st.session_state.to_dict())
     
     # Instructions section
     st.markdown('<div class="instructions">', unsafe_allow_html=True)
     st.markdown("""
     ### 📋 Instructions:
     1. **Text Input**: Paste your medical report text directly into the text area
-    2. **Image Upload**: Upload an image containing medical text, then click "Extract Text from Image"
+    2. **Image Upload**: Upload an image or PDF containing medical text, then click "Extract Text" (several files at once are extracted and simplified together and download as one zip)
     3. Click "Simplify Medical Report" to process the text
     4. Download the simplified report using the download button
     
     ### 🔧 Technical Notes:
     - OCR functionality uses Tesseract for text extraction
+    - PDFs with a text layer are read directly; only scanned pages go through OCR
+    - Reports with section headers are simplified section by section, impression first
     - Text preprocessing uses spaCy for better text handling
     - Medical simplification uses a fine-tuned FLAN-T5 model with LoRA adapters
     - The model is trained on medical text simplification datasets
@@ -0,0 +1,11 @@
+// Force sidebar to be visible on Streamlit Cloud
+window.addEventListener('load', function() {
+    setTimeout(function() {
+        const sidebar = document.querySelector('section[data-testid="stSidebar"]');
+        if (sidebar) {
+            sidebar.style.display = 'block';
+            sidebar.style.visibility = 'visible';
+            sidebar.style.width = '21rem';
+        }
+    }, 1000);
+});
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Assisted (speculative) greedy decoding with a small draft model.
+
+A small seq2seq draft model that shares the tokenizer (e.g. a LoRA-tuned
+t5-small) proposes LOOKAHEAD tokens one at a time. The main model scores
+all of them in a single decoder pass, keeps the longest prefix that matches
+its own greedy choice and adds one token of its own. Outputs are therefore
+identical to greedy model.generate, while the main model runs once per
+accepted run of tokens instead of once per token.
+
+Usage:
+    DRAFT_MODEL=./draft_lora_adapters streamlit run app.py
+    python assisted_decoding.py --verify                  # offline, tiny random T5 models
+    python assisted_decoding.py --benchmark --draft ./draft_lora_adapters
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from metrics import METRICS
+
+# Draft model (local directory, LoRA adapter directory or hub id); empty disables assisted decoding
+DRAFT_MODEL = os.environ.get("DRAFT_MODEL", "")
+
+# Tokens proposed by the draft model per verification pass
+ASSIST_LOOKAHEAD = int(os.environ.get("ASSIST_LOOKAHEAD", 5))
+
+def load_draft_model(path: str = DRAFT_MODEL):
+    """Load the draft model; adapter directories are applied to their base model"""
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+
+    if os.path.exists(os.path.join(path, "adapter_config.json")):
+        from peft import PeftModel
+        with open(os.path.join(path, "adapter_config.json"), "r") as f:
+            base = json.load(f)["base_model_name_or_path"]
+        model = PeftModel.from_pretrained(AutoModelForSeq2SeqLM.from_pretrained(base), path).merge_and_unload()
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(path)
+    return model.to(torch.float32).eval()
+
+def attach_draft_model(model, draft):
+    """Route greedy generate_simplifications calls through assisted decoding"""
+    if draft.config.vocab_size != model.config.vocab_size:
+        raise ValueError(f"Draft vocabulary ({draft.config.vocab_size}) does not match the model "
+                         f"({model.config.vocab_size}); the draft must share the tokenizer.")
+    # Not nn.Module.__setattr__: the draft must not become a submodule of the shared model
+    # (its weights would join parameters(), state_dict(), .to() and save_pretrained)
+    object.__setattr__(model, "_draft_model", draft)
+    return model
+
+def load_assisted_model():
+    """Replica loader: the app model with the DRAFT_MODEL draft attached"""
+    from app import load_medical_model
+
+    model, tokenizer = load_medical_model()
+    if model is None:
+        return None, None
+    return attach_draft_model(model, load_draft_model(DRAFT_MODEL)), tokenizer
+
+def _penalize(scores, sequences, penalty: float):
+    """Greedy generate's repetition penalty for one row per sequence"""
+    if penalty == 1.0:
+        return scores
+    seen = scores.gather(-1, sequences)
+    seen = seen.where(seen >= 0, seen * penalty).where(seen < 0, seen / penalty)
+    return scores.scatter(-1, sequences, seen)
+
+def _truncate(cache, length: int):
+    excess = cache.get_seq_length() - length
+    if excess > 0:
+        cache.crop(-excess)
+
+class _Decoder:
+    """One model's incremental decoder state for a single input"""
+
+    def __init__(self, model, input_ids, attention_mask):
+        from transformers import DynamicCache, EncoderDecoderCache
+
+        self.model = model
+        self.attention_mask = attention_mask
+        self.encoder_outputs = model.get_encoder()(input_ids=input_ids, attention_mask=attention_mask)
+        self.cache = EncoderDecoderCache(DynamicCache(), DynamicCache())
+
+    def feed(self, tokens):
+        """Run the decoder over new tokens; returns logits for each of them"""
+        outputs = self.model(
+            encoder_outputs=self.encoder_outputs,
+            attention_mask=self.attention_mask,
+            decoder_input_ids=tokens,
+            past_key_values=self.cache,
+            use_cache=True
+        )
+        self.cache = outputs.past_key_values
+        return outputs.logits[0]
+
+    def keep(self, length: int):
+        _truncate(self.cache, length)
+
+def assisted_generate(model, draft, input_ids, attention_mask, max_new_tokens: int = 256,
+                      repetition_penalty: float = 1.0, lookahead: int = ASSIST_LOOKAHEAD, stats: dict = None,
+                      stopping_criteria=None):
+    """
+    Greedy decoding of one input with draft proposals.
+
+    Returns the decoder token ids (starting with the decoder start token),
+    as greedy model.generate would. stopping_criteria (as for generate) are
+    checked once per draft round.
+    """
+    import torch
+
+    config = model.config
+    eos = config.eos_token_id
+    sequence = torch.tensor([[config.decoder_start_token_id]], device=input_ids.device)
+    target = _Decoder(model, input_ids, attention_mask)
+    assistant = _Decoder(draft, input_ids, attention_mask)
+    # Tokens of the sequence not yet in each model's cache
+    target_pending, draft_pending = sequence, sequence
+    stats = stats if stats is not None else {}
+
+    while sequence.shape[1] - 1 < max_new_tokens:
+        base = sequence.shape[1]
+        steps = min(lookahead, max_new_tokens - (base - 1))
+
+        # Draft proposes `steps` tokens greedily
+        proposal = sequence
+        tokens = draft_pending
+        for _ in range(steps):
+            logits = assistant.feed(tokens)[-1:]
+            token = _penalize(logits, proposal, repetition_penalty).argmax(-1, keepdim=True)
+            proposal = torch.cat([proposal, token], dim=1)
+            tokens = token
+            if token.item() == eos:
+                break
+        drafted = proposal[:, base:]
+
+        # Main model scores every proposed position in one pass
+        logits = target.feed(torch.cat([target_pending, drafted], dim=1))[target_pending.shape[1] - 1:]
+        prefixes = [proposal[:, :base + i] for i in range(drafted.shape[1] + 1)]
+        choices = torch.cat([
+            _penalize(logits[i:i + 1], prefix, repetition_penalty).argmax(-1, keepdim=True)
+            for i, prefix in enumerate(prefixes)
+        ], dim=1)
+
+        accepted = 0
+        while accepted < drafted.shape[1] and drafted[0, accepted] == choices[0, accepted]:
+            accepted += 1
+        new_tokens = torch.cat([drafted[:, :accepted], choices[:, accepted:accepted + 1]], dim=1)
+
+        stats["rounds"] = stats.get("rounds", 0) + 1
+        stats["drafted"] = stats.get("drafted", 0) + drafted.shape[1]
+        stats["accepted"] = stats.get("accepted", 0) + accepted
+
+        # Stop at the first EOS and at the token limit
+        eos_at = (new_tokens[0] == eos).nonzero()
+        if len(eos_at):
+            new_tokens = new_tokens[:, :eos_at[0].item() + 1]
+        new_tokens = new_tokens[:, :max_new_tokens - (base - 1)]
+        sequence = torch.cat([sequence, new_tokens], dim=1)
+        if len(eos_at):
+            break
+        if stopping_criteria is not None and bool(stopping_criteria(sequence, None).all()):
+            break
+
+        # Drop rejected entries; the caches resume from the last kept token
+        target.keep(base + accepted)
+        target_pending = sequence[:, base + accepted:]
+        draft_kept = min(base + accepted, assistant.cache.get_seq_length())
+        assistant.keep(draft_kept)
+        draft_pending = sequence[:, draft_kept:]
+
+    stats["generated"] = stats.get("generated", 0) + sequence.shape[1] - 1
+    return sequence[0]
+
+def generate_assisted(model, inputs: dict, generation_kwargs: dict, metrics=METRICS):
+    """Assisted greedy decoding for a padded batch; returns padded token ids like generate"""
+    import torch
+    from torch.nn.utils.rnn import pad_sequence
+
+    draft = model._draft_model
+    sequences, stats = [], {}
+    started = time.perf_counter()
+    with torch.no_grad():
+        for input_ids, attention_mask in zip(inputs["input_ids"], inputs["attention_mask"]):
+            length = int(attention_mask.sum())
+            sequences.append(assisted_generate(
+                model, draft, input_ids[None, :length], attention_mask[None, :length],
+                max_new_tokens=generation_kwargs.get("max_new_tokens", 256),
+                repetition_penalty=generation_kwargs.get("repetition_penalty", 1.0),
+                lookahead=generation_kwargs.get("assist_lookahead", ASSIST_LOOKAHEAD),
+                stats=stats,
+                stopping_criteria=generation_kwargs.get("stopping_criteria")
+            ))
+    metrics.inc("assisted.rounds", stats["rounds"])
+    metrics.inc("assisted.drafted_tokens", stats["drafted"])
+    metrics.inc("assisted.accepted_tokens", stats["accepted"])
+    metrics.inc("assisted.generated_tokens", stats["generated"])
+    metrics.observe("assisted.seconds", time.perf_counter() - started)
+    drafted = metrics.counter("assisted.drafted_tokens")
+    if drafted:
+        metrics.set("assisted.acceptance_rate", metrics.counter("assisted.accepted_tokens") / drafted)
+    return pad_sequence(sequences, batch_first=True, padding_value=model.config.pad_token_id)
+
+def acceptance_report(metrics=METRICS) -> dict:
+    """Acceptance statistics accumulated in the metrics registry"""
+    drafted = metrics.counter("assisted.drafted_tokens")
+    rounds = metrics.counter("assisted.rounds")
+    return {
+        "rounds": int(rounds),
+        "drafted_tokens": int(drafted),
+        "accepted_tokens": int(metrics.counter("assisted.accepted_tokens")),
+        "acceptance_rate": metrics.counter("assisted.accepted_tokens") / drafted if drafted else 0.0,
+        # Tokens produced per main-model decoder pass (1.0 without a draft)
+        "tokens_per_pass": metrics.counter("assisted.generated_tokens") / rounds if rounds else 0.0
+    }
+
+def _tiny_t5(tokenizer, d_model: int, layers: int, seed: int):
+    import torch
+    from transformers import T5Config, T5ForConditionalGeneration
+
+    config = T5Config(vocab_size=len(tokenizer), d_model=d_model, d_ff=2 * d_model, num_layers=layers,
+                      num_heads=2, d_kv=d_model // 2, decoder_start_token_id=tokenizer.pad_token_id,
+                      pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id)
+    torch.manual_seed(seed)
+    return T5ForConditionalGeneration(config).eval()
+
+def verify(model, draft, tokenizer, texts, generation_kwargs: dict, lookaheads=(1, 3, ASSIST_LOOKAHEAD)) -> dict:
+    """Check that assisted decoding reproduces greedy generate exactly"""
+    import torch
+    from metrics import Metrics
+
+    kwargs = {k: v for k, v in generation_kwargs.items() if k in ("max_new_tokens", "repetition_penalty")}
+    inputs = tokenizer([f"Simplify this medical text for patients: {text}" for text in texts],
+                       return_tensors="pt", padding=True, truncation=True, max_length=512)
+    with torch.no_grad():
+        expected = model.generate(**inputs, **kwargs, num_beams=1, do_sample=False)
+    expected = tokenizer.batch_decode(expected, skip_special_tokens=True)
+
+    model = attach_draft_model(model, draft)
+    results = {}
+    for lookahead in lookaheads:
+        metrics = Metrics()
+        output = generate_assisted(model, dict(inputs), {**kwargs, "assist_lookahead": lookahead}, metrics)
+        results[lookahead] = {
+            "identical": tokenizer.batch_decode(output, skip_special_tokens=True) == expected,
+            **acceptance_report(metrics)
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Assisted decoding checks")
+    parser.add_argument("--verify", action="store_true", help="Offline equivalence check with two tiny random T5 models")
+    parser.add_argument("--benchmark", action="store_true", help="Compare greedy and assisted decoding on the real models")
+    parser.add_argument("--draft", default=DRAFT_MODEL, help="Draft model for --benchmark")
+    parser.add_argument("--tokenizer", default="./medical_lora_adapters", help="Tokenizer for --verify")
+    args = parser.parse_args()
+
+    from replica_pool import SAMPLE_REPORTS
+
+    if args.benchmark:
+        import torch
+        from app import GENERATION_KWARGS, load_medical_model
+
+        model, tokenizer = load_medical_model()
+        if model is None or not args.draft:
+            print("❌ The medical model and a --draft model are required")
+            return 1
+        if hasattr(model, "merge_and_unload"):
+            model = model.merge_and_unload()
+        model = model.to(torch.float32)
+        draft = load_draft_model(args.draft)
+        kwargs = {"max_new_tokens": GENERATION_KWARGS["max_new_tokens"],
+                  "repetition_penalty": GENERATION_KWARGS["repetition_penalty"]}
+        inputs = tokenizer([f"Simplify this medical text for patients: {text}" for text in SAMPLE_REPORTS],
+                           return_tensors="pt", padding=True, truncation=True, max_length=512)
+        started = time.perf_counter()
+        with torch.no_grad():
+            for i in range(len(SAMPLE_REPORTS)):
+                model.generate(input_ids=inputs["input_ids"][i:i + 1], attention_mask=inputs["attention_mask"][i:i + 1],
+                               **kwargs, num_beams=1, do_sample=False)
+        greedy_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        generate_assisted(attach_draft_model(model, draft), dict(inputs), kwargs)
+        assisted_seconds = time.perf_counter() - started
+        print(json.dumps({"greedy_seconds": round(greedy_seconds, 2), "assisted_seconds": round(assisted_seconds, 2),
+                          "speedup": round(greedy_seconds / assisted_seconds, 2), **acceptance_report()}, indent=2))
+        return 0
+
+    from transformers import AutoTokenizer
+
+    import torch
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    model = _tiny_t5(tokenizer, d_model=64, layers=3, seed=0)
+    # A strong penalty keeps random models from repeating one token
+    kwargs = {"max_new_tokens": 48, "repetition_penalty": 5.0}
+    with torch.no_grad():
+        sample = model.generate(**tokenizer(SAMPLE_REPORTS[:1], return_tensors="pt"), **kwargs)
+    # End sequences part-way through, as real outputs do
+    model.config.eos_token_id = model.generation_config.eos_token_id = int(sample[0, 12])
+
+    noisy = _tiny_t5(tokenizer, d_model=64, layers=3, seed=0)
+    noisy.config.eos_token_id = model.config.eos_token_id
+    with torch.no_grad():
+        for parameter in noisy.parameters():
+            parameter.add_(torch.randn_like(parameter) * 0.05 * parameter.std())
+
+    checks = {
+        # Same weights: every proposal is accepted
+        "self_draft": verify(model, _tiny_t5(tokenizer, d_model=64, layers=3, seed=0), tokenizer, SAMPLE_REPORTS, kwargs),
+        # Perturbed weights: proposals are partly accepted
+        "noisy_draft": verify(model, noisy, tokenizer, SAMPLE_REPORTS, kwargs),
+        # Unrelated weights: almost every proposal is rejected
+        "random_draft": verify(model, _tiny_t5(tokenizer, d_model=32, layers=1, seed=1), tokenizer, SAMPLE_REPORTS, kwargs)
+    }
+    print(json.dumps(checks, indent=2))
+    if not all(result["identical"] for results in checks.values() for result in results.values()):
+        print("❌ Assisted decoding output differs from greedy generate")
+        return 1
+    print("✅ Assisted decoding matches greedy generate")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
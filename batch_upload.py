@@ -0,0 +1,103 @@
+"""
+Batch processing of many uploaded files.
+
+Files stream through a staged pipeline (pipeline.py): reading (PDF text
+layer or OCR) on the OCR pool, preprocessing, then simplification, so later
+files are read while earlier ones are being simplified. With a batch
+simplify function, the texts waiting for the model are grouped by token
+count into length buckets of up to MAX_BATCH_SIZE; otherwise several
+single requests are kept in flight. Results come back in upload order and
+are packed into one zip archive.
+
+Nothing here calls Streamlit; the caller consumes the results as they are
+yielded.
+"""
+
+import csv
+import io
+import os
+import zipfile
+from typing import Callable, Optional
+
+from inference_scheduler import MAX_BATCH_SIZE
+from ocr_engine import OCR_POOL_SIZE
+from pipeline import Stage, run_pipeline
+
+def process_files(files, read_text: Callable, preprocess: Callable, simplify: Callable,
+                  read_workers: int = OCR_POOL_SIZE, simplify_workers: int = MAX_BATCH_SIZE,
+                  initializer: Optional[Callable] = None, simplify_batch: Optional[Callable] = None,
+                  count_tokens: Optional[Callable] = None):
+    """
+    Generator of one entry dict per file, in upload order:
+    {name, text, error, report, read_seconds, simplify_seconds}.
+
+    read_text(file) -> str, preprocess(text) -> str and simplify(text) -> a
+    report dict as simplify_medical_report returns; any of them may raise.
+    simplify_batch(texts) -> report dicts, if given, is used instead of
+    simplify on length buckets of up to simplify_workers texts, ordered by
+    count_tokens(text) (default: characters).
+    initializer runs once in every worker thread.
+    """
+    def read(file):
+        text = read_text(file)
+        if not text:
+            raise ValueError("No text could be extracted")
+        return text
+
+    def simplify_text(text):
+        report = simplify(text)
+        if report.get("error"):
+            raise RuntimeError(report["error_message"])
+        return {"text": text, "report": report}
+
+    def simplify_texts(texts):
+        return [{"text": text, "report": report} if not report.get("error") else RuntimeError(report["error_message"])
+                for text, report in zip(texts, simplify_batch(texts))]
+
+    if simplify_batch is not None:
+        simplify_stage = Stage("simplify", simplify_texts, batch_size=simplify_workers,
+                               batch_key=count_tokens or len, initializer=initializer)
+    else:
+        simplify_stage = Stage("simplify", simplify_text, workers=simplify_workers, initializer=initializer)
+    stages = [
+        Stage("read", read, workers=read_workers, initializer=initializer),
+        Stage("preprocess", preprocess, initializer=initializer),
+        simplify_stage
+    ]
+    for record in run_pipeline(files, stages):
+        output = record["output"]
+        if record["error"]:
+            # A failed item keeps the value its failing stage was given
+            output = {"text": output if record["stage"] != "read" else "", "report": None}
+        yield {
+            "name": record["input"].name,
+            "text": output["text"],
+            "error": record["error"],
+            "report": output["report"],
+            "read_seconds": record["seconds"].get("read", 0.0),
+            "simplify_seconds": record["seconds"].get("preprocess", 0.0) + record["seconds"].get("simplify", 0.0)
+        }
+
+def build_archive(entries: list, report_text: Callable) -> bytes:
+    """Zip with one simplified report per file and a summary.csv"""
+    buffer = io.BytesIO()
+    used = set()
+    summary = io.StringIO()
+    writer = csv.writer(summary)
+    writer.writerow(["file", "status", "original_chars", "simplified_chars", "report"])
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for entry in entries:
+            stem = os.path.splitext(os.path.basename(entry["name"]))[0] or "report"
+            name, n = f"{stem}_simplified.txt", 1
+            while name in used:
+                n += 1
+                name = f"{stem}_{n}_simplified.txt"
+            if entry["error"]:
+                writer.writerow([entry["name"], f"error: {entry['error']}", len(entry["text"]), 0, ""])
+                continue
+            used.add(name)
+            report = entry["report"]
+            archive.writestr(name, report_text(report))
+            writer.writerow([entry["name"], "ok", report["original_length"], report["simplified_length"], name])
+        archive.writestr("summary.csv", summary.getvalue())
+    return buffer.getvalue()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Boilerplate stripping before the model.
+
+OCR'd multi-page reports repeat letterheads, page footers, disclaimers and
+signature blocks, which take up the 512-token input window and push
+findings past the truncation point. Before tokenization we remove:
+
+- lines repeated at the top or bottom of several pages of a document
+  (letterheads, footers; the first page keeps its copy) and page number
+  lines ("Page 2 of 3" anywhere, a bare "2 of 3" only at a page edge)
+- lines and sentences found in a hashed index learned from historical
+  reports. Only page furniture is learned: lines at the top or bottom of a
+  page (pages split on form feeds) that repeat verbatim across at least
+  --min-docs different reports. Sentences elsewhere are only learned from
+  a curated list of known boilerplate (--known, one per line), matched by
+  word 6-gram blocks.
+
+Section headers (report_sections.py) and anything with clinical vocabulary
+(findings, anatomy, measurements) are never learned or removed. Whether the
+reference simplifications mention a line is deliberately not used: they
+paraphrase findings, so a finding they always reword would look like
+boilerplate.
+
+Usage:
+    python boilerplate.py build [--reports DIR] [--known boilerplate.txt] [--min-docs 5] [--out boilerplate_index.json]
+    python boilerplate.py strip report.txt [--index boilerplate_index.json]
+    BOILERPLATE_INDEX=boilerplate_index.json streamlit run app.py
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Optional
+
+from metrics import METRICS
+from report_sections import starts_with_header
+
+# "0" disables stripping
+BOILERPLATE_STRIP = os.environ.get("BOILERPLATE_STRIP", "1") != "0"
+
+# Learned index written by `build`; empty uses only the per-document rules
+BOILERPLATE_INDEX = os.environ.get("BOILERPLATE_INDEX", "")
+DEFAULT_INDEX_FILE = "boilerplate_index.json"
+
+# Words per hashed block, and the share of a sentence's blocks that must be known
+BLOCK_SIZE = 6
+BLOCK_COVERAGE = 0.8
+
+# Lines at the top and bottom of a page checked for repeats across pages
+EDGE_LINES = 4
+
+# Index file format; older indexes learned from reference overlap and must be rebuilt
+INDEX_FORMAT = 2
+
+# Findings, anatomy, qualifiers and measurements; a line with any of these is never boilerplate
+_CLINICAL = re.compile(
+    r"\b(?:no|not|normal|abnormal\w*|acute|chronic|mild\w*|moderate\w*|severe\w*|stable|unchanged|"
+    r"unremarkable|negative|positive|impression|findings?|diagnos\w*|evidence|suspicious|consistent|"
+    r"mass\w*|lesions?|nodul\w*|fractur\w*|effusions?|edema|oedema|opacit\w*|consolidation|"
+    r"process|disease|infection|tumou?r|cancer|malignan\w*|benign|cyst\w*|stenosis|thromb\w*|"
+    r"\w*cardi\w*|\w*pulmon\w*|\w*hepat\w*|\w*renal|\w*neur\w*|\w*vascular|\w*ventric\w*|"
+    r"lungs?|heart|liver|kidneys?|brain|bone|chest|abdomen|pelvis|spine|"
+    r"\w+(?:itis|osis|oma|emia|aemia|ectomy|otomy|plasty|pathy|algia|megaly|ectasis|trophy|plasia)|"
+    r"\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|l|mmol|mmhg|cm|mm|bpm|%))(?!\w)",
+    re.IGNORECASE
+)
+
+# Page number lines (normalized); a bare "2 of 3" only counts at a page edge
+_PAGE_LABEL = re.compile(r"^page #+(?: (?:of )?#+)?$")
+_PAGE_NUMBER = re.compile(r"^(?:page #+(?: (?:of )?#+)?|#+ of #+)$")
+_PAGE_TOKEN = re.compile(r"\bpage\s*\d+(?:\s*(?:of|/)\s*\d+)?\b", re.IGNORECASE)
+# Sentence ends, but not after titles or initials ("Dr. Smith", "J. Smith")
+_SENTENCE = re.compile(r"(?<=[.!?])(?<!\b[A-Z][a-z]\.)(?<!\bMrs\.)(?<!\b[A-Z]\.)\s+(?=[A-Z])")
+
+def normalize(line: str) -> str:
+    """Lower case, digits as '#', punctuation dropped, single spaces"""
+    line = re.sub(r"\d+", "#", line.lower())
+    return " ".join(re.sub(r"[^\w#]+", " ", line).split())
+
+def _page_key(line: str) -> str:
+    """Line compared across pages: only "Page 2 of 3" is masked, other numbers must match"""
+    line = _PAGE_TOKEN.sub("page #", line.lower())
+    return " ".join(re.sub(r"[^\w#]+", " ", line).split())
+
+def looks_clinical(text: str) -> bool:
+    """True if the text mentions a finding, anatomy or a measurement"""
+    return bool(_CLINICAL.search(text))
+
+def _verbatim(line: str) -> str:
+    return " ".join(line.split())
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+def _blocks(normalized: str) -> set:
+    words = normalized.split()
+    return {_hash(" ".join(words[i:i + BLOCK_SIZE])) for i in range(len(words) - BLOCK_SIZE + 1)}
+
+class BoilerplateIndex:
+    """Hashes of known boilerplate lines (verbatim) and word blocks (normalized)"""
+
+    def __init__(self, lines=(), blocks=()):
+        self.lines = set(lines)
+        self.blocks = set(blocks)
+
+    def __len__(self) -> int:
+        return len(self.lines) + len(self.blocks)
+
+    def matches(self, unit: str) -> bool:
+        normalized = normalize(unit)
+        if not normalized or looks_clinical(unit):
+            return False
+        if _hash(_verbatim(unit)) in self.lines:
+            return True
+        blocks = _blocks(normalized)
+        return bool(blocks) and len(blocks & self.blocks) >= BLOCK_COVERAGE * len(blocks)
+
+    def save(self, path: str, **info):
+        with open(path, "w") as f:
+            json.dump({"format": INDEX_FORMAT, "lines": sorted(self.lines), "blocks": sorted(self.blocks), **info}, f)
+
+@lru_cache(maxsize=4)
+def load_index(path: str = BOILERPLATE_INDEX) -> BoilerplateIndex:
+    with open(path, "r") as f:
+        data = json.load(f)
+    if data.get("format") != INDEX_FORMAT:
+        raise ValueError(f"{path} was built by an older version; rebuild it with `python boilerplate.py build`")
+    return BoilerplateIndex(data["lines"], data["blocks"])
+
+def _edges(lines: list) -> dict:
+    """Index -> "top"/"bottom" for the first and last EDGE_LINES non-empty lines"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    edges = {i: "bottom" for i in filled[-EDGE_LINES:]}
+    edges.update({i: "top" for i in filled[:EDGE_LINES]})
+    return edges
+
+def _furniture_candidates(text: str) -> set:
+    """Verbatim lines at the top or bottom of each page (pages split on form feeds)"""
+    candidates = set()
+    for page in text.split("\f"):
+        lines = page.splitlines()
+        for i in _edges(lines):
+            line = _verbatim(lines[i])
+            if len(line.split()) >= 2 and not starts_with_header(line) and not looks_clinical(line):
+                candidates.add(line)
+    return candidates
+
+def learn_index(documents: list, min_docs: int = 5, known: list = ()):
+    """
+    Index of page furniture in `documents` (report texts): edge lines that
+    repeat verbatim in at least min_docs different reports and have no
+    clinical vocabulary. `known` adds curated boilerplate sentences, matched
+    anywhere. Returns (index, examples), examples being the most frequent
+    learned lines for review.
+    """
+    seen = Counter()
+    for text in documents:
+        seen.update(_furniture_candidates(text))
+    learned = [line for line, count in seen.most_common() if count >= min_docs]
+
+    blocks = set()
+    for sentence in known:
+        sentence = _verbatim(sentence)
+        if sentence and not looks_clinical(sentence):
+            learned.append(sentence)
+            blocks.update(_blocks(normalize(sentence)))
+    return BoilerplateIndex([_hash(line) for line in learned], blocks), learned[:20]
+
+def strip_boilerplate(text: str, index: Optional[BoilerplateIndex] = None,
+                      count_tokens: Optional[Callable] = None, max_tokens: Optional[int] = None,
+                      metrics=METRICS):
+    """
+    (text without boilerplate, stats). stats has "removed" (the removed
+    lines/sentences), "chars_saved" and, with count_tokens(text) -> int,
+    "tokens_saved" and whether stripping brought the text within max_tokens.
+    """
+    kept_lines, removed = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        normalized = normalize(stripped)
+        if not normalized or starts_with_header(stripped):
+            kept_lines.append(line)
+            continue
+        if _PAGE_LABEL.match(normalized):
+            removed.append(stripped)
+            continue
+        if index and index.matches(stripped):
+            removed.append(stripped)
+            continue
+        if index:
+            units = _SENTENCE.split(stripped)
+            kept_units = [unit for unit in units if not index.matches(unit)]
+            if len(kept_units) < len(units):
+                removed.extend(unit for unit in units if unit not in kept_units)
+                if kept_units:
+                    kept_lines.append(" ".join(kept_units))
+                continue
+        kept_lines.append(line)
+
+    cleaned = "\n".join(kept_lines).strip() if removed else text
+    stats = {"removed": removed, "chars_saved": len(text) - len(cleaned)}
+    if count_tokens is not None and removed:
+        before, after = count_tokens(text), count_tokens(cleaned)
+        stats["tokens_saved"] = before - after
+        stats["truncation_avoided"] = max_tokens is not None and before > max_tokens >= after
+        metrics.observe("boilerplate.tokens_saved", stats["tokens_saved"])
+        if stats["truncation_avoided"]:
+            metrics.inc("boilerplate.truncation_avoided")
+    metrics.inc("boilerplate.requests")
+    metrics.inc("boilerplate.lines_removed", len(removed))
+    return cleaned, stats
+
+def strip_repeated_lines(pages: list, metrics=METRICS):
+    """
+    (page texts, removed lines per page) without page headers and footers: lines
+    at the top (or bottom) of at least two pages, and of at least half of
+    them, with the same text apart from the page number. The first page
+    keeps its copy; section headers always stay.
+    """
+    split = [page.splitlines() for page in pages]
+    edges = [_edges(lines) for lines in split]
+    pages_with = Counter()
+    for lines, edge in zip(split, edges):
+        pages_with.update({
+            (side, _page_key(lines[i])) for i, side in edge.items()
+            if len(_page_key(lines[i]).split()) >= 2 and not starts_with_header(lines[i].strip())
+        })
+    repeated = {key for key, count in pages_with.items() if count >= max(2, len(pages) / 2)}
+
+    cleaned, removed, seen = [], [], set()
+    for lines, edge in zip(split, edges):
+        kept, dropped = [], []
+        for i, line in enumerate(lines):
+            key = (edge.get(i), _page_key(line))
+            if i in edge and (key in repeated and key in seen or _PAGE_NUMBER.match(normalize(line))):
+                dropped.append(line.strip())
+                continue
+            seen.add(key)
+            kept.append(line)
+        cleaned.append("\n".join(kept))
+        removed.append(dropped)
+    metrics.inc("boilerplate.lines_removed", sum(len(dropped) for dropped in removed))
+    return cleaned, removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Boilerplate stripping")
+    parser.add_argument("command", choices=["build", "strip"])
+    parser.add_argument("file", nargs="?", help="Report text file (strip)")
+    parser.add_argument("--corpus", default=None, help="Corpus CSV (default: CORPUS_PATH)")
+    parser.add_argument("--reports", default=None, help="Directory of historical report .txt files (pages split on form feeds)")
+    parser.add_argument("--known", default=None, help="Curated boilerplate sentences, one per line")
+    parser.add_argument("--min-docs", type=int, default=5, help="Documents a line must occur in")
+    parser.add_argument("--out", default=DEFAULT_INDEX_FILE)
+    parser.add_argument("--index", default=BOILERPLATE_INDEX, help="Learned index (strip)")
+    args = parser.parse_args()
+
+    if args.command == "strip":
+        if not args.file:
+            parser.error("strip needs a report file")
+        with open(args.file, "r") as f:
+            text = f.read()
+        cleaned, stats = strip_boilerplate(text, load_index(args.index) if args.index else None,
+                                           count_tokens=lambda value: len(value.split()))
+        print(cleaned)
+        print(f"\n🧹 Removed {len(stats['removed'])} lines, {stats['chars_saved']} characters "
+              f"({stats.get('tokens_saved', 0)} words)", file=sys.stderr)
+        return 0
+
+    from corpus import CORPUS_PATH, SOURCE_COLUMN, load_corpus, split_corpus
+
+    train, _ = split_corpus(load_corpus(args.corpus or CORPUS_PATH))
+    documents = train[SOURCE_COLUMN].tolist()
+    if args.reports:
+        for path in sorted(glob.glob(os.path.join(args.reports, "*.txt"))):
+            with open(path, "r", errors="replace") as f:
+                documents.append(f.read())
+    known = []
+    if args.known:
+        with open(args.known, "r") as f:
+            known = [line for line in f.read().splitlines() if line.strip()]
+    started = time.perf_counter()
+    index, examples = learn_index(documents, min_docs=args.min_docs, known=known)
+    index.save(args.out, documents=len(documents), min_docs=args.min_docs,
+               created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    print(f"✅ Learned {len(index.lines)} lines and {len(index.blocks)} blocks from {len(documents)} documents "
+          f"in {time.perf_counter() - started:.1f} s")
+    for example in examples:
+        print(f"   {example}")
+    print(f"📝 Wrote {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Cancellation of simplification requests.
+
+Every request carries a CancelToken. A token is cancelled when the Streamlit
+script run that is waiting for it is stopped (the user submitted again, or
+the tab was closed) or when its deadline passes. The scheduler drops queued
+jobs whose token is cancelled, and CancelCriteria is checked at every
+decoding step so a running generate call ends as soon as nobody is waiting
+for any of its outputs.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from metrics import METRICS
+
+try:
+    from transformers import StoppingCriteria
+except ImportError:
+    StoppingCriteria = object
+
+# Seconds a request may take from submit to result; 0 disables the deadline
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "300"))
+
+class GenerationCancelled(Exception):
+    """Raised to the waiter of a request that was cancelled"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled ({reason})")
+        self.reason = reason
+
+class CancelToken:
+    """
+    Thread-safe cancellation flag for one request.
+
+    watch, if given, is polled whenever the token is checked and returns a
+    reason string once the request should be abandoned.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, watch: Optional[Callable] = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.watch = watch
+        self.reason = None
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            # The first reason sticks
+            if self.reason is None:
+                self.reason = reason
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is not None:
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        elif self.watch is not None:
+            reason = self.watch()
+            if reason:
+                self.cancel(reason)
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (None without one)"""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+def watch_script_run(ctx) -> Optional[Callable]:
+    """
+    Watch function for a Streamlit script run context: reports "rerun" once
+    a full rerun is pending and "stopped" once the session shut down.
+
+    Fragment reruns do not interrupt the main script, so they are ignored.
+    """
+    requests = getattr(ctx, "script_requests", None)
+    if requests is None:
+        return None
+
+    def watch():
+        state = getattr(getattr(requests, "_state", None), "name", "CONTINUE")
+        if state == "STOP":
+            return "stopped"
+        if state == "RERUN" and not getattr(requests, "_rerun_data").fragment_id_queue:
+            return "rerun"
+        return None
+
+    return watch
+
+def record_abandoned(token: CancelToken, seconds: float = 0.0, prefix: str = "inference", metrics=METRICS):
+    """Count a cancelled request and the model time already spent on it"""
+    metrics.inc(f"{prefix}.jobs_abandoned")
+    metrics.inc(f"{prefix}.abandoned.{token.reason}")
+    if seconds:
+        metrics.inc(f"{prefix}.abandoned_seconds", seconds)
+
+class CancelCriteria(StoppingCriteria):
+    """
+    Stopping criterion for a batched generate call: stops every sequence
+    once all the requests in the batch are cancelled. Requests cancelled
+    while others are still waiting ride along until the batch finishes.
+    """
+
+    def __init__(self, tokens: list, metrics=METRICS):
+        self.tokens = list(tokens)
+        self.metrics = metrics
+        self.stopped = False
+
+    def all_cancelled(self) -> bool:
+        # Check every token so each one records its own reason
+        return all([token.cancelled for token in self.tokens])
+
+    def __call__(self, input_ids, scores=None, **kwargs):
+        import torch
+
+        if not self.stopped and self.all_cancelled():
+            self.stopped = True
+            self.metrics.inc("generation.stopped_early")
+            self.metrics.observe("generation.stopped_at_step", input_ids.shape[-1])
+        return torch.full((input_ids.shape[0],), self.stopped, dtype=torch.bool, device=input_ids.device)
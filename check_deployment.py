@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
 """
 Deployment status checker for Streamlit Cloud
+
+With --preflight it also loads the model and checks cold-load time, memory
+and latency against budgets, and estimates how many users the host can carry:
+
+    python check_deployment.py --preflight --concurrency 8 --max-rss-mb 3000
 """
 
+import argparse
+import importlib
+import json
 import os
 import sys
+import threading
+import time
 
 def check_files():
     """Check if all required files exist"""
@@ -109,8 +119,193 @@ def check_streamlit_config():
     
     return True
 
+# Performance budgets for --preflight
+DEFAULT_BUDGETS = {
+    "load_seconds": 180.0,
+    "rss_mb": 4096.0,
+    "single_p95_seconds": 15.0,
+    "concurrent_p95_seconds": 45.0
+}
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # Peak rather than current outside Linux (kilobytes on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def total_memory_mb():
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+def _latency_summary(latencies) -> dict:
+    from metrics import percentile
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_seconds": round(percentile(ordered, 50), 3),
+        "p95_seconds": round(percentile(ordered, 95), 3),
+        "mean_seconds": round(sum(ordered) / len(ordered), 3) if ordered else 0.0
+    }
+
+def measure_single_latency(run_batch, reports: dict, repeats: int) -> dict:
+    """Latency of one request at a time, per report length"""
+    results, everything = {}, []
+    for length, report in reports.items():
+        latencies = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run_batch([report], {})
+            latencies.append(time.perf_counter() - started)
+        results[length] = _latency_summary(latencies)
+        everything.extend(latencies)
+    results["all"] = _latency_summary(everything)
+    return results
+
+def measure_concurrent_latency(run_batch, reports: list, concurrency: int, rounds: int) -> dict:
+    """Latency and throughput with `concurrency` sessions submitting at once through the shared scheduler"""
+    from inference_scheduler import InferenceScheduler
+    from metrics import Metrics
+
+    scheduler = InferenceScheduler(run_batch, metrics=Metrics(), name="preflight")
+    latencies = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    try:
+        for round_number in range(rounds):
+            futures = []
+            for session in range(concurrency):
+                submitted = time.perf_counter()
+                future = scheduler.submit(reports[(round_number * concurrency + session) % len(reports)],
+                                          session_id=f"preflight-{session}")
+                def record(_, submitted=submitted):
+                    with lock:
+                        latencies.append(time.perf_counter() - submitted)
+                future.add_done_callback(record)
+                futures.append(future)
+            for future in futures:
+                future.result()
+    finally:
+        scheduler.stop()
+    elapsed = time.perf_counter() - started
+    summary = _latency_summary(latencies)
+    summary["concurrency"] = concurrency
+    summary["throughput_rps"] = round(len(latencies) / elapsed, 3) if elapsed else 0.0
+    return summary
+
+def estimate_users(throughput_rps: float, latency_seconds: float, think_seconds: float) -> int:
+    """
+    Concurrent users the host can carry (Little's law): each user sends one
+    report, waits for it, then reads/edits for think_seconds before the next.
+    """
+    return int(throughput_rps * (think_seconds + latency_seconds))
+
+def run_preflight(loader: str, concurrency: int, repeats: int, rounds: int) -> dict:
+    """Load the model like the app does, then measure memory and latency"""
+    from synthetic_reports import STANDARD_REPORTS, synthetic_reports
+
+    rss_before = resident_memory_mb()
+    started = time.perf_counter()
+    module_name, _, attr = loader.partition(":")
+    model, tokenizer = getattr(importlib.import_module(module_name), attr)()
+    load_seconds = time.perf_counter() - started
+    if model is None:
+        raise RuntimeError(f"{loader} did not return a model")
+
+    from app import generate_simplifications
+    run_batch = lambda texts, kwargs: generate_simplifications(texts, model, tokenizer, kwargs)
+
+    # The first call pays one-time costs (allocator growth, lazy init)
+    run_batch([STANDARD_REPORTS["short"]], {})
+    single = measure_single_latency(run_batch, STANDARD_REPORTS, repeats)
+    concurrent = measure_concurrent_latency(run_batch, synthetic_reports(concurrency * rounds),
+                                            concurrency, rounds)
+    return {
+        "loader": loader,
+        "cores": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "total_memory_mb": total_memory_mb(),
+        "load_seconds": round(load_seconds, 1),
+        "rss_mb": round(resident_memory_mb(), 0),
+        "model_rss_mb": round(resident_memory_mb() - rss_before, 0),
+        "single": single,
+        "concurrent": concurrent
+    }
+
+def check_preflight(args) -> bool:
+    """Performance preflight against budgets"""
+    print("\n⏱️ Running performance preflight (this loads the model)...")
+    try:
+        report = run_preflight(args.loader, args.concurrency, args.repeats, args.rounds)
+    except Exception as e:
+        print(f"❌ Preflight failed: {e}")
+        return False
+
+    measured = {
+        "load_seconds": report["load_seconds"],
+        "rss_mb": report["rss_mb"],
+        "single_p95_seconds": report["single"]["all"]["p95_seconds"],
+        "concurrent_p95_seconds": report["concurrent"]["p95_seconds"]
+    }
+    budgets = {name: getattr(args, f"max_{name}") for name in DEFAULT_BUDGETS}
+    report["budgets"] = budgets
+    report["violations"] = [name for name, value in measured.items() if value > budgets[name]]
+
+    users = estimate_users(report["concurrent"]["throughput_rps"], report["concurrent"]["mean_seconds"],
+                           args.think_seconds)
+    report["estimated_users"] = users
+    if report["total_memory_mb"] and report["model_rss_mb"] > 0:
+        # Independent replicas that would fit in 80% of RAM (see replica_pool.py / shared_weights.py)
+        report["replicas_by_memory"] = int(report["total_memory_mb"] * 0.8 // report["model_rss_mb"])
+
+    for name, value in measured.items():
+        status = "❌" if name in report["violations"] else "✅"
+        print(f"{status} {name}: {value} (budget {budgets[name]})")
+    for length, summary in report["single"].items():
+        if length != "all":
+            print(f"   {length} report: p50 {summary['p50_seconds']} s, p95 {summary['p95_seconds']} s")
+    print(f"📈 Throughput at {args.concurrency} concurrent sessions: {report['concurrent']['throughput_rps']} req/s")
+    print(f"👥 Estimated concurrent users: {users} "
+          f"(one report per user every {args.think_seconds:.0f} s of reading)")
+    if args.expected_users and users < args.expected_users:
+        report["violations"].append("expected_users")
+        print(f"❌ Expected load of {args.expected_users} users exceeds the estimate")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Wrote {args.json}")
+    return not report["violations"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Deployment checks and performance preflight")
+    parser.add_argument("--preflight", action="store_true", help="Also measure load time, memory and latency")
+    parser.add_argument("--loader", default="app:load_medical_model", help="module:function returning (model, tokenizer)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Simultaneous sessions for the concurrent test")
+    parser.add_argument("--repeats", type=int, default=3, help="Requests per report length for the single test")
+    parser.add_argument("--rounds", type=int, default=2, help="Bursts of concurrent requests")
+    parser.add_argument("--think-seconds", type=float, default=120.0,
+                        help="Time a user spends between requests, for the user estimate")
+    parser.add_argument("--expected-users", type=int, default=0, help="Fail if the estimate is below this")
+    parser.add_argument("--json", default=None, help="Write the preflight report to this file")
+    for name, value in DEFAULT_BUDGETS.items():
+        parser.add_argument(f"--max-{name.replace('_', '-')}", type=float, default=value, help=f"Budget for {name}")
+    return parser.parse_args(argv)
+
 def main():
     """Main checker function"""
+    args = parse_args()
     print("🚀 Streamlit Cloud Deployment Checker")
     print("=" * 50)
     
@@ -120,6 +315,8 @@ def main():
         ("Packages", check_packages),
         ("Streamlit Config", check_streamlit_config)
     ]
+    if args.preflight:
+        checks.append(("Performance Preflight", lambda: check_preflight(args)))
     
     passed = 0
     total = len(checks)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Compiled inference mode (torch.compile).
+
+The encoder and the per-token decoder step (model.forward during generate)
+are compiled with dynamic shapes. Inputs are padded to a small set of
+sequence-length buckets, and every bucket is warmed up at startup so all
+graphs exist before the first user request; after warm-up each compiled
+call runs under the "eager_on_recompile" stance (scoped to that call), so
+an unexpected shape runs eager rather than recompiling. Any compile or
+runtime failure switches the model back to eager automatically.
+
+The caller's model is left untouched: compiled forwards are installed on a
+copy that shares its weights, and LoRA adapters are merged into a deep
+copy (merging rewrites the base weights in place, which would corrupt a
+model shared through st.cache_resource). With adapters that copy holds a
+second set of weights.
+
+The chosen buckets, warm-up timings and outcome are written to
+compile_report.json next to the inductor artifacts in COMPILE_CACHE_DIR,
+which also makes later startups reuse the compiled kernels.
+
+Usage:
+    COMPILED_INFERENCE=1 streamlit run app.py
+    python compiled_inference.py [--buckets 64,128,256,512] [--benchmark]
+
+Replica pool with compiled replicas:
+    REPLICA_WORKERS=2 REPLICA_LOADER=compiled_inference:load_compiled_model streamlit run app.py
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+from metrics import METRICS
+
+COMPILED_INFERENCE = os.environ.get("COMPILED_INFERENCE", "0") != "0"
+
+# Padded input lengths (tokens); the model reads at most 512
+SEQUENCE_BUCKETS = tuple(int(b) for b in os.environ.get("COMPILE_BUCKETS", "64,128,256,512").split(","))
+
+COMPILE_CACHE_DIR = os.environ.get("COMPILE_CACHE_DIR", "./compile_cache")
+REPORT_FILE = "compile_report.json"
+
+# Batch sizes run per bucket: two sizes so the batch dimension is compiled as dynamic
+WARMUP_BATCH_SIZES = (1, 2)
+
+# Enough decoder steps for the growing cache length to become dynamic
+WARMUP_NEW_TOKENS = 4
+
+# Compiler stance for serving calls: never compile on a user request, unseen shapes run eager
+SERVING_STANCE = "eager_on_recompile"
+
+def bucket_length(length: int, buckets=SEQUENCE_BUCKETS) -> int:
+    """Smallest bucket that fits length (the largest bucket if none does)"""
+    for bucket in sorted(buckets):
+        if length <= bucket:
+            return bucket
+    return max(buckets)
+
+def pad_to_bucket(inputs, buckets, pad_token_id: int):
+    """Right-pad tokenized inputs to their sequence-length bucket"""
+    import torch.nn.functional as F
+
+    length = inputs["input_ids"].shape[1]
+    target = bucket_length(length, buckets)
+    if target <= length:
+        return inputs
+    inputs["input_ids"] = F.pad(inputs["input_ids"], (0, target - length), value=pad_token_id)
+    inputs["attention_mask"] = F.pad(inputs["attention_mask"], (0, target - length), value=0)
+    return inputs
+
+class _EagerFallback:
+    """
+    Call the compiled function under state["stance"], switching the model to
+    eager on the first failure
+    """
+
+    def __init__(self, compiled, eager, state: dict, metrics=METRICS):
+        self.compiled = compiled
+        self.eager = eager
+        self.state = state
+        self.metrics = metrics
+
+    def __call__(self, *args, **kwargs):
+        import torch
+
+        if self.state["mode"] == "compiled":
+            try:
+                with torch.compiler.set_stance(self.state["stance"]):
+                    return self.compiled(*args, **kwargs)
+            except Exception as e:
+                self.state.update(mode="eager", error=f"{type(e).__name__}: {e}")
+                self.metrics.inc("compile.fallbacks")
+                self.metrics.set("compile.enabled", 0)
+        return self.eager(*args, **kwargs)
+
+def _serving_copy(model):
+    """Copy of model and its encoder that shares their weights and submodules"""
+    clone = copy.copy(model)
+    clone._modules = dict(model._modules)
+    encoder = model.get_encoder()
+    for name, module in model._modules.items():
+        if module is encoder:
+            clone._modules[name] = copy.copy(encoder)
+    return clone
+
+def _restore_eager(model):
+    # Drop the instance attributes so the class forward methods are used again
+    for module in (model, model.get_encoder()):
+        module.__dict__.pop("forward", None)
+
+def warm_up(model, tokenizer, buckets=SEQUENCE_BUCKETS, generation_kwargs=None) -> list:
+    """Run generate once per bucket and batch size; returns per-run timings"""
+    import torch
+
+    kwargs = dict(generation_kwargs or {})
+    kwargs.update(max_new_tokens=WARMUP_NEW_TOKENS, min_new_tokens=WARMUP_NEW_TOKENS)
+    filler = tokenizer.convert_tokens_to_ids("▁the")
+    timings = []
+    for bucket in sorted(buckets):
+        for batch_size in WARMUP_BATCH_SIZES:
+            input_ids = torch.full((batch_size, bucket), filler, dtype=torch.long)
+            input_ids[:, -1] = tokenizer.eos_token_id
+            attention_mask = torch.ones_like(input_ids)
+            started = time.perf_counter()
+            with torch.no_grad():
+                model.generate(input_ids=input_ids, attention_mask=attention_mask, **kwargs)
+            timings.append({"bucket": bucket, "batch_size": batch_size,
+                            "seconds": round(time.perf_counter() - started, 3)})
+    return timings
+
+def compile_model(model, tokenizer, buckets=SEQUENCE_BUCKETS, generation_kwargs=None,
+                  cache_dir: str = COMPILE_CACHE_DIR, model_type: str = None, metrics=METRICS):
+    """
+    Compile the encoder and decoder step, warm up every bucket and record the outcome.
+
+    Returns a new model to serve (a deep copy with LoRA adapters merged, or
+    a copy sharing the weights) with _sequence_buckets set when compilation
+    succeeded, and an eager copy otherwise; model itself is not modified.
+    The report is attached as model._compile_report.
+    """
+    import torch
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Torch may already have filled in its /tmp default; keep the artifacts with the report
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = os.path.abspath(os.path.join(cache_dir, "inductor"))
+
+    if hasattr(model, "merge_and_unload"):
+        # PEFT wrappers add graph breaks; merged weights compile as plain T5.
+        # Merging writes into the base weights, so it happens on a copy
+        model = copy.deepcopy(model).merge_and_unload()
+    else:
+        model = _serving_copy(model)
+    model.eval()
+    if model_type:
+        model._model_type = model_type
+
+    report = {
+        "torch_version": torch.__version__,
+        "buckets": sorted(buckets),
+        "warmup_batch_sizes": list(WARMUP_BATCH_SIZES),
+        "artifacts_dir": os.environ["TORCHINDUCTOR_CACHE_DIR"],
+        "mode": "eager",
+        "error": None
+    }
+    # Warm-up must compile, not fall back
+    state = {"mode": "compiled", "error": None, "stance": "default"}
+    encoder = model.get_encoder()
+    eager_encoder, eager_step = encoder.forward, model.forward
+
+    started = time.perf_counter()
+    try:
+        encoder.forward = _EagerFallback(torch.compile(eager_encoder, dynamic=True), eager_encoder, state, metrics)
+        model.forward = _EagerFallback(torch.compile(eager_step, dynamic=True), eager_step, state, metrics)
+        report["warmup"] = warm_up(model, tokenizer, buckets, generation_kwargs)
+        if state["mode"] != "compiled":
+            raise RuntimeError(state["error"])
+        state["stance"] = SERVING_STANCE
+        report["mode"] = "compiled"
+        model._sequence_buckets = tuple(sorted(buckets))
+    except Exception as e:
+        _restore_eager(model)
+        report["error"] = state["error"] or f"{type(e).__name__}: {e}"
+        model.__dict__.pop("_sequence_buckets", None)
+    report["warmup_seconds"] = round(time.perf_counter() - started, 1)
+
+    try:
+        from torch._dynamo.utils import counters
+        report["graphs"] = counters["stats"]["unique_graphs"]
+    except Exception:
+        pass
+
+    metrics.set("compile.enabled", 1 if report["mode"] == "compiled" else 0)
+    metrics.set("compile.warmup_seconds", report["warmup_seconds"])
+    with open(os.path.join(cache_dir, REPORT_FILE), "w") as f:
+        json.dump(report, f, indent=2)
+    model._compile_report = report
+    return model
+
+def load_compiled_model():
+    """Replica loader: the app model, compiled and warmed up in the worker"""
+    from app import GENERATION_KWARGS, get_model_type, load_medical_model
+
+    model, tokenizer = load_medical_model()
+    if model is None:
+        return None, None
+    model = compile_model(model, tokenizer, generation_kwargs=GENERATION_KWARGS,
+                          model_type=get_model_type(model))
+    return model, tokenizer
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile and warm up the model, and record the result")
+    parser.add_argument("--buckets", default=",".join(map(str, SEQUENCE_BUCKETS)),
+                        help="Comma-separated padded sequence lengths")
+    parser.add_argument("--out", default=COMPILE_CACHE_DIR, help="Artifact and report directory")
+    parser.add_argument("--benchmark", action="store_true", help="Time the sample reports eager vs compiled")
+    args = parser.parse_args()
+    buckets = tuple(int(b) for b in args.buckets.split(","))
+
+    from app import GENERATION_KWARGS, generate_simplifications, get_model_type, load_medical_model
+    from replica_pool import SAMPLE_REPORTS
+
+    model, tokenizer = load_medical_model()
+    if model is None:
+        print("❌ Could not load the medical model")
+        return 1
+    model_type = get_model_type(model)
+
+    def time_samples(model):
+        started = time.perf_counter()
+        for text in SAMPLE_REPORTS:
+            generate_simplifications([text], model, tokenizer)
+        return (time.perf_counter() - started) / len(SAMPLE_REPORTS)
+
+    eager_seconds = time_samples(model) if args.benchmark else None
+    model = compile_model(model, tokenizer, buckets, GENERATION_KWARGS, args.out, model_type)
+    report = model._compile_report
+    if args.benchmark and report["mode"] == "compiled":
+        report["eager_seconds_per_report"] = round(eager_seconds, 3)
+        report["compiled_seconds_per_report"] = round(time_samples(model), 3)
+        with open(os.path.join(args.out, REPORT_FILE), "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps({k: v for k, v in report.items() if k != "warmup"}, indent=2))
+    if report["mode"] != "compiled":
+        print(f"❌ Compilation failed, serving would fall back to eager: {report['error']}")
+        return 1
+    print(f"✅ Compiled {len(buckets)} buckets in {report['warmup_seconds']} s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+Training corpus access.
+
+The notebook fine-tunes on a CSV of complex/simplified sentence pairs; the
+offline tools (vocabulary shortlist, distillation, tuning) read the same
+data through here. CORPUS_PATH may point at a local copy of the CSV.
+"""
+
+import os
+
+import pandas as pd
+
+CORPUS_PATH = os.environ.get(
+    "CORPUS_PATH", "hf://datasets/vishnukantshukla/medical-complex-to-simple-10k/medical_simplified.csv"
+)
+SOURCE_COLUMN = "Standard_English"
+TARGET_COLUMN = "Simplified_English"
+
+# Same 80/20 split as the notebook, made reproducible
+EVAL_FRACTION = 0.2
+SPLIT_SEED = 42
+
+def load_corpus(path: str = CORPUS_PATH, limit: int = None) -> pd.DataFrame:
+    """Source/target pairs with empty rows dropped"""
+    df = pd.read_csv(path)
+    missing = {SOURCE_COLUMN, TARGET_COLUMN} - set(df.columns)
+    if missing:
+        raise ValueError(f"Corpus {path} is missing columns: {', '.join(sorted(missing))}")
+    df = df[[SOURCE_COLUMN, TARGET_COLUMN]].dropna()
+    df = df[(df[SOURCE_COLUMN].str.strip() != "") & (df[TARGET_COLUMN].str.strip() != "")]
+    df = df.reset_index(drop=True)
+    return df.head(limit) if limit else df
+
+def split_corpus(df: pd.DataFrame, eval_fraction: float = EVAL_FRACTION, seed: int = SPLIT_SEED):
+    """(train, eval) split of the corpus"""
+    shuffled = df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    n_eval = int(len(shuffled) * eval_fraction)
+    return shuffled.iloc[n_eval:].reset_index(drop=True), shuffled.iloc[:n_eval].reset_index(drop=True)
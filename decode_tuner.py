@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Decoding-parameter tuner.
+
+Sweeps beam count, output length limit, repetition and length penalty and
+input truncation over an eval sample, measures per-report latency and
+quality (token F1 against the reference simplifications) for each
+configuration, and keeps the latency/quality Pareto front. The chosen
+operating points are written to DECODING_CONFIG, which the app loads at
+startup:
+
+    generation_kwargs  fastest configuration within --relative-floor of the
+                       hand-picked settings' quality (and above --quality-floor)
+    degraded           fastest configuration within --degraded-floor, used
+                       by admission control under load
+
+Usage:
+    python decode_tuner.py [--limit 30] [--grid '{"num_beams": [1, 4]}'] [--out decoding_config.json]
+    python decode_tuner.py --tiny --corpus medical_simplified.csv --limit 5   # offline smoke test
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+# Tuned settings written by this tool and loaded by the app if present
+DECODING_CONFIG = os.environ.get("DECODING_CONFIG", "decoding_config.json")
+
+# Values swept by default; "max_input_tokens" is the prompt truncation length
+DEFAULT_GRID = {
+    "num_beams": [1, 2, 4],
+    "max_new_tokens": [128, 256],
+    "repetition_penalty": [1.0, 1.1, 1.3],
+    "length_penalty": [0.8, 1.0, 1.2],
+    "max_input_tokens": [256, 512]
+}
+
+def load_decoding_config(path: str = DECODING_CONFIG):
+    """Tuned settings from `path`, or None if the file does not exist"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def expand_grid(grid: dict) -> list:
+    """Configurations of the grid; length penalty only varies with beam search"""
+    names = list(grid)
+    configs, seen = [], set()
+    for values in itertools.product(*(grid[name] for name in names)):
+        config = dict(zip(names, values))
+        if config.get("num_beams", 1) == 1:
+            config.pop("length_penalty", None)
+        key = tuple(sorted(config.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+def generation_kwargs(config: dict) -> dict:
+    """generate() keyword arguments of a configuration"""
+    kwargs = {name: value for name, value in config.items() if name != "max_input_tokens"}
+    kwargs["do_sample"] = False
+    kwargs["early_stopping"] = kwargs.get("num_beams", 1) > 1
+    return kwargs
+
+def evaluate_config(model, tokenizer, config: dict, sources, references) -> dict:
+    """Per-report latency (batch of one, as a lone session) and mean token F1"""
+    import torch
+
+    from distill import PROMPT, token_f1
+    from metrics import percentile
+
+    kwargs = generation_kwargs(config)
+    latencies, scores, lengths = [], [], []
+    for source, reference in zip(sources, references):
+        inputs = tokenizer(PROMPT.format(source), return_tensors="pt",
+                           max_length=config.get("max_input_tokens", 512), truncation=True)
+        started = time.perf_counter()
+        with torch.no_grad():
+            output = model.generate(**inputs, **kwargs)
+        latencies.append(time.perf_counter() - started)
+        text = tokenizer.decode(output[0], skip_special_tokens=True)
+        scores.append(token_f1(text, reference))
+        lengths.append(len(text) / max(len(reference), 1))
+    ordered = sorted(latencies)
+    return {
+        "config": config,
+        "quality": round(sum(scores) / len(scores), 4),
+        "mean_seconds": round(sum(latencies) / len(latencies), 4),
+        "p95_seconds": round(percentile(ordered, 95), 4),
+        "length_ratio": round(sum(lengths) / len(lengths), 3)
+    }
+
+def pareto_front(results: list) -> list:
+    """Results not beaten on both latency and quality, fastest first"""
+    front, best = [], float("-inf")
+    for result in sorted(results, key=lambda r: (r["mean_seconds"], -r["quality"])):
+        if result["quality"] > best:
+            front.append(result)
+            best = result["quality"]
+    return front
+
+def fastest_above(results: list, floor: float):
+    eligible = [result for result in results if result["quality"] >= floor]
+    return min(eligible, key=lambda r: r["mean_seconds"]) if eligible else None
+
+def choose_operating_points(results: list, baseline: dict, relative_floor: float, degraded_floor: float,
+                            quality_floor: float = 0.0) -> dict:
+    floor = max(quality_floor, baseline["quality"] * relative_floor)
+    chosen = fastest_above(results, floor) or baseline
+    degraded = fastest_above(results, max(quality_floor, baseline["quality"] * degraded_floor)) or chosen
+    return {"floor": round(floor, 4), "chosen": chosen, "degraded": degraded}
+
+def write_config(path: str, points: dict, baseline: dict, front: list, examples: int):
+    chosen, degraded = points["chosen"], points["degraded"]
+    config = {
+        "generation_kwargs": generation_kwargs(chosen["config"]),
+        "max_input_tokens": chosen["config"].get("max_input_tokens", 512),
+        # Degraded mode keeps the normal prompt truncation
+        "degraded_generation_kwargs": generation_kwargs(degraded["config"]),
+        "quality_floor": points["floor"],
+        "chosen": chosen,
+        "degraded": degraded,
+        "baseline": baseline,
+        "pareto_front": front,
+        "eval_examples": examples,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    with open(path, "w") as f:
+        json.dump(config, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/quality tuning of the decoding settings")
+    parser.add_argument("--corpus", default=None, help="Corpus CSV (default: CORPUS_PATH)")
+    parser.add_argument("--limit", type=int, default=30, help="Eval examples per configuration")
+    parser.add_argument("--grid", default=None, help="JSON object overriding parts of the default grid")
+    parser.add_argument("--relative-floor", type=float, default=0.98,
+                        help="Chosen settings keep at least this share of the hand-picked settings' quality")
+    parser.add_argument("--degraded-floor", type=float, default=0.90, help="Same, for the degraded mode")
+    parser.add_argument("--quality-floor", type=float, default=0.0, help="Absolute minimum token F1")
+    parser.add_argument("--out", default=DECODING_CONFIG, help="Config file the app loads")
+    parser.add_argument("--tiny", action="store_true", help="Tiny random model (offline smoke test)")
+    args = parser.parse_args()
+
+    from corpus import CORPUS_PATH, SOURCE_COLUMN, TARGET_COLUMN, load_corpus, split_corpus
+
+    _, evaluation = split_corpus(load_corpus(args.corpus or CORPUS_PATH))
+    sources = evaluation[SOURCE_COLUMN].tolist()[:args.limit]
+    references = evaluation[TARGET_COLUMN].tolist()[:args.limit]
+    if not sources:
+        print("❌ No eval examples")
+        return 1
+
+    if args.tiny:
+        from load_test import load_tiny_model
+        model, tokenizer = load_tiny_model()
+    else:
+        from app import load_medical_model
+        model, tokenizer = load_medical_model()
+    if model is None:
+        print("❌ Could not load the medical model")
+        return 1
+
+    from app import DEFAULT_GENERATION_KWARGS, DEFAULT_MAX_INPUT_TOKENS
+
+    # Always the hand-picked settings, not a previous tuning: otherwise each rerun
+    # would measure its floor against the last tuned point and the floors would compound
+    baseline_config = {name: DEFAULT_GENERATION_KWARGS[name] for name in
+                       ("num_beams", "max_new_tokens", "repetition_penalty", "length_penalty")
+                       if name in DEFAULT_GENERATION_KWARGS}
+    baseline_config["max_input_tokens"] = DEFAULT_MAX_INPUT_TOKENS
+    if baseline_config.get("num_beams", 1) == 1:
+        baseline_config.pop("length_penalty", None)
+    grid = {**DEFAULT_GRID, **json.loads(args.grid or "{}")}
+    configs = expand_grid(grid)
+    if baseline_config not in configs:
+        configs.insert(0, baseline_config)
+
+    # One untimed call so lazy initialization is not charged to the first configuration
+    evaluate_config(model, tokenizer, baseline_config, sources[:1], references[:1])
+    results = []
+    for i, config in enumerate(configs, start=1):
+        result = evaluate_config(model, tokenizer, config, sources, references)
+        results.append(result)
+        print(f"[{i}/{len(configs)}] {json.dumps(config)}: F1 {result['quality']:.3f}, {result['mean_seconds']:.2f} s/report")
+
+    baseline = next(result for result in results if result["config"] == baseline_config)
+    if not baseline["quality"] and not args.quality_floor:
+        print("⚠️ The hand-picked settings score 0 F1, so the quality floor is 0 - pass --quality-floor")
+    front = pareto_front(results)
+    points = choose_operating_points(results, baseline, args.relative_floor, args.degraded_floor, args.quality_floor)
+    write_config(args.out, points, baseline, front, len(sources))
+
+    print(f"\n📈 Pareto front ({len(front)} of {len(results)} configurations):")
+    for result in front:
+        print(f"   {result['mean_seconds']:.2f} s/report  F1 {result['quality']:.3f}  {json.dumps(result['config'])}")
+    chosen = points["chosen"]
+    print(f"✅ Chosen (F1 >= {points['floor']:.3f}): {json.dumps(chosen['config'])} - "
+          f"{baseline['mean_seconds'] / chosen['mean_seconds']:.2f}x faster than the hand-picked settings")
+    print(f"⚡ Degraded mode: {json.dumps(points['degraded']['config'])}")
+    print(f"📝 Wrote {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
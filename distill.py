@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Knowledge distillation of the LoRA-tuned FLAN-T5-base into a small student.
+
+1. teacher: the LoRA model simplifies every training source; its output
+   sequence and the top-k logits at each output position are cached to
+   disk in shards (an interrupted run resumes at the next missing shard).
+2. train:   a FLAN-T5-small student (same tokenizer) learns from the cache
+   with sequence-level cross-entropy on the teacher outputs plus a
+   temperature-scaled KL term against the teacher's top-k distribution.
+3. compare: teacher and student are scored on the eval split (token F1
+   against the reference simplification and against the teacher) and timed.
+
+Usage:
+    python distill.py teacher [--limit 2000]
+    python distill.py train [--epochs 3]
+    python distill.py compare [--limit 100]
+    MODEL_VARIANT=student streamlit run app.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+DISTILL_CACHE_DIR = os.environ.get("DISTILL_CACHE_DIR", "./distill_cache")
+STUDENT_MODEL_DIR = os.environ.get("STUDENT_MODEL_DIR", "./medical_student")
+STUDENT_BASE = "google/flan-t5-small"
+
+# Teacher logits kept per output position
+TOP_K = 16
+SHARD_SIZE = 256
+
+# Loss = ALPHA * sequence cross-entropy + (1 - ALPHA) * KL to the teacher's top-k
+ALPHA = 0.5
+TEMPERATURE = 2.0
+
+PROMPT = "Simplify this medical text for patients: {}"
+
+def _shard_path(cache_dir: str, index: int) -> str:
+    return os.path.join(cache_dir, f"teacher_{index:05d}.pt")
+
+def cache_teacher_outputs(teacher, tokenizer, sources, cache_dir: str = DISTILL_CACHE_DIR,
+                          generation_kwargs: dict = None, batch_size: int = 8, top_k: int = TOP_K,
+                          progress=print) -> int:
+    """Generate teacher outputs and top-k logits for all sources; returns shards written"""
+    import torch
+
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = {"examples": len(sources), "shard_size": SHARD_SIZE, "top_k": top_k,
+                "generation_kwargs": generation_kwargs or {}}
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            if json.load(f) != manifest:
+                raise ValueError(f"{cache_dir} holds teacher outputs for different settings; remove it first")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    written = 0
+    for shard, start in enumerate(range(0, len(sources), SHARD_SIZE)):
+        path = _shard_path(cache_dir, shard)
+        if os.path.exists(path):
+            continue
+        started = time.perf_counter()
+        examples = []
+        shard_sources = sources[start:start + SHARD_SIZE]
+        for offset in range(0, len(shard_sources), batch_size):
+            batch = list(shard_sources[offset:offset + batch_size])
+            inputs = tokenizer([PROMPT.format(text) for text in batch], return_tensors="pt",
+                               max_length=512, truncation=True, padding=True)
+            with torch.no_grad():
+                sequences = teacher.generate(**inputs, **(generation_kwargs or {}))
+                # Teacher-forced pass over its own output for the logit targets
+                logits = teacher(**inputs, decoder_input_ids=sequences[:, :-1]).logits.float()
+            values, indices = logits.topk(top_k, dim=-1)
+            for i, source in enumerate(batch):
+                target = sequences[i, 1:]
+                length = int((target != tokenizer.pad_token_id).sum())
+                examples.append({
+                    "source": source,
+                    "input_ids": inputs["input_ids"][i][inputs["attention_mask"][i].bool()].clone(),
+                    "target_ids": target[:length].clone(),
+                    "topk_values": values[i, :length].half().clone(),
+                    "topk_indices": indices[i, :length].int().clone()
+                })
+        # Write atomically so an interrupted run never leaves a partial shard
+        torch.save(examples, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        written += 1
+        progress(f"shard {shard}: {len(examples)} examples in {time.perf_counter() - started:.0f} s")
+    return written
+
+def load_teacher_cache(cache_dir: str = DISTILL_CACHE_DIR) -> list:
+    import torch
+
+    shards = sorted(name for name in os.listdir(cache_dir) if name.startswith("teacher_") and name.endswith(".pt"))
+    examples = []
+    for name in shards:
+        examples.extend(torch.load(os.path.join(cache_dir, name)))
+    return examples
+
+def distillation_loss(student_logits, target_ids, topk_values, topk_indices, mask,
+                      alpha: float = ALPHA, temperature: float = TEMPERATURE):
+    """Sequence cross-entropy on the teacher output plus KL to the teacher's top-k distribution"""
+    import torch.nn.functional as F
+
+    mask = mask.float()
+    tokens = mask.sum().clamp(min=1)
+    ce = F.cross_entropy(student_logits.transpose(1, 2), target_ids, reduction="none")
+    ce = (ce * mask).sum() / tokens
+
+    teacher_log_probs = F.log_softmax(topk_values.float() / temperature, dim=-1)
+    student_log_probs = F.log_softmax(student_logits / temperature, dim=-1).gather(-1, topk_indices.long())
+    kl = (teacher_log_probs.exp() * (teacher_log_probs - student_log_probs)).sum(-1)
+    kl = (kl * mask).sum() / tokens * temperature ** 2
+    return alpha * ce + (1 - alpha) * kl, ce.detach(), kl.detach()
+
+def _collate(examples, pad_token_id: int):
+    from torch.nn.utils.rnn import pad_sequence
+
+    input_ids = pad_sequence([e["input_ids"] for e in examples], batch_first=True, padding_value=pad_token_id)
+    targets = pad_sequence([e["target_ids"] for e in examples], batch_first=True, padding_value=pad_token_id)
+    mask = pad_sequence([e["target_ids"].new_ones(len(e["target_ids"])) for e in examples], batch_first=True)
+    return {
+        "input_ids": input_ids,
+        "attention_mask": (input_ids != pad_token_id).long(),
+        "target_ids": targets.long(),
+        "mask": mask.bool(),
+        "topk_values": pad_sequence([e["topk_values"] for e in examples], batch_first=True),
+        "topk_indices": pad_sequence([e["topk_indices"] for e in examples], batch_first=True)
+    }
+
+def train_student(student, tokenizer, examples, epochs: int = 3, batch_size: int = 16, lr: float = 3e-4,
+                  alpha: float = ALPHA, temperature: float = TEMPERATURE, seed: int = 42, progress=print):
+    """Fit the student to the cached teacher outputs; returns per-epoch mean losses"""
+    import random
+    import torch
+
+    random.seed(seed)
+    torch.manual_seed(seed)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr)
+    history = []
+    student.train()
+    for epoch in range(epochs):
+        order = list(range(len(examples)))
+        random.shuffle(order)
+        totals = Counter()
+        batches = 0
+        for start in range(0, len(order), batch_size):
+            batch = _collate([examples[i] for i in order[start:start + batch_size]], tokenizer.pad_token_id)
+            labels = batch["target_ids"].masked_fill(~batch["mask"], -100)
+            logits = student(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"], labels=labels).logits
+            loss, ce, kl = distillation_loss(logits, batch["target_ids"], batch["topk_values"],
+                                             batch["topk_indices"], batch["mask"], alpha, temperature)
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            totals.update(loss=loss.item(), ce=ce.item(), kl=kl.item())
+            batches += 1
+        history.append({name: round(value / max(batches, 1), 4) for name, value in totals.items()})
+        progress(f"epoch {epoch + 1}: {history[-1]}")
+    student.eval()
+    return history
+
+def token_f1(prediction: str, reference: str) -> float:
+    """Unigram F1 between two texts (lower-cased words)"""
+    predicted, expected = Counter(prediction.lower().split()), Counter(reference.lower().split())
+    overlap = sum((predicted & expected).values())
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / sum(predicted.values()), overlap / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+def compare_models(models: dict, tokenizer, sources, references, generation_kwargs: dict) -> dict:
+    """Quality and per-report latency of each model; the first model is the teacher"""
+    import torch
+
+    outputs, report = {}, {}
+    for name, model in models.items():
+        texts, started = [], time.perf_counter()
+        for source in sources:
+            inputs = tokenizer(PROMPT.format(source), return_tensors="pt", max_length=512, truncation=True)
+            with torch.no_grad():
+                generated = model.generate(**inputs, **generation_kwargs)
+            texts.append(tokenizer.decode(generated[0], skip_special_tokens=True))
+        seconds = (time.perf_counter() - started) / max(len(sources), 1)
+        outputs[name] = texts
+        report[name] = {
+            "parameters": sum(p.numel() for p in model.parameters()),
+            "seconds_per_report": round(seconds, 3),
+            "f1_vs_reference": round(sum(map(token_f1, texts, references)) / max(len(texts), 1), 4)
+        }
+    teacher = next(iter(models))
+    for name in models:
+        report[name]["f1_vs_teacher"] = round(
+            sum(map(token_f1, outputs[name], outputs[teacher])) / max(len(sources), 1), 4)
+        report[name]["speedup"] = round(report[teacher]["seconds_per_report"] / report[name]["seconds_per_report"], 2)
+    return report
+
+def load_student_model(path: str = STUDENT_MODEL_DIR):
+    """Trained student and its tokenizer (the app's "student" model variant)"""
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(path)
+    model.eval()
+    model._model_type = "Distilled FLAN-T5-small student"
+    return model, AutoTokenizer.from_pretrained(path)
+
+def _load_teacher():
+    from app import load_medical_model
+
+    teacher, tokenizer = load_medical_model("lora")
+    if teacher is None:
+        raise RuntimeError("Could not load the LoRA teacher model")
+    if hasattr(teacher, "merge_and_unload"):
+        teacher = teacher.merge_and_unload()
+    return teacher.float().eval(), tokenizer
+
+def main():
+    parser = argparse.ArgumentParser(description="Distil the LoRA model into a small student")
+    parser.add_argument("command", choices=["teacher", "train", "compare"])
+    parser.add_argument("--corpus", default=None, help="Corpus CSV (default: CORPUS_PATH)")
+    parser.add_argument("--cache", default=DISTILL_CACHE_DIR, help="Teacher output cache")
+    parser.add_argument("--out", default=STUDENT_MODEL_DIR, help="Student model directory")
+    parser.add_argument("--student-base", default=STUDENT_BASE, help="Student initialization")
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N examples")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--lr", type=float, default=3e-4)
+    args = parser.parse_args()
+
+    from corpus import CORPUS_PATH, SOURCE_COLUMN, TARGET_COLUMN, load_corpus, split_corpus
+
+    train, evaluation = split_corpus(load_corpus(args.corpus or CORPUS_PATH))
+    if args.limit:
+        train, evaluation = train.head(args.limit), evaluation.head(args.limit)
+
+    if args.command == "teacher":
+        from app import GENERATION_KWARGS
+
+        teacher, tokenizer = _load_teacher()
+        written = cache_teacher_outputs(teacher, tokenizer, train[SOURCE_COLUMN].tolist(), args.cache,
+                                        GENERATION_KWARGS)
+        print(f"✅ Teacher outputs cached in {args.cache} ({written} new shards)")
+        return 0
+
+    if args.command == "train":
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+        examples = load_teacher_cache(args.cache)
+        if not examples:
+            print(f"❌ No teacher outputs in {args.cache}; run 'python distill.py teacher' first")
+            return 1
+        tokenizer = AutoTokenizer.from_pretrained("./medical_lora_adapters")
+        student = AutoModelForSeq2SeqLM.from_pretrained(args.student_base).float()
+        history = train_student(student, tokenizer, examples, args.epochs, args.batch_size, args.lr)
+        student.save_pretrained(args.out, safe_serialization=True)
+        tokenizer.save_pretrained(args.out)
+        with open(os.path.join(args.out, "distillation.json"), "w") as f:
+            json.dump({"examples": len(examples), "student_base": args.student_base, "alpha": ALPHA,
+                       "temperature": TEMPERATURE, "history": history}, f, indent=2)
+        print(f"✅ Student saved to {args.out}")
+        return 0
+
+    from app import GENERATION_KWARGS
+
+    teacher, tokenizer = _load_teacher()
+    student, _ = load_student_model(args.out)
+    sample = evaluation.head(args.limit or 100)
+    report = compare_models({"teacher": teacher, "student": student}, tokenizer,
+                            sample[SOURCE_COLUMN].tolist(), sample[TARGET_COLUMN].tolist(), GENERATION_KWARGS)
+    print(json.dumps(report, indent=2))
+    with open(os.path.join(args.out, "comparison.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Golden-output regression harness for inference changes.
+
+`record` stores the outputs of the plain PyTorch path (hand-picked decoding
+settings, no compiled model, static cache, shortlist, draft model or tuned
+config) on a fixed set of eval-split and synthetic reports. `compare` runs
+another engine or configuration over the same reports - a different
+loader, environment flags, or decoding overrides - and reports exact-match
+rate, token edit distance, semantic similarity, reports whose numbers
+changed, and speedup. It exits non-zero when a threshold is not met, so a
+faster engine is only deployed if it says the same thing to patients.
+
+Each run happens in a fresh process so environment flags read at import
+time (COMPILED_INFERENCE, STATIC_KV_CACHE, ...) take effect.
+
+Usage:
+    python golden_outputs.py record [--limit 100] [--golden golden_outputs.json]
+    python golden_outputs.py compare --env STATIC_KV_CACHE=1
+    python golden_outputs.py compare --loader shared_weights:load_shared_model
+    python golden_outputs.py compare --generation '{"num_beams": 1}' --min-exact 0.8
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from replica_pool import DEFAULT_LOADER
+
+# Optional import with graceful fallback
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+DEFAULT_GOLDEN_FILE = "golden_outputs.json"
+
+# Embedding model for semantic similarity (token F1 is used without sentence-transformers)
+SIMILARITY_MODEL = os.environ.get("SIMILARITY_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Settings the reference run clears, so it is the plain PyTorch path
+REFERENCE_ENV = {
+    "COMPILED_INFERENCE": "0",
+    "STATIC_KV_CACHE": "0",
+    "VOCAB_SHORTLIST": "",
+    "DRAFT_MODEL": "",
+    "DECODING_CONFIG": "",
+    "MODEL_VARIANT": "lora"
+}
+
+def golden_sources(corpus_path: str, limit: int, synthetic: int) -> list:
+    """Fixed comparison set: the first eval-split reports plus synthetic ones of every length"""
+    from corpus import SOURCE_COLUMN, load_corpus, split_corpus
+    from synthetic_reports import synthetic_reports
+
+    _, evaluation = split_corpus(load_corpus(corpus_path))
+    return evaluation[SOURCE_COLUMN].tolist()[:limit] + synthetic_reports(synthetic)
+
+def run_outputs(sources: list, loader: str, generation_kwargs: dict, batch_size: int) -> dict:
+    """Outputs, output token ids and generation seconds of this process's engine"""
+    import importlib
+
+    from app import generate_simplifications
+
+    module_name, _, attr = loader.partition(":")
+    model, tokenizer = getattr(importlib.import_module(module_name), attr)()
+    if model is None:
+        raise RuntimeError(f"{loader} did not return a model")
+    # Untimed call so lazy initialization is not charged to the first batch
+    generate_simplifications(sources[:1], model, tokenizer, generation_kwargs)
+    outputs, seconds = [], []
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        started = time.perf_counter()
+        texts = generate_simplifications(batch, model, tokenizer, generation_kwargs)
+        seconds.append(time.perf_counter() - started)
+        outputs.extend(texts)
+    return {
+        "outputs": outputs,
+        "token_ids": [tokenizer(text, add_special_tokens=False)["input_ids"] for text in outputs],
+        "batch_seconds": seconds,
+        "total_seconds": sum(seconds)
+    }
+
+def run_in_subprocess(sources: list, loader: str, generation_kwargs: dict, batch_size: int, env: dict) -> dict:
+    """run_outputs in a fresh Python process with `env` applied on top of ours"""
+    with tempfile.TemporaryDirectory() as directory:
+        job, result = os.path.join(directory, "job.json"), os.path.join(directory, "result.json")
+        with open(job, "w") as f:
+            json.dump({"sources": sources, "loader": loader, "generation_kwargs": generation_kwargs,
+                       "batch_size": batch_size}, f)
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "_run", job, result],
+                                   env={**os.environ, **env})
+        if completed.returncode != 0:
+            raise RuntimeError(f"Engine run failed (exit code {completed.returncode})")
+        with open(result, "r") as f:
+            return json.load(f)
+
+def edit_distance(a: list, b: list) -> int:
+    """Levenshtein distance between two token sequences"""
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, start=1):
+        current = [i]
+        for j, y in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+def _numbers(text: str) -> Counter:
+    return Counter(re.findall(r"\d+(?:[.,]\d+)?", text))
+
+def similarity_scores(references: list, candidates: list):
+    """(per-pair similarity, method): embedding cosine, or token F1 without sentence-transformers"""
+    if SENTENCE_TRANSFORMERS_AVAILABLE:
+        try:
+            model = SentenceTransformer(SIMILARITY_MODEL)
+            a = model.encode(references, normalize_embeddings=True)
+            b = model.encode(candidates, normalize_embeddings=True)
+            return [float(x @ y) for x, y in zip(a, b)], "embedding cosine"
+        except Exception as e:
+            print(f"⚠️ Could not load {SIMILARITY_MODEL} ({e}); falling back to token F1")
+    from distill import token_f1
+
+    return [token_f1(candidate, reference) for reference, candidate in zip(references, candidates)], "token F1"
+
+def compare_outputs(golden: dict, candidate: dict, worst: int = 5) -> dict:
+    """Agreement of candidate outputs with the golden ones, and the speedup"""
+    references, outputs = golden["outputs"], candidate["outputs"]
+    distances = [
+        edit_distance(a, b) / max(len(a), 1) for a, b in zip(golden["token_ids"], candidate["token_ids"])
+    ]
+    similarities, method = similarity_scores(references, outputs)
+    numbers_changed = [i for i, (a, b) in enumerate(zip(references, outputs)) if _numbers(a) != _numbers(b)]
+    ranked = sorted(range(len(outputs)), key=lambda i: (similarities[i], -distances[i]))
+    return {
+        "examples": len(outputs),
+        "exact_match": sum(a == b for a, b in zip(references, outputs)) / len(outputs) if outputs else 0.0,
+        "mean_token_edit_distance": round(sum(distances) / len(distances), 4) if distances else 0.0,
+        "max_token_edit_distance": round(max(distances, default=0.0), 4),
+        "mean_similarity": round(sum(similarities) / len(similarities), 4) if similarities else 1.0,
+        "min_similarity": round(min(similarities, default=1.0), 4),
+        "similarity_method": method,
+        "numbers_changed": len(numbers_changed),
+        "reference_seconds": round(golden["total_seconds"], 2),
+        "candidate_seconds": round(candidate["total_seconds"], 2),
+        "speedup": round(golden["total_seconds"] / candidate["total_seconds"], 2) if candidate["total_seconds"] else None,
+        "worst": [{
+            "source": golden["sources"][i],
+            "reference": references[i],
+            "candidate": outputs[i],
+            "similarity": round(similarities[i], 4),
+            "token_edit_distance": round(distances[i], 4)
+        } for i in ranked[:worst] if references[i] != outputs[i]]
+    }
+
+def check_thresholds(report: dict, args) -> list:
+    """Failure messages for every threshold the comparison does not meet"""
+    failures = []
+    if report["exact_match"] < args.min_exact:
+        failures.append(f"exact match {report['exact_match']:.1%} < {args.min_exact:.1%}")
+    if report["mean_token_edit_distance"] > args.max_edit_distance:
+        failures.append(f"mean token edit distance {report['mean_token_edit_distance']:.3f} > {args.max_edit_distance}")
+    if report["mean_similarity"] < args.min_similarity:
+        failures.append(f"mean {report['similarity_method']} {report['mean_similarity']:.3f} < {args.min_similarity}")
+    if report["numbers_changed"] > args.max_numbers_changed:
+        failures.append(f"{report['numbers_changed']} outputs changed their numbers (allowed {args.max_numbers_changed})")
+    if args.min_speedup and (report["speedup"] or 0) < args.min_speedup:
+        failures.append(f"speedup {report['speedup']}x < {args.min_speedup}x")
+    return failures
+
+def _parse_env(pairs) -> dict:
+    env = {}
+    for pair in pairs or []:
+        name, separator, value = pair.partition("=")
+        if not separator:
+            raise ValueError(f"--env expects NAME=VALUE, got {pair!r}")
+        env[name] = value
+    return env
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "_run":
+        # Child process of record/compare
+        with open(sys.argv[2], "r") as f:
+            job = json.load(f)
+        result = run_outputs(job["sources"], job["loader"], job["generation_kwargs"], job["batch_size"])
+        with open(sys.argv[3], "w") as f:
+            json.dump(result, f)
+        return 0
+
+    parser = argparse.ArgumentParser(description="Golden-output regression harness")
+    parser.add_argument("command", choices=["record", "compare"])
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN_FILE, help="Reference outputs file")
+    parser.add_argument("--corpus", default=None, help="Corpus CSV for 'record' (default: CORPUS_PATH)")
+    parser.add_argument("--limit", type=int, default=100, help="Eval-split reports to record")
+    parser.add_argument("--synthetic", type=int, default=12, help="Synthetic short/medium/long reports to record")
+    parser.add_argument("--batch-size", type=int, default=1, help="Reports per generate call")
+    parser.add_argument("--loader", default=DEFAULT_LOADER, help="module:function returning (model, tokenizer)")
+    parser.add_argument("--env", action="append", metavar="NAME=VALUE", help="Environment flag for the run")
+    parser.add_argument("--generation", default=None, help="JSON object of decoding overrides for the run")
+    parser.add_argument("--min-exact", type=float, default=0.95, help="Minimum share of identical outputs")
+    parser.add_argument("--max-edit-distance", type=float, default=0.05,
+                        help="Maximum mean token edit distance (relative to the reference length)")
+    parser.add_argument("--min-similarity", type=float, default=0.95, help="Minimum mean semantic similarity")
+    parser.add_argument("--max-numbers-changed", type=int, default=0, help="Outputs allowed to change a number")
+    parser.add_argument("--min-speedup", type=float, default=0.0, help="Minimum speedup over the reference")
+    parser.add_argument("--report", default=None, help="Also write the comparison as JSON")
+    args = parser.parse_args()
+
+    generation_kwargs = json.loads(args.generation or "{}")
+
+    if args.command == "record":
+        from corpus import CORPUS_PATH
+
+        sources = golden_sources(args.corpus or CORPUS_PATH, args.limit, args.synthetic)
+        env = {**REFERENCE_ENV, **_parse_env(args.env)}
+        print(f"⏳ Recording {len(sources)} reference outputs with {args.loader}...")
+        result = run_in_subprocess(sources, args.loader, generation_kwargs, args.batch_size, env)
+        golden = {
+            "sources": sources,
+            **result,
+            "loader": args.loader,
+            "env": env,
+            "generation_kwargs": generation_kwargs,
+            "batch_size": args.batch_size,
+            "cpu_count": os.cpu_count(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        with open(args.golden, "w") as f:
+            json.dump(golden, f)
+        print(f"✅ Wrote {args.golden}: {len(sources)} outputs in {result['total_seconds']:.1f} s")
+        return 0
+
+    with open(args.golden, "r") as f:
+        golden = json.load(f)
+    if golden.get("cpu_count") != os.cpu_count():
+        print(f"⚠️ The reference was timed on {golden.get('cpu_count')} cores, this host has {os.cpu_count()} - "
+              "the speedup is not comparable")
+    # The candidate starts from the reference settings and changes only what was asked
+    env = {**golden["env"], **_parse_env(args.env)}
+    print(f"⏳ Running {len(golden['sources'])} reports with {args.loader} {json.dumps(env)}...")
+    candidate = run_in_subprocess(golden["sources"], args.loader, {**golden["generation_kwargs"], **generation_kwargs},
+                                  golden["batch_size"], env)
+    report = compare_outputs(golden, candidate)
+    report.update({"loader": args.loader, "env": env, "generation_kwargs": generation_kwargs})
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps({key: value for key, value in report.items() if key != "worst"}, indent=2))
+    for example in report["worst"]:
+        print(f"\n🔍 similarity {example['similarity']:.3f}, edit distance {example['token_edit_distance']:.3f}")
+        print(f"   reference: {example['reference'][:300]}")
+        print(f"   candidate: {example['candidate'][:300]}")
+
+    failures = check_thresholds(report, args)
+    if failures:
+        print("\n❌ Not equivalent to the reference: " + "; ".join(failures))
+        return 1
+    print(f"\n✅ Equivalent to the reference ({report['exact_match']:.1%} exact, {report['speedup']}x)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Bounded-memory ingestion of uploaded images.
+
+Headers are read before any pixel data is decoded. JPEGs are decoded in
+draft mode straight to grayscale at a reduced DCT scale close to the OCR
+target resolution; other formats (PNG, TIFF, palette images) can only be
+decoded at full size and are reduced immediately after. The memory that
+decode will take is worked out from the header and charged to the
+session's budget before load(), so an image that would not fit is
+rejected without being decoded. A small JPEG thumbnail is kept for
+display.
+"""
+
+import io
+import math
+import os
+import threading
+from typing import Callable, Optional
+
+from PIL import Image, ImageOps
+
+# ~A4 page at 300 DPI (2480 x 3508) is 8.7 MP - enough for Tesseract
+OCR_MAX_PIXELS = 12_000_000
+
+# Images larger than this are rejected from their header alone
+MAX_SOURCE_PIXELS = 120_000_000
+
+# Display preview size (longest side) and JPEG quality
+THUMBNAIL_SIZE = (1024, 1024)
+THUMBNAIL_QUALITY = 85
+
+# Images at the OCR pixel cap a single session may hold decoded at once
+# (the single upload plus the files being read by a batch)
+SESSION_IMAGE_PAGES = int(os.environ.get("SESSION_IMAGE_PAGES", 4))
+
+# Grayscale page at the pixel cap plus an upper bound for its thumbnail
+PAGE_BYTES = OCR_MAX_PIXELS + THUMBNAIL_SIZE[0] * THUMBNAIL_SIZE[1]
+
+# Bytes of decoded image data a single session may hold
+SESSION_MEMORY_BUDGET = SESSION_IMAGE_PAGES * PAGE_BYTES
+
+# Largest decode of a single image (the whole session budget)
+MAX_DECODE_BYTES = SESSION_MEMORY_BUDGET
+
+class ImageBudgetError(ValueError):
+    """Raised when an upload exceeds the pixel or per-session memory budget"""
+
+def _target_size(width: int, height: int, max_pixels: int):
+    """Largest size with the same aspect ratio that fits in max_pixels"""
+    if width * height <= max_pixels:
+        return width, height
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def decode_nbytes(image: Image.Image) -> int:
+    """
+    Peak memory of decoding an opened (not yet loaded) image, from its header
+
+    Pillow keeps 1-band 8-bit images at one byte per pixel, 16-bit ones at
+    two and everything else at four; modes that are converted to grayscale
+    before reducing hold the converted copy as well.
+    """
+    pixels = image.width * image.height
+    if image.mode in ("1", "L", "P"):
+        per_pixel = 1
+    elif image.mode.startswith("I;16"):
+        per_pixel = 2
+    else:
+        per_pixel = 4
+    converted = pixels if image.mode not in ("L", "LA", "RGB", "RGBA") else 0
+    return pixels * per_pixel + converted
+
+def decode_for_ocr(file, max_pixels: int = OCR_MAX_PIXELS, reserve: Optional[Callable[[int], None]] = None):
+    """
+    Decode an image at an OCR-appropriate resolution.
+
+    Image.open only parses the header, so oversized images are rejected
+    before any pixel data is decoded. reserve is called with the decode's
+    peak memory (decode_nbytes, after any JPEG draft reduction) before the
+    pixel data is read and may raise ImageBudgetError to stop it.
+
+    Returns a grayscale image of at most max_pixels and a dict describing how
+    it was produced.
+    """
+    image = Image.open(file)
+    source_format = image.format
+    source_size = image.size
+    if source_size[0] * source_size[1] > MAX_SOURCE_PIXELS:
+        raise ImageBudgetError(
+            f"Image is {source_size[0]}x{source_size[1]} pixels; "
+            f"the limit is {MAX_SOURCE_PIXELS // 1_000_000} megapixels."
+        )
+
+    target = _target_size(*source_size, max_pixels)
+
+    # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale directly to grayscale
+    draft_used = False
+    if image.format == "JPEG":
+        draft_used = image.draft("L", target) is not None
+
+    # Checked on the header (and the reduced JPEG draft size) before load()
+    nbytes = decode_nbytes(image)
+    if nbytes > MAX_DECODE_BYTES:
+        raise ImageBudgetError(
+            f"Decoding this {source_format or 'image'} at {image.width}x{image.height} pixels would take "
+            f"{nbytes / 1e6:.0f} MB; the limit is {MAX_DECODE_BYTES / 1e6:.0f} MB. "
+            "Upload a JPEG or a smaller scan."
+        )
+    if reserve is not None:
+        reserve(nbytes)
+
+    # Only the first frame of animated GIFs / multi-page TIFFs is used
+    image.seek(0)
+    if image.mode not in ("L", "LA", "RGB", "RGBA"):
+        # Palette, bitonal and 16-bit images cannot be box-reduced directly
+        image = image.convert("L")
+
+    # Integer box reduction first (cheap), then an exact resample
+    if image.width * image.height > max_pixels:
+        factor = min(image.width // target[0], image.height // target[1])
+        if factor > 1:
+            image = image.reduce(factor)
+        if image.width * image.height > max_pixels:
+            image = image.resize(_target_size(*image.size, max_pixels), Image.Resampling.LANCZOS)
+
+    # Rotate and drop colour only after reducing, on the small image
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "L":
+        image = image.convert("L")
+
+    info = {
+        "format": source_format,
+        "original_size": source_size,
+        "ocr_size": image.size,
+        "draft_used": draft_used,
+        "decode_nbytes": nbytes
+    }
+    return image, info
+
+def make_thumbnail(image: Image.Image, size=THUMBNAIL_SIZE) -> bytes:
+    """Encode a small JPEG preview for st.image"""
+    thumbnail = image.copy()
+    thumbnail.thumbnail(size, Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+def image_nbytes(image: Image.Image) -> int:
+    """Approximate memory held by a decoded image"""
+    return image.width * image.height * len(image.getbands())
+
+class SessionImageBudget:
+    """Tracks the decoded image memory held by one session (batch workers charge it concurrently)"""
+
+    def __init__(self, limit: int = SESSION_MEMORY_BUDGET):
+        self.limit = limit
+        self.held = {}
+        self._lock = threading.Lock()
+
+    @property
+    def used(self) -> int:
+        with self._lock:
+            return sum(self.held.values())
+
+    def charge(self, key: str, nbytes: int):
+        """Reserve memory for key, replacing any earlier reservation under the same key"""
+        with self._lock:
+            used_by_others = sum(self.held.values()) - self.held.get(key, 0)
+            if used_by_others + nbytes > self.limit:
+                raise ImageBudgetError(
+                    f"This session already holds {used_by_others / 1e6:.1f} MB of images; "
+                    f"adding {nbytes / 1e6:.1f} MB would exceed the {self.limit / 1e6:.0f} MB limit."
+                )
+            self.held[key] = nbytes
+
+    def release(self, key: str):
+        with self._lock:
+            self.held.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.held.clear()
+
+def ingest_image(file, budget: Optional[SessionImageBudget] = None, key: Optional[str] = None,
+                 max_pixels: int = OCR_MAX_PIXELS) -> dict:
+    """
+    Ingest an uploaded image: header check, reduced decode, thumbnail.
+
+    The decode's peak memory is charged to budget under key before any
+    pixel data is read; once reduced, the charge is lowered to the OCR image
+    and thumbnail.
+    """
+    key = key or "default"
+    reserve = (lambda nbytes: budget.charge(key, nbytes)) if budget is not None else None
+    try:
+        ocr_image, info = decode_for_ocr(file, max_pixels=max_pixels, reserve=reserve)
+        thumbnail = make_thumbnail(ocr_image)
+        nbytes = image_nbytes(ocr_image) + len(thumbnail)
+        if budget is not None:
+            budget.charge(key, nbytes)
+    except Exception:
+        if budget is not None:
+            budget.release(key)
+        raise
+
+    return {
+        "ocr_image": ocr_image,
+        "thumbnail": thumbnail,
+        "format": info["format"],
+        "original_size": info["original_size"],
+        "ocr_size": info["ocr_size"],
+        "draft_used": info["draft_used"],
+        "nbytes": nbytes
+    }
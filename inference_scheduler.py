@@ -0,0 +1,207 @@
+"""
+Cross-session inference scheduler.
+
+The medical model is shared by every Streamlit session (st.cache_resource).
+Instead of each session thread calling model.generate concurrently, sessions
+submit jobs to a single scheduler thread that owns the model. Queued jobs
+with the same generation settings are batched into one generate call, and
+sessions are served round-robin so one user's burst cannot starve others.
+Jobs may carry a CancelToken (cancellation.py); cancelled jobs are dropped
+from the queue, and their waiters get GenerationCancelled.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Optional
+
+from cancellation import CancelToken, GenerationCancelled, record_abandoned
+from metrics import METRICS
+
+# Defaults for batching
+MAX_BATCH_SIZE = 8
+BATCH_WINDOW_SECONDS = 0.02
+
+class InferenceJob:
+    """One simplification request waiting in the scheduler queue"""
+
+    def __init__(self, text: str, session_id: str, generation_kwargs: dict,
+                 cancel_token: Optional[CancelToken] = None):
+        self.text = text
+        self.session_id = session_id
+        self.generation_kwargs = generation_kwargs
+        self.cancel_token = cancel_token
+        self.generation_key = tuple(sorted(generation_kwargs.items()))
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class InferenceScheduler:
+    """
+    Single background thread that runs all model work for the process.
+
+    run_batch(texts, generation_kwargs) must return one output string per
+    input text. It is only ever called from the scheduler thread. With
+    cancellable=True it is called as run_batch(texts, generation_kwargs,
+    cancel_tokens) and should stop early once every token is cancelled.
+    """
+
+    def __init__(self, run_batch: Callable, max_batch_size: int = MAX_BATCH_SIZE,
+                 batch_window: float = BATCH_WINDOW_SECONDS, metrics=METRICS, name: str = "inference",
+                 cancellable: bool = False):
+        self.run_batch = run_batch
+        self.cancellable = cancellable
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.metrics = metrics
+        self.name = name
+
+        # Per-session FIFO queues, visited round-robin
+        self._queues = OrderedDict()
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name=f"{name}-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str, session_id: Optional[str] = None,
+               generation_kwargs: Optional[dict] = None, cancel_token: Optional[CancelToken] = None) -> Future:
+        """Queue a job and return a Future resolving to the generated text"""
+        job = InferenceJob(text, session_id or "anonymous", dict(generation_kwargs or {}), cancel_token)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Inference scheduler is stopped")
+            self._queues.setdefault(job.session_id, deque()).append(job)
+            self._pending += 1
+            self._record_depth()
+            self._condition.notify()
+        self.metrics.inc(f"{self.name}.jobs_submitted")
+        return job.future
+
+    def result(self, future: Future, cancel_token: Optional[CancelToken] = None, poll: float = 0.25) -> str:
+        """
+        Wait for a submitted job. With a token, cancellation (including its
+        deadline) is noticed while the job is still queued.
+        """
+        if cancel_token is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=poll)
+            except FutureTimeout:
+                if cancel_token.cancelled:
+                    # Still queued: the scheduler thread will skip it
+                    future.cancel()
+                    raise GenerationCancelled(cancel_token.reason)
+            except CancelledError:
+                raise GenerationCancelled(cancel_token.reason or "cancelled")
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return self._pending
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the scheduler thread; queued jobs are cancelled"""
+        with self._condition:
+            self._stopped = True
+            for queue in self._queues.values():
+                for job in queue:
+                    job.future.cancel()
+            self._queues.clear()
+            self._pending = 0
+            self._record_depth()
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _record_depth(self):
+        self.metrics.set(f"{self.name}.queue_depth", self._pending)
+        self.metrics.set(f"{self.name}.active_sessions", len(self._queues))
+
+    def _take_batch(self):
+        """Take up to max_batch_size jobs sharing the head job's settings, one per session per round"""
+        batch = []
+        generation_key = None
+        while len(batch) < self.max_batch_size:
+            taken = False
+            for session_id in list(self._queues):
+                queue = self._queues[session_id]
+                if generation_key is None:
+                    generation_key = queue[0].generation_key
+                if queue[0].generation_key != generation_key:
+                    continue
+                batch.append(queue.popleft())
+                taken = True
+                # Move the served session to the back of the rotation
+                self._queues.move_to_end(session_id)
+                if not queue:
+                    del self._queues[session_id]
+                if len(batch) >= self.max_batch_size:
+                    break
+            if not taken:
+                break
+        self._pending -= len(batch)
+        self._record_depth()
+        return batch
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+            # Give concurrent submitters a moment to join this batch
+            if self.batch_window:
+                time.sleep(self.batch_window)
+            with self._condition:
+                if self._stopped:
+                    return
+                batch = self._take_batch()
+            if batch:
+                self._run(batch)
+
+    def _cancelled(self, job) -> bool:
+        return job.cancel_token is not None and job.cancel_token.cancelled
+
+    def _run(self, batch):
+        # Drop jobs whose callers already gave up
+        for job in batch:
+            if self._cancelled(job):
+                job.future.cancel()
+                record_abandoned(job.cancel_token, prefix=self.name, metrics=self.metrics)
+        batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        for job in batch:
+            self.metrics.observe(f"{self.name}.queue_wait_seconds", started - job.enqueued_at)
+        self.metrics.inc(f"{self.name}.batches")
+        self.metrics.observe(f"{self.name}.batch_size", len(batch))
+
+        try:
+            texts = [job.text for job in batch]
+            if self.cancellable:
+                outputs = self.run_batch(texts, batch[0].generation_kwargs, [job.cancel_token for job in batch])
+            else:
+                outputs = self.run_batch(texts, batch[0].generation_kwargs)
+        except Exception as e:
+            self.metrics.inc(f"{self.name}.batch_errors")
+            for job in batch:
+                job.future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        self.metrics.observe(f"{self.name}.batch_seconds", finished - started)
+        completed = 0
+        for job, output in zip(batch, outputs):
+            if self._cancelled(job):
+                # Possibly cut short; nobody is waiting for it
+                record_abandoned(job.cancel_token, (finished - started) / len(batch), self.name, self.metrics)
+                job.future.set_exception(GenerationCancelled(job.cancel_token.reason))
+                continue
+            self.metrics.observe(f"{self.name}.latency_seconds", finished - job.enqueued_at)
+            job.future.set_result(output)
+            completed += 1
+        self.metrics.inc(f"{self.name}.jobs_completed", completed)
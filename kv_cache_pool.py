@@ -0,0 +1,154 @@
+"""
+Preallocated (static) KV caches for generate.
+
+By default every decoder step grows the past key/value tensors, and beam
+search re-gathers them into new tensors, so a 256-token, 4-beam request
+allocates and copies thousands of tensors. Here generation writes into
+caches allocated once at their final size:
+
+- self-attention keys/values are sized for max_new_tokens and reordered
+  between beams in place (through one scratch buffer shared by all layers)
+- cross-attention keys/values are computed once; all beams of an input
+  share the same encoder output, so they are never reordered
+
+Caches are returned to a small pool keyed by shape (rows, decoder length,
+encoder length, dtype) and reset for the next request. Encoder inputs are
+padded to sequence-length buckets so shapes repeat across requests.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import METRICS
+
+# Optional imports with graceful fallbacks
+try:
+    import torch
+    from transformers import EncoderDecoderCache, StaticCache
+    from transformers.cache_utils import StaticLayer
+    STATIC_CACHE_AVAILABLE = True
+except ImportError:
+    StaticLayer = object
+    STATIC_CACHE_AVAILABLE = False
+
+STATIC_KV_CACHE = STATIC_CACHE_AVAILABLE and os.environ.get("STATIC_KV_CACHE", "0") != "0"
+
+# Idle caches kept for reuse, least recently used evicted first
+KV_POOL_MAX_BYTES = int(os.environ.get("KV_POOL_MAX_BYTES", 1 << 30))
+
+class _BeamStaticLayer(StaticLayer):
+    """Static self-attention layer that reorders beams without allocating"""
+
+    def __init__(self, max_cache_len: int, scratch: dict):
+        super().__init__(max_cache_len=max_cache_len)
+        self.scratch = scratch
+
+    def _scratch(self, like):
+        buffer = self.scratch.get("buffer")
+        if buffer is None or buffer.shape != like.shape or buffer.dtype != like.dtype:
+            buffer = self.scratch["buffer"] = torch.empty_like(like)
+        return buffer
+
+    def reorder_cache(self, beam_idx):
+        length = int(self.get_seq_length())
+        if not length:
+            return
+        beam_idx = beam_idx.to(self.device)
+        for tensor in (self.keys, self.values):
+            filled = tensor[:, :, :length]
+            gathered = self._scratch(tensor)[:, :, :length]
+            torch.index_select(filled, 0, beam_idx, out=gathered)
+            filled.copy_(gathered)
+
+class _SharedCrossLayer(StaticLayer):
+    """Static cross-attention layer; beams of one input hold identical entries"""
+
+    def reorder_cache(self, beam_idx):
+        pass
+
+def build_static_cache(config, max_cache_len: int, encoder_length: int):
+    """Encoder-decoder cache whose tensors are allocated once, on first use"""
+    self_attention = StaticCache(config, max_cache_len=max_cache_len)
+    cross_attention = StaticCache(config, max_cache_len=encoder_length)
+    scratch = {}
+    self_attention.layers = [_BeamStaticLayer(max_cache_len, scratch) for _ in self_attention.layers]
+    cross_attention.layers = [_SharedCrossLayer(max_cache_len=encoder_length) for _ in cross_attention.layers]
+    cache = EncoderDecoderCache(self_attention, cross_attention)
+    cache._scratch = scratch
+    return cache
+
+def cache_nbytes(cache) -> int:
+    """Bytes held by an (initialized) cache, including the reorder scratch"""
+    total = 0
+    for layer in cache.self_attention_cache.layers + cache.cross_attention_cache.layers:
+        if layer.is_initialized:
+            total += layer.keys.nbytes + layer.values.nbytes
+    buffer = cache._scratch.get("buffer")
+    return total + (buffer.nbytes if buffer is not None else 0)
+
+class StaticCachePool:
+    """Idle static caches keyed by shape, shared by every generate call in the process"""
+
+    def __init__(self, max_bytes: int = KV_POOL_MAX_BYTES, metrics=METRICS):
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+        self._idle = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, config, rows: int, max_new_tokens: int, encoder_length: int, dtype):
+        """Borrow a reset cache for one generate call"""
+        # The decoder start token is cached too
+        key = (rows, max_new_tokens + 1, encoder_length, dtype)
+        with self._lock:
+            idle = self._idle.get(key)
+            cache = idle.pop() if idle else None
+            if cache is not None:
+                self._bytes -= cache_nbytes(cache)
+                if not idle:
+                    del self._idle[key]
+        self.metrics.inc("kv_cache.hits" if cache is not None else "kv_cache.misses")
+        if cache is None:
+            cache = build_static_cache(config, max_new_tokens + 1, encoder_length)
+
+        try:
+            yield cache
+        finally:
+            cache.reset()
+            self._release(key, cache)
+
+    def _release(self, key, cache):
+        size = cache_nbytes(cache)
+        with self._lock:
+            if size <= self.max_bytes:
+                self._idle.setdefault(key, []).append(cache)
+                self._idle.move_to_end(key)
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                # Evict the least recently used shape
+                oldest = next(iter(self._idle))
+                evicted = self._idle[oldest].pop(0)
+                if not self._idle[oldest]:
+                    del self._idle[oldest]
+                self._bytes -= cache_nbytes(evicted)
+                self.metrics.inc("kv_cache.evictions")
+            self.metrics.set("kv_cache.pooled_bytes", self._bytes)
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+            self._bytes = 0
+        self.metrics.set("kv_cache.pooled_bytes", 0)
+
+KV_CACHE_POOL = StaticCachePool()
+
+def generate_with_static_cache(model, inputs: dict, generation_kwargs: dict, pool: StaticCachePool = KV_CACHE_POOL):
+    """model.generate on a pooled static cache sized for this batch and beam width"""
+    batch_size, encoder_length = inputs["input_ids"].shape
+    rows = batch_size * generation_kwargs.get("num_beams", 1)
+    dtype = next(model.parameters()).dtype
+    with pool.lease(model.config, rows, generation_kwargs["max_new_tokens"], encoder_length, dtype) as cache:
+        return model.generate(**inputs, **generation_kwargs, past_key_values=cache)
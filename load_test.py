@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Load generator for the simplification pipeline.
+
+Drives the same path a Streamlit session takes (admission control, shared
+scheduler, simplify_medical_report), a replica pool, or an HTTP endpoint
+with many simulated users, and reports throughput, latency percentiles,
+error/shed rates and CPU/RSS over time.
+
+Two arrival models:
+    closed loop (--users N): N users each send a report, wait for it and
+                             think for --think-seconds before the next
+    open loop (--rate R):    Poisson arrivals at R requests/s; latency is
+                             measured from the scheduled arrival, so a
+                             backed-up server is not hidden
+
+Report lengths are drawn from synthetic_reports.py with --mix weights.
+
+Usage:
+    python load_test.py --tiny --users 20 --duration 60
+    python load_test.py --rate 0.5 --duration 300 --json load.json
+    python load_test.py --target replicas --replicas 2 --tiny --users 8
+    python load_test.py --url http://localhost:8000/simplify --users 10
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from metrics import METRICS, percentile
+from synthetic_reports import LENGTHS, synthetic_report
+
+DEFAULT_MIX = "short=0.5,medium=0.35,long=0.15"
+
+def load_tiny_model():
+    """Small random FLAN-T5-shaped model with the real tokenizer; runs offline (also usable as a REPLICA_LOADER)"""
+    from transformers import AutoTokenizer
+
+    from assisted_decoding import _tiny_t5
+
+    tokenizer = AutoTokenizer.from_pretrained("./medical_lora_adapters")
+    model = _tiny_t5(tokenizer, d_model=64, layers=2, seed=0)
+    model._model_type = "Tiny stand-in model"
+    return model, tokenizer
+
+def parse_mix(spec: str) -> dict:
+    """"short=0.5,long=0.5" -> normalized weights per report length"""
+    weights = {}
+    for part in spec.split(","):
+        length, _, weight = part.partition("=")
+        if length.strip() not in LENGTHS:
+            raise ValueError(f"Unknown report length '{length}' (use {', '.join(LENGTHS)})")
+        weights[length.strip()] = float(weight or 1)
+    total = sum(weights.values())
+    return {length: weight / total for length, weight in weights.items()}
+
+def _proc_stats(pid) -> tuple:
+    """(cpu seconds, rss MB) of a process from /proc (None if unavailable)"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status", "r") as f:
+            rss = next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmRSS:"))
+        return cpu, rss
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None
+
+class ResourceSampler:
+    """Samples CPU utilization and RSS of this process (and worker processes) every interval"""
+
+    def __init__(self, interval: float, pids: Callable = lambda: []):
+        self.interval = interval
+        self.pids = pids
+        self.samples = []
+        self.probes = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="load-sampler", daemon=True)
+
+    def _read(self):
+        cpu = rss = 0.0
+        for pid in ["self", *self.pids()]:
+            stats = _proc_stats(pid)
+            if stats is not None:
+                cpu += stats[0]
+                rss += stats[1]
+        if cpu == 0.0:
+            times = os.times()
+            cpu = times.user + times.system
+        return cpu, rss
+
+    def _loop(self):
+        started = time.perf_counter()
+        last_cpu, last_time = self._read()[0], time.perf_counter()
+        while not self._stop.wait(self.interval):
+            cpu, rss = self._read()
+            now = time.perf_counter()
+            sample = {
+                "t": round(now - started, 1),
+                # 100 = one core fully busy
+                "cpu_percent": round(100 * (cpu - last_cpu) / (now - last_time), 1),
+                "rss_mb": round(rss, 1)
+            }
+            sample.update({name: probe() for name, probe in self.probes.items()})
+            self.samples.append(sample)
+            last_cpu, last_time = cpu, now
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+def classify(result) -> str:
+    """Outcome of one request from the result dict simplify_medical_report returns"""
+    if not isinstance(result, dict):
+        return "ok"
+    if result.get("overloaded"):
+        return "shed"
+    if result.get("cancel_reason"):
+        return "cancelled"
+    if result.get("error"):
+        return "error"
+    if result.get("near_duplicate"):
+        return "reused"
+    return "degraded" if result.get("degraded") else "ok"
+
+class LoadRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+        self.in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, length: str, latency: float, outcome: str):
+        with self._lock:
+            self.in_flight -= 1
+            self.records.append((length, latency, outcome))
+
+def _call(simplify, recorder: LoadRecorder, length: str, text: str, scheduled: float) -> str:
+    recorder.start()
+    try:
+        outcome = classify(simplify(text))
+    except Exception:
+        outcome = "error"
+    recorder.finish(length, time.perf_counter() - scheduled, outcome)
+    return outcome
+
+def run_closed_loop(simplify, mix: dict, users: int, duration: float, think_seconds: float,
+                    recorder: LoadRecorder, seed: int = 0, retry_seconds: float = 0.0):
+    deadline = time.perf_counter() + duration
+
+    def user(user_id):
+        rng = random.Random(seed * 1000 + user_id)
+        request = 0
+        while time.perf_counter() < deadline:
+            length = rng.choices(list(mix), weights=list(mix.values()))[0]
+            text = synthetic_report(length, seed=user_id * 100000 + request)
+            outcome = _call(simplify, recorder, length, text, time.perf_counter())
+            request += 1
+            if outcome == "shed" and retry_seconds:
+                # Told to try again later
+                time.sleep(retry_seconds)
+            elif think_seconds:
+                time.sleep(rng.expovariate(1 / think_seconds))
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def run_open_loop(simplify, mix: dict, rate: float, duration: float, max_in_flight: int,
+                  recorder: LoadRecorder, seed: int = 0):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    scheduled = started
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        request = 0
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled - started >= duration:
+                break
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            length = rng.choices(list(mix), weights=list(mix.values()))[0]
+            executor.submit(_call, simplify, recorder, length, synthetic_report(length, seed=request), scheduled)
+            request += 1
+
+def summarize(records: list, elapsed: float) -> dict:
+    def latency(values):
+        ordered = sorted(values)
+        return {
+            "count": len(ordered),
+            "p50_seconds": round(percentile(ordered, 50), 3),
+            "p95_seconds": round(percentile(ordered, 95), 3),
+            "p99_seconds": round(percentile(ordered, 99), 3),
+            "mean_seconds": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+            "max_seconds": round(ordered[-1], 3) if ordered else 0.0
+        }
+
+    outcomes = {}
+    for _, _, outcome in records:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    served = [(length, seconds) for length, seconds, outcome in records if outcome in ("ok", "degraded", "reused")]
+    total = len(records)
+    return {
+        "requests": total,
+        "elapsed_seconds": round(elapsed, 1),
+        "throughput_rps": round(len(served) / elapsed, 3) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "error_rate": round(outcomes.get("error", 0) / total, 4) if total else 0.0,
+        "shed_rate": round(outcomes.get("shed", 0) / total, 4) if total else 0.0,
+        "degraded_rate": round(outcomes.get("degraded", 0) / total, 4) if total else 0.0,
+        "latency": latency([seconds for _, seconds in served]),
+        "latency_by_length": {
+            length: latency([seconds for l, seconds in served if l == length])
+            for length in LENGTHS if any(l == length for l, _ in served)
+        }
+    }
+
+def build_target(args):
+    """(simplify(text) -> result, worker pids, probes, close) for the chosen target"""
+    if args.url:
+        import urllib.error
+        import urllib.request
+
+        def simplify(text):
+            request = urllib.request.Request(args.url, data=json.dumps({"text": text}).encode(),
+                                             headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=args.timeout) as response:
+                    return json.loads(response.read() or b"{}")
+            except urllib.error.HTTPError as e:
+                if e.code in (429, 503):
+                    return {"error": True, "overloaded": True}
+                raise
+
+        return simplify, lambda: [], {}, lambda: None
+
+    loader = "load_test:load_tiny_model" if args.tiny else args.loader
+    if args.target == "replicas":
+        from replica_pool import ReplicaPool
+
+        pool = ReplicaPool(args.replicas, loader=loader)
+        if not pool.wait_ready(args.timeout):
+            pool.close()
+            raise RuntimeError("Replicas did not become ready")
+        simplify = lambda text: pool.simplify(text, timeout=args.timeout)
+        pids = lambda: [process.pid for process in pool._processes if process.is_alive()]
+        return simplify, pids, {"in_flight": lambda: sum(pool.load())}, pool.close
+
+    import importlib
+
+    from app import admitted_simplify, generate_simplifications, simplify_medical_report
+    from admission import SIMPLIFY_ADMISSION
+    from inference_scheduler import InferenceScheduler
+
+    module_name, _, attr = loader.partition(":")
+    model, tokenizer = getattr(importlib.import_module(module_name), attr)()
+    if model is None:
+        raise RuntimeError(f"{loader} did not return a model")
+    scheduler = InferenceScheduler(
+        lambda texts, kwargs, tokens: generate_simplifications(texts, model, tokenizer, kwargs, tokens),
+        cancellable=True
+    )
+    # Each simulated user is its own session for the scheduler's round-robin
+    run = lambda text, kwargs: simplify_medical_report(
+        text, model, tokenizer, scheduler=scheduler,
+        session_id=threading.current_thread().name, generation_kwargs=kwargs
+    )
+    if args.no_admission:
+        simplify = lambda text: run(text, None)
+    else:
+        simplify = lambda text: admitted_simplify(run, text)
+    if args.near_duplicates:
+        from app import simplify_with_reuse
+        from near_duplicates import NearDuplicateIndex
+
+        index, simplify_model = NearDuplicateIndex(), simplify
+        simplify = lambda text: simplify_with_reuse(simplify_model, index, text)
+    probes = {"queue_depth": scheduler.queue_depth, "admitted": SIMPLIFY_ADMISSION.depth}
+    return simplify, lambda: [], probes, scheduler.stop
+
+def run_load_test(args) -> dict:
+    mix = parse_mix(args.mix)
+    simplify, pids, probes, close = build_target(args)
+    recorder = LoadRecorder()
+    try:
+        # One request first so model warm-up is not counted
+        simplify(synthetic_report("short", seed=-1))
+        METRICS.reset()
+        sampler = ResourceSampler(args.sample_interval, pids)
+        sampler.probes = {"in_flight": lambda: recorder.in_flight, **probes}
+        sampler.start()
+        started = time.perf_counter()
+        if args.rate:
+            run_open_loop(simplify, mix, args.rate, args.duration, args.max_in_flight, recorder, args.seed)
+        else:
+            run_closed_loop(simplify, mix, args.users, args.duration, args.think_seconds, recorder, args.seed,
+                            args.retry_seconds)
+        elapsed = time.perf_counter() - started
+        timeline = sampler.stop()
+    finally:
+        close()
+
+    report = summarize(recorder.records, elapsed)
+    report["config"] = {
+        "target": "http" if args.url else args.target,
+        "model": "tiny" if args.tiny else args.loader,
+        "arrivals": f"open loop, {args.rate} req/s" if args.rate else f"closed loop, {args.users} users",
+        "think_seconds": args.think_seconds,
+        "duration_seconds": args.duration,
+        "mix": mix
+    }
+    report["resources"] = {
+        "cpu_percent_mean": round(sum(s["cpu_percent"] for s in timeline) / len(timeline), 1) if timeline else None,
+        "rss_mb_max": max((s["rss_mb"] for s in timeline), default=None)
+    }
+    report["timeline"] = timeline
+    report["server_metrics"] = {
+        name: value for name, value in METRICS.snapshot()["counters"].items()
+        if name.startswith(("inference.", "admission.", "near_dup.", "generation."))
+    }
+    return report
+
+def print_summary(report: dict):
+    latency = report["latency"]
+    print(f"🧪 {report['config']['arrivals']} for {report['elapsed_seconds']} s ({report['config']['model']} model)")
+    print(f"📈 Throughput: {report['throughput_rps']} req/s over {report['requests']} requests")
+    print(f"⏱️ Latency: p50 {latency['p50_seconds']} s, p95 {latency['p95_seconds']} s, "
+          f"p99 {latency['p99_seconds']} s, max {latency['max_seconds']} s")
+    for length, summary in report["latency_by_length"].items():
+        print(f"   {length:<6} p50 {summary['p50_seconds']} s, p95 {summary['p95_seconds']} s ({summary['count']} requests)")
+    print("📊 Outcomes: " + ", ".join(f"{name} {count}" for name, count in sorted(report["outcomes"].items())))
+    print(f"   error rate {report['error_rate']:.1%}, shed rate {report['shed_rate']:.1%}, "
+          f"degraded rate {report['degraded_rate']:.1%}")
+    resources = report["resources"]
+    if resources["cpu_percent_mean"] is not None:
+        print(f"🖥️ CPU {resources['cpu_percent_mean']}% mean (100% = one core), RSS max {resources['rss_mb_max']} MB")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the simplification pipeline")
+    parser.add_argument("--target", choices=["inproc", "replicas"], default="inproc",
+                        help="In-process scheduler (as the app) or a replica pool")
+    parser.add_argument("--url", default=None, help="POST {\"text\": ...} to this HTTP endpoint instead")
+    parser.add_argument("--loader", default="app:load_medical_model", help="module:function returning (model, tokenizer)")
+    parser.add_argument("--tiny", action="store_true", help="Use a tiny random model (offline, no adapters needed)")
+    parser.add_argument("--replicas", type=int, default=None, help="Replica count for --target replicas")
+    parser.add_argument("--users", type=int, default=20, help="Closed-loop concurrent users")
+    parser.add_argument("--think-seconds", type=float, default=0.0, help="Mean pause between a user's requests")
+    parser.add_argument("--retry-seconds", type=float, default=5.0, help="Pause after a shed request (closed loop)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open-loop arrival rate in requests/s (overrides --users)")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Open-loop cap on outstanding requests")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to generate load for")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Report length weights, e.g. short=0.5,medium=0.35,long=0.15")
+    parser.add_argument("--no-admission", action="store_true", help="Bypass admission control (in-process target)")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="Serve near-duplicate reports from the index, as the app does (in-process target)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between CPU/RSS samples")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout for replicas/HTTP")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="Write the full report (with timeline) to this file")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    try:
+        report = run_load_test(args)
+    except Exception as e:
+        print(f"❌ Load test failed: {e}")
+        return 1
+    print_summary(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Wrote {args.json}")
+    return 0 if report["requests"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
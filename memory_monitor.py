@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Memory instrumentation.
+
+RSS snapshots (and, with MEMORY_TRACEMALLOC=1, traced Python allocations)
+are taken around OCR, preprocessing and generation, st.session_state is
+sized per session, and peak and steady-state RSS are exported as metrics.
+
+`soak` runs the pipeline (OCR of a rendered report if Tesseract is
+available, boilerplate stripping, preprocessing, simplification, session
+state) thousands of times, fits the RSS trend after a warm-up and fails if
+memory keeps growing, listing the allocation sites that grew the most.
+
+Usage:
+    MEMORY_TRACEMALLOC=1 streamlit run app.py
+    python memory_monitor.py soak [--iterations 2000] [--max-growth-mb 20] [--ocr] [--tiny]
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from metrics import METRICS, percentile
+
+# "1" traces Python allocations per stage (adds CPU overhead)
+MEMORY_TRACEMALLOC = os.environ.get("MEMORY_TRACEMALLOC", "0") != "0"
+
+# RSS samples the steady-state estimate is taken over
+STEADY_WINDOW = 200
+
+# Sessions not seen for this long are dropped from the accounting
+SESSION_STALE_SECONDS = 3600
+
+def rss_bytes() -> tuple:
+    """(current RSS, peak RSS) of this process in bytes"""
+    try:
+        values = {}
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    values[line.split(":")[0]] = int(line.split()[1]) * 1024
+        return values["VmRSS"], values["VmHWM"]
+    except (OSError, KeyError, ValueError):
+        # ru_maxrss is in KiB on Linux; without /proc only the peak is known
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return peak, peak
+
+def deep_sizeof(value, seen: Optional[set] = None) -> int:
+    """Approximate bytes held by a value, counting shared objects once"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, io.BytesIO):
+        # Uploaded files keep their content in the buffer
+        return size + value.getbuffer().nbytes
+    if hasattr(value, "nbytes") and not callable(value.nbytes):
+        # numpy arrays, tensors
+        return size + int(value.nbytes)
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "getbands") and hasattr(value, "size"):
+        # PIL images
+        width, height = value.size
+        return size + width * height * len(value.getbands())
+    if isinstance(value, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset, deque)):
+        return size + sum(deep_sizeof(item, seen) for item in value)
+    if hasattr(value, "__dict__"):
+        return size + deep_sizeof(vars(value), seen)
+    return size
+
+class MemoryTracker:
+    """
+    Per-stage memory deltas, RSS peak/steady state and session state sizes.
+
+    Traced peaks are process-wide: a stage's peak includes whatever other
+    threads allocated while it ran.
+    """
+
+    def __init__(self, metrics=METRICS, window: int = STEADY_WINDOW):
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self._sessions = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        rss_before, _ = rss_bytes()
+        traced_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        if traced_before is not None:
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            rss_after, _ = rss_bytes()
+            self.metrics.observe(f"memory.{name}.rss_delta_bytes", rss_after - rss_before)
+            if traced_before is not None and tracemalloc.is_tracing():
+                self.metrics.observe(f"memory.{name}.traced_peak_bytes",
+                                     tracemalloc.get_traced_memory()[1] - traced_before)
+            self.sample()
+
+    def sample(self) -> int:
+        """Record current and peak RSS; the steady state is the median of recent samples"""
+        rss, peak = rss_bytes()
+        with self._lock:
+            self._samples.append(rss)
+            steady = sorted(self._samples)[len(self._samples) // 2]
+        self.metrics.set("memory.rss_bytes", rss)
+        self.metrics.set("memory.rss_peak_bytes", peak)
+        self.metrics.set("memory.rss_steady_bytes", steady)
+        return rss
+
+    def record_session(self, session_id: Optional[str], state: dict) -> dict:
+        """Size of each session state key in bytes; updates the per-process totals"""
+        seen = set()
+        sizes = {key: deep_sizeof(value, seen) for key, value in state.items()}
+        now = time.monotonic()
+        with self._lock:
+            if session_id is not None:
+                self._sessions[session_id] = {"bytes": sum(sizes.values()), "updated": now}
+            for stale in [key for key, entry in self._sessions.items()
+                          if now - entry["updated"] > SESSION_STALE_SECONDS]:
+                del self._sessions[stale]
+            totals = [entry["bytes"] for entry in self._sessions.values()]
+        self.metrics.set("memory.session_state.sessions", len(totals))
+        self.metrics.set("memory.session_state.total_bytes", sum(totals))
+        self.metrics.set("memory.session_state.max_bytes", max(totals, default=0))
+        return sizes
+
+# Shared tracker for the whole process
+MEMORY = MemoryTracker()
+
+if MEMORY_TRACEMALLOC and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+def _trend(points: list) -> float:
+    """Least-squares slope of (x, y) points"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else 0.0
+
+def render_report_image(text: str):
+    """A report drawn as a page image for the OCR stage"""
+    import textwrap
+
+    from PIL import Image, ImageDraw, ImageFont
+
+    lines = [line for paragraph in text.splitlines() for line in textwrap.wrap(paragraph, 80) or [""]]
+    image = Image.new("L", (1700, 120 + 40 * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=28)
+    for i, line in enumerate(lines):
+        draw.text((60, 60 + 40 * i), line, font=font, fill=0)
+    return image
+
+def soak(iterations: int, model, tokenizer, nlp=None, ocr_engine=None, sessions: int = 20,
+         sample_every: int = 50, warmup: float = 0.1, tracer: bool = True) -> dict:
+    """Repeat the pipeline and report the RSS trend after warm-up"""
+    import app
+    from synthetic_reports import synthetic_reports
+
+    reports = synthetic_reports(30)
+    states = {}
+    samples, snapshot = [], None
+    warm_iteration = max(1, int(iterations * warmup))
+    if tracer and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(1, iterations + 1):
+        text = reports[i % len(reports)]
+        if ocr_engine is not None:
+            text = app.recognize_text(render_report_image(text), ocr_engine) or text
+        text, boilerplate = app.remove_boilerplate(text)
+        processed = app.preprocess_text(text, nlp)
+        result = app.simplify_medical_report(processed, model, tokenizer)
+        # What a session keeps after a run
+        session_id = f"soak-{i % sessions}"
+        states[session_id] = {"input_text": text, "simplified_report": {**result, "boilerplate": boilerplate}}
+        MEMORY.record_session(session_id, states[session_id])
+
+        if i % sample_every == 0 or i == iterations:
+            gc.collect()
+            samples.append((i, MEMORY.sample()))
+            if i >= warm_iteration and snapshot is None and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+            print(f"[{i}/{iterations}] RSS {samples[-1][1] / 2 ** 20:.1f} MB", flush=True)
+
+    steady = [(i, rss) for i, rss in samples if i >= warm_iteration]
+    slope = _trend(steady)
+    growth = slope * (steady[-1][0] - steady[0][0]) if len(steady) > 1 else 0.0
+    top_growth = []
+    if snapshot is not None:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        final = tracemalloc.take_snapshot().filter_traces(ignore)
+        for stat in final.compare_to(snapshot.filter_traces(ignore), "lineno")[:10]:
+            if stat.size_diff > 0:
+                top_growth.append({"where": str(stat.traceback), "size_diff_kb": round(stat.size_diff / 1024, 1),
+                                   "count_diff": stat.count_diff})
+    _, peak = rss_bytes()
+    snapshot_metrics = METRICS.snapshot()
+    stages = {}
+    for name, histogram in snapshot_metrics["histograms"].items():
+        if name.startswith("memory."):
+            stages[name[len("memory."):]] = {"p50_kb": round(histogram["p50"] / 1024, 1),
+                                             "p95_kb": round(histogram["p95"] / 1024, 1),
+                                             "max_kb": round(histogram["max"] / 1024, 1)}
+    sizes = sorted(entry for entry in (deep_sizeof(state) for state in states.values()))
+    return {
+        "iterations": iterations,
+        "seconds": round(time.perf_counter() - started, 1),
+        "rss_start_mb": round(samples[0][1] / 2 ** 20, 1),
+        "rss_after_warmup_mb": round(steady[0][1] / 2 ** 20, 1),
+        "rss_end_mb": round(samples[-1][1] / 2 ** 20, 1),
+        "rss_peak_mb": round(peak / 2 ** 20, 1),
+        "rss_steady_mb": round(snapshot_metrics["gauges"]["memory.rss_steady_bytes"] / 2 ** 20, 1),
+        "growth_kb_per_iteration": round(slope / 1024, 3),
+        "growth_after_warmup_mb": round(growth / 2 ** 20, 2),
+        "session_state_kb_p50": round(percentile(sizes, 50) / 1024, 1),
+        "session_state_kb_max": round(sizes[-1] / 1024, 1) if sizes else 0.0,
+        "stages": stages,
+        "top_allocation_growth": top_growth
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory soak test of the simplification pipeline")
+    parser.add_argument("command", choices=["soak"])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sample-every", type=int, default=50, help="Iterations between RSS samples")
+    parser.add_argument("--warmup", type=float, default=0.1, help="Share of iterations ignored for the trend")
+    parser.add_argument("--max-growth-mb", type=float, default=20.0, help="Fail if RSS grows more after warm-up")
+    parser.add_argument("--headroom", type=float, default=1.3, help="Pod limit suggestion = peak RSS x this")
+    parser.add_argument("--ocr", action="store_true", help="Also OCR a rendered page each iteration")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip allocation tracing (faster)")
+    parser.add_argument("--tiny", action="store_true", help="Tiny random model (offline smoke test)")
+    parser.add_argument("--json", default=None, help="Also write the summary as JSON")
+    args = parser.parse_args()
+
+    import app
+
+    if args.tiny:
+        from load_test import load_tiny_model
+        model, tokenizer = load_tiny_model()
+    else:
+        model, tokenizer = app.load_medical_model()
+    if model is None:
+        print("❌ Could not load the medical model")
+        return 1
+    nlp = app.load_spacy_model()
+    engine = None
+    if args.ocr:
+        engine = app.load_ocr_engine()
+        if engine is None:
+            print("⚠️ OCR is not available - running without the OCR stage")
+
+    summary = soak(args.iterations, model, tokenizer, nlp, engine, sample_every=args.sample_every,
+                   warmup=args.warmup, tracer=not args.no_tracemalloc)
+    summary["suggested_pod_limit_mb"] = int(-(-summary["rss_peak_mb"] * args.headroom // 64) * 64)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+    if summary["growth_after_warmup_mb"] > args.max_growth_mb:
+        print(f"❌ RSS grew {summary['growth_after_warmup_mb']:.1f} MB after warm-up "
+              f"({summary['growth_kb_per_iteration']:.1f} KB per iteration) - see top_allocation_growth")
+        return 1
+    print(f"✅ No growth beyond {args.max_growth_mb:.0f} MB; peak RSS {summary['rss_peak_mb']:.0f} MB, "
+          f"suggested pod limit {summary['suggested_pod_limit_mb']} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Process-wide metrics for the simplification service.
+
+A small thread-safe registry of counters, gauges and histograms shared by
+every Streamlit session in the process. snapshot() returns plain dicts that
+can be shown in the UI or dumped as JSON.
+"""
+
+import threading
+import time
+from collections import deque
+
+# Samples kept per histogram for percentile estimates
+HISTOGRAM_WINDOW = 1024
+
+class Metrics:
+    """Thread-safe counters, gauges and windowed histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {
+                    "count": 0, "sum": 0.0, "max": float("-inf"),
+                    "samples": deque(maxlen=HISTOGRAM_WINDOW)
+                }
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["samples"].append(value)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name: str, default: float = 0) -> float:
+        with self._lock:
+            return self._gauges.get(name, default)
+
+    def snapshot(self) -> dict:
+        """Plain-dict copy of all metrics with p50/p95/p99 for histograms"""
+        with self._lock:
+            histograms = {}
+            for name, histogram in self._histograms.items():
+                samples = sorted(histogram["samples"])
+                histograms[name] = {
+                    "count": histogram["count"],
+                    "mean": histogram["sum"] / histogram["count"],
+                    "max": histogram["max"],
+                    "p50": percentile(samples, 50),
+                    "p95": percentile(samples, 95),
+                    "p99": percentile(samples, 99)
+                }
+            return {
+                "uptime_seconds": time.time() - self.started_at,
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": histograms
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+# Shared registry for the whole process
+METRICS = Metrics()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate index over past simplifications.
+
+Many reports are filled-in templates that differ only in names, dates and
+numbers. Inputs are indexed with those values masked (MinHash signatures of
+word 3-grams, banded into LSH buckets). A new input whose masked text is
+nearly identical to an indexed one gets the stored simplification back with
+the differing names, dates and times substituted, without running the model.
+The index is off unless NEAR_DUP_THRESHOLD is set.
+
+A match is only used when the substitution is mechanical: every number must
+be the same as in the stored input (the stored output may have interpreted
+it, e.g. "EF 60%" -> "which is normal"), and the result may not contain any
+word of the stored input that is missing from the new one (an unmasked name,
+"left" vs "right"...).
+
+Usage:
+    python near_duplicates.py evaluate [--limit 2000]   # hit rate of the eval split against the training pairs
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+import numpy as np
+
+from metrics import METRICS
+
+# Minimum Jaccard similarity of the masked 3-gram sets, e.g. 0.9; 0 disables the index
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", "0"))
+
+# Learned entries kept (oldest dropped first); corpus entries are not counted
+NEAR_DUP_MAX_ENTRIES = int(os.environ.get("NEAR_DUP_MAX_ENTRIES", "10000"))
+
+# "1" seeds the index with the training pairs from CORPUS_PATH at startup
+NEAR_DUP_SEED_CORPUS = os.environ.get("NEAR_DUP_SEED_CORPUS", "") not in ("", "0")
+
+# MinHash signature = BANDS x ROWS hashes; 32 x 4 finds pairs above ~0.5 Jaccard
+BANDS = 32
+ROWS = 4
+SHINGLE_SIZE = 3
+
+_MONTHS = r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?"
+_MASK = re.compile(
+    r"(?P<DATE>\b\d{4}-\d{1,2}-\d{1,2}\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b"
+    rf"|\b{_MONTHS} \d{{1,2}}(?:st|nd|rd|th)?,? \d{{4}}\b|\b\d{{1,2}} {_MONTHS} \d{{4}}\b)"
+    r"|(?P<TIME>\b\d{1,2}:\d{2}(?::\d{2})?(?:\s?[AaPp]\.?[Mm]\.?)?)"
+    r"|(?P<title>\b(?:Mr|Mrs|Ms|Miss|Dr)\.?\s+|\b(?:Patient name|Patient|Name)\s*:\s*)"
+    r"(?P<NAME>[A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+)?)"
+    r"|(?P<NUM>\b\d+(?:[.,]\d+)?\b)"
+)
+_WORD = re.compile(r"<[A-Z]+>|\w+")
+
+# Multiply-shift hash family for the MinHash permutations
+_rng = np.random.default_rng(1234)
+_A = _rng.integers(1, 2 ** 63, size=BANDS * ROWS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=BANDS * ROWS, dtype=np.uint64)
+
+def mask_values(text: str):
+    """(masked text, [(kind, value), ...]) with names, dates, times and numbers replaced by placeholders"""
+    values = []
+
+    def replace(match):
+        kind = match.lastgroup
+        if kind == "NAME":
+            values.append(("NAME", match.group("NAME")))
+            return match.group("title") + "<NAME>"
+        values.append((kind, match.group(kind)))
+        return f"<{kind}>"
+
+    return _MASK.sub(replace, text), values
+
+def shingles(masked_text: str) -> frozenset:
+    words = _WORD.findall(masked_text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+def minhash(shingle_set) -> np.ndarray:
+    hashes = np.array([
+        int.from_bytes(hashlib.blake2b(" ".join(s).encode(), digest_size=8).digest(), "little")
+        for s in shingle_set
+    ], dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, None] * _A[None, :] + _B[None, :]) >> np.uint64(32)
+    return permuted.min(axis=0)
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+def substitute(entry: dict, values: list, text: str) -> Optional[str]:
+    """The entry's simplification rewritten for an input with these values (None if unsafe)"""
+    stored = entry["values"]
+    if [kind for kind, _ in stored] != [kind for kind, _ in values]:
+        return None
+    mapping = {}
+    for (kind, old), (_, new) in zip(stored, values):
+        if kind == "NUM" and old != new:
+            # The stored output's meaning may depend on the number
+            return None
+        if mapping.setdefault(old, new) != new:
+            # One stored value became two different ones
+            return None
+    changed = {old: new for old, new in mapping.items() if old != new}
+
+    output = entry["target"]
+    if changed:
+        pattern = re.compile("|".join(
+            rf"(?<!\w){re.escape(old)}(?!\w)" for old in sorted(changed, key=len, reverse=True)
+        ))
+        output = pattern.sub(lambda match: changed[match.group(0)], output)
+
+    # Nothing specific to the stored input may survive
+    leaked = (_words(entry["source"]) - _words(text)) & _words(output)
+    return None if leaked else output
+
+class NearDuplicateIndex:
+    """Thread-safe MinHash/LSH index of (input, simplification) pairs"""
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, max_entries: int = NEAR_DUP_MAX_ENTRIES,
+                 metrics=METRICS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._learned = OrderedDict()
+        self._buckets = defaultdict(set)
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _band_keys(self, signature: np.ndarray) -> list:
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def add(self, source: str, target: str, model_type: Optional[str] = None, pinned: bool = False):
+        """Index a simplification; pinned entries (training pairs) are never evicted"""
+        masked, values = mask_values(source)
+        shingle_set = shingles(masked)
+        keys = self._band_keys(minhash(shingle_set))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "source": source, "target": target, "model_type": model_type,
+                "values": values, "shingles": shingle_set, "keys": keys
+            }
+            for key in keys:
+                self._buckets[key].add(entry_id)
+            if not pinned:
+                self._learned[entry_id] = None
+                while len(self._learned) > self.max_entries:
+                    self._remove(self._learned.popitem(last=False)[0])
+            self.metrics.set("near_dup.entries", len(self._entries))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for key in entry["keys"]:
+            bucket = self._buckets[key]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def lookup(self, text: str) -> Optional[dict]:
+        """{"simplified_text", "similarity", "model_type"} for a usable near-duplicate, else None"""
+        started = time.perf_counter()
+        masked, values = mask_values(text)
+        shingle_set = shingles(masked)
+        keys = self._band_keys(minhash(shingle_set))
+        with self._lock:
+            candidates = set()
+            for key in keys:
+                candidates.update(self._buckets.get(key, ()))
+            scored = sorted(
+                ((jaccard(shingle_set, self._entries[i]["shingles"]), i) for i in candidates),
+                reverse=True
+            )
+            entries = [(similarity, self._entries[i]) for similarity, i in scored if similarity >= self.threshold]
+
+        result = None
+        for similarity, entry in entries:
+            output = substitute(entry, values, text)
+            if output is not None:
+                result = {"simplified_text": output, "similarity": similarity, "model_type": entry["model_type"]}
+                break
+        if entries and result is None:
+            self.metrics.inc("near_dup.unsafe")
+        self.metrics.inc("near_dup.hits" if result else "near_dup.misses")
+        self.metrics.observe("near_dup.lookup_seconds", time.perf_counter() - started)
+        return result
+
+    def seed(self, sources, targets, model_type: str = "Reference simplification (training data)") -> int:
+        """Add pinned (source, target) pairs, e.g. the training corpus"""
+        count = 0
+        for source, target in zip(sources, targets):
+            self.add(source, target, model_type, pinned=True)
+            count += 1
+        return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate index over simplifications")
+    parser.add_argument("command", choices=["evaluate"])
+    parser.add_argument("--corpus", default=None, help="Corpus CSV (default: CORPUS_PATH)")
+    parser.add_argument("--limit", type=int, default=2000, help="Eval examples to look up")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD or 0.9)
+    args = parser.parse_args()
+
+    from corpus import CORPUS_PATH, SOURCE_COLUMN, TARGET_COLUMN, load_corpus, split_corpus
+
+    train, evaluation = split_corpus(load_corpus(args.corpus or CORPUS_PATH))
+    index = NearDuplicateIndex(args.threshold, metrics=METRICS)
+    started = time.perf_counter()
+    index.seed(train[SOURCE_COLUMN].tolist(), train[TARGET_COLUMN].tolist())
+    build_seconds = time.perf_counter() - started
+
+    sources = evaluation[SOURCE_COLUMN].tolist()[:args.limit]
+    hits = [index.lookup(source) for source in sources]
+    lookup = METRICS.snapshot()["histograms"]["near_dup.lookup_seconds"]
+    print(json.dumps({
+        "indexed": len(index),
+        "build_seconds": round(build_seconds, 2),
+        "lookups": len(sources),
+        "hit_rate": sum(hit is not None for hit in hits) / len(sources) if sources else 0.0,
+        "unsafe_matches": METRICS.counter("near_dup.unsafe"),
+        "lookup_ms_p50": round(lookup["p50"] * 1000, 2),
+        "lookup_ms_p95": round(lookup["p95"] * 1000, 2)
+    }, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
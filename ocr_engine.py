@@ -0,0 +1,195 @@
+"""
+OCR engine abstraction.
+
+The preferred engine is a pool of long-lived Tesseract API handles (via the
+tesserocr C-API binding): the language model is loaded once per handle,
+images are passed as in-memory buffers, and recognition releases the GIL so
+handles can work in parallel threads. Handles are recycled after a number of
+pages to bound Tesseract's internal cache growth. When tesserocr or its
+language data is missing, pytesseract (one tesseract subprocess per call) is
+used as a fallback.
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from metrics import METRICS
+
+# Optional imports with graceful fallbacks
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except (ImportError, ValueError):
+    # ValueError: builds using cysignals install signal handlers on import,
+    # which fails outside the main thread (Streamlit runs scripts in a worker thread)
+    TESSEROCR_AVAILABLE = False
+
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = True
+except ImportError:
+    PYTESSERACT_AVAILABLE = False
+
+# Treat the image as a single uniform block of text
+DEFAULT_PSM = 6
+
+OCR_LANGUAGE = os.environ.get("OCR_LANGUAGE", "eng")
+
+# Concurrent Tesseract handles (each holds its own copy of the language model)
+OCR_POOL_SIZE = int(os.environ.get("OCR_POOL_SIZE", min(4, os.cpu_count() or 1)))
+
+# Pages recognized by one handle before it is re-created
+RECYCLE_AFTER = 200
+
+# Where distributions install Tesseract language data
+TESSDATA_DIRS = [
+    "/usr/share/tesseract-ocr/5/tessdata",
+    "/usr/share/tesseract-ocr/4.00/tessdata",
+    "/usr/share/tessdata",
+    "/usr/local/share/tessdata",
+    "/opt/homebrew/share/tessdata"
+]
+
+def find_tessdata(language: str = OCR_LANGUAGE) -> Optional[str]:
+    """Directory containing <language>.traineddata (TESSDATA_PREFIX first)"""
+    candidates = [os.environ.get("TESSDATA_PREFIX")] + TESSDATA_DIRS
+    for directory in candidates:
+        if directory and os.path.exists(os.path.join(directory, f"{language}.traineddata")):
+            return directory.rstrip("/") + "/"
+    return None
+
+class TesseractPool:
+    """Pool of persistent tesserocr handles shared by all threads"""
+
+    name = "tesserocr"
+
+    def __init__(self, size: int = OCR_POOL_SIZE, language: str = OCR_LANGUAGE,
+                 path: Optional[str] = None, recycle_after: int = RECYCLE_AFTER, metrics=METRICS):
+        self.size = max(1, size)
+        self.language = language
+        self.path = path if path is not None else find_tessdata(language)
+        self.recycle_after = recycle_after
+        self.metrics = metrics
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # Fail fast (e.g. missing language data) and keep the handle warm
+        self._created = 1
+        self._idle.put(self._new_handle())
+
+    def _new_handle(self):
+        kwargs = {"lang": self.language, "psm": DEFAULT_PSM}
+        if self.path:
+            kwargs["path"] = self.path
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        self.metrics.inc("ocr.handles_created")
+        return [api, 0]
+
+    def _acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                reserved = self._created < self.size
+                if reserved:
+                    self._created += 1
+            if reserved:
+                try:
+                    return self._new_handle()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            # Pool is full: wait for a handle to come back (or be recycled)
+            try:
+                return self._idle.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    @contextmanager
+    def handle(self):
+        """Borrow a handle, creating one if the pool is not yet full"""
+        entry = self._acquire()
+        try:
+            yield entry[0]
+        finally:
+            entry[1] += 1
+            if self._closed or entry[1] >= self.recycle_after:
+                entry[0].End()
+                with self._lock:
+                    self._created -= 1
+                if not self._closed:
+                    self.metrics.inc("ocr.handles_recycled")
+            else:
+                self._idle.put(entry)
+
+    def recognize(self, image, psm: int = DEFAULT_PSM) -> str:
+        with self.handle() as api:
+            api.SetPageSegMode(psm)
+            api.SetImage(image)
+            try:
+                return api.GetUTF8Text()
+            finally:
+                api.Clear()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait()[0].End()
+            except queue.Empty:
+                break
+
+class PytesseractEngine:
+    """Fallback: one tesseract subprocess per call"""
+
+    name = "pytesseract"
+
+    def recognize(self, image, psm: int = DEFAULT_PSM) -> str:
+        return pytesseract.image_to_string(image, config=f'--psm {psm}')
+
+    def close(self):
+        pass
+
+class OCREngine:
+    """Times and counts calls to the underlying engine"""
+
+    def __init__(self, backend, metrics=METRICS):
+        self.backend = backend
+        self.metrics = metrics
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    def recognize(self, image, psm: int = DEFAULT_PSM) -> str:
+        started = time.perf_counter()
+        try:
+            return self.backend.recognize(image, psm=psm).strip()
+        finally:
+            self.metrics.inc(f"ocr.calls.{self.backend.name}")
+            self.metrics.observe("ocr.seconds", time.perf_counter() - started)
+
+    def close(self):
+        self.backend.close()
+
+def create_ocr_engine(pool_size: int = OCR_POOL_SIZE) -> Optional[OCREngine]:
+    """Best available engine: tesserocr pool, then pytesseract, else None"""
+    if TESSEROCR_AVAILABLE:
+        try:
+            return OCREngine(TesseractPool(pool_size))
+        except Exception:
+            pass
+    if PYTESSERACT_AVAILABLE:
+        try:
+            pytesseract.get_tesseract_version()
+            return OCREngine(PytesseractEngine())
+        except Exception:
+            pass
+    return None
@@ -0,0 +1,93 @@
+"""
+PDF ingestion with an embedded-text fast path.
+
+Most lab and discharge PDFs are generated digitally and carry a text layer,
+which is read directly in milliseconds. Only pages without usable text
+(scans) are rasterized and sent to OCR. Each page records which path it took.
+"""
+
+import math
+import time
+from typing import Callable, Optional
+
+from PIL import Image
+
+from boilerplate import BOILERPLATE_STRIP, strip_repeated_lines
+from image_ingest import OCR_MAX_PIXELS
+
+# Optional import with graceful fallback
+try:
+    import pymupdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+# Rasterization resolution for image-only pages
+OCR_DPI = 300
+
+# Pages with fewer extractable characters than this are treated as image-only
+MIN_TEXT_CHARS = 20
+
+# Longer documents are cut off (the model only reads ~512 tokens anyway)
+MAX_PDF_PAGES = 50
+
+def _page_dpi(page, dpi: int, max_pixels: int) -> int:
+    """Lower the DPI if the page would rasterize to more than max_pixels"""
+    width_in, height_in = page.rect.width / 72, page.rect.height / 72
+    if width_in * height_in * dpi * dpi > max_pixels:
+        dpi = int(math.sqrt(max_pixels / (width_in * height_in)))
+    return max(dpi, 72)
+
+def rasterize_page(page, dpi: int = OCR_DPI, max_pixels: int = OCR_MAX_PIXELS) -> Image.Image:
+    """Render one PDF page to a grayscale image for OCR"""
+    pixmap = page.get_pixmap(dpi=_page_dpi(page, dpi, max_pixels), colorspace=pymupdf.csGRAY, alpha=False)
+    return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+
+def extract_pdf_pages(data: bytes, ocr: Optional[Callable] = None, dpi: int = OCR_DPI,
+                      min_text_chars: int = MIN_TEXT_CHARS, max_pages: int = MAX_PDF_PAGES) -> tuple:
+    """
+    Extract text from the first max_pages pages of a PDF.
+
+    Returns (pages, truncated): one dict per page with the text, the method
+    used ("text", "ocr" or "skipped" when a page needs OCR but none is
+    available) and timing, and the number of pages left out past max_pages
+    (0 if none).
+    """
+    if not PYMUPDF_AVAILABLE:
+        raise RuntimeError("PyMuPDF is not installed; PDF upload is unavailable.")
+
+    pages = []
+    with pymupdf.open(stream=data, filetype="pdf") as document:
+        truncated = max(0, document.page_count - max_pages)
+        for number, page in enumerate(document, start=1):
+            if number > max_pages:
+                break
+            started = time.perf_counter()
+            text = page.get_text("text", sort=True).strip()
+            if len(text) >= min_text_chars:
+                method = "text"
+            elif ocr is not None:
+                method = "ocr"
+                text = ocr(rasterize_page(page, dpi))
+            else:
+                method = "skipped"
+            pages.append({
+                "page": number,
+                "method": method,
+                "text": text,
+                "chars": len(text),
+                "seconds": time.perf_counter() - started
+            })
+    return pages, truncated
+
+def pdf_pages_text(pages: list, strip_repeats: bool = BOILERPLATE_STRIP) -> str:
+    """
+    Join extracted pages into one report text. Headers and footers repeated
+    across pages are left out; each page records how many lines were dropped.
+    """
+    texts = [page["text"] for page in pages]
+    if strip_repeats and len(pages) > 1:
+        texts, removed = strip_repeated_lines(texts)
+        for page, dropped in zip(pages, removed):
+            page["repeated_lines"] = len(dropped)
+    return "\n\n".join(text for text in texts if text)
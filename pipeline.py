@@ -0,0 +1,195 @@
+"""
+Staged streaming pipeline.
+
+Items flow through a chain of stages (e.g. OCR -> preprocessing ->
+generation), each with its own worker threads and a bounded queue in front
+of it, so item N+1 is in OCR while item N is being simplified. A packet
+then takes roughly as long as its slowest stage instead of the sum of all
+stages. Results are yielded in input order as soon as they and everything
+before them are done.
+
+An item whose stage raises skips the remaining stages and comes out with
+the error. Closing the generator early stops the workers.
+
+A stage with batch_size > 1 takes whatever items are waiting in its queue
+when a worker becomes free, sorts them by batch_key (e.g. token count) and
+runs its function on groups of similar items, so a batched generate call
+pads to a similar length.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from metrics import METRICS
+
+# Seconds between checks of the stop flag while blocked on a queue
+_POLL_SECONDS = 0.1
+
+_END = object()
+
+class Stage:
+    """
+    One pipeline step: fn(value) -> value run on `workers` threads.
+
+    queue_size bounds the items waiting in front of the stage (default two
+    per worker); initializer runs once in each worker thread.
+
+    With batch_size > 1, fn(values) -> outputs takes a list of at most
+    batch_size values, grouped by batch_key(value); an Exception in the
+    returned list fails only that item. The default queue then holds two
+    batches, which is also the window items are grouped in.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: Optional[int] = None,
+                 initializer: Optional[Callable] = None, batch_size: int = 1,
+                 batch_key: Optional[Callable] = None):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size or 2 * self.workers * self.batch_size
+        self.initializer = initializer
+        self.batch_key = batch_key
+
+    def groups(self, records: list) -> list:
+        """Records split into runs of at most batch_size, sorted by batch_key"""
+        if self.batch_key is not None:
+            records = sorted(records, key=lambda record: self.batch_key(record["output"]))
+        return [records[i:i + self.batch_size] for i in range(0, len(records), self.batch_size)]
+
+    def run(self, records: list):
+        """Apply fn to the records' outputs; failures are stored on the records"""
+        if self.batch_size == 1:
+            record = records[0]
+            try:
+                record["output"] = self.fn(record["output"])
+            except Exception as e:
+                record["error"], record["stage"] = str(e), self.name
+            return
+        try:
+            outputs = self.fn([record["output"] for record in records])
+        except Exception as e:
+            outputs = [e] * len(records)
+        for record, output in zip(records, outputs):
+            if isinstance(output, Exception):
+                record["error"], record["stage"] = str(output), self.name
+            else:
+                record["output"] = output
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            pass
+    return _END
+
+def run_pipeline(items: Iterable, stages: list, max_in_flight: Optional[int] = None, metrics=METRICS):
+    """
+    Generator of one result dict per item, in input order:
+    {"index", "input", "output", "error", "stage" (the one that failed), "seconds" {stage: s}}.
+
+    At most max_in_flight items (default: every queue slot and worker) are
+    taken from `items` before their results are yielded, so a slow early
+    item cannot make later results pile up without bound.
+    """
+    if max_in_flight is None:
+        max_in_flight = sum(stage.queue_size + stage.workers for stage in stages)
+    stop = threading.Event()
+    slots = threading.Semaphore(max_in_flight)
+    queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+    results = queue.Queue()
+    remaining = [stage.workers for stage in stages]
+    remaining_lock = threading.Lock()
+
+    def feed():
+        try:
+            for index, item in enumerate(items):
+                while not slots.acquire(timeout=_POLL_SECONDS):
+                    if stop.is_set():
+                        return
+                record = {"index": index, "input": item, "output": item, "error": None, "stage": None, "seconds": {}}
+                if not _put(queues[0], record, stop):
+                    return
+        except Exception as e:
+            results.put(e)
+        for _ in range(stages[0].workers):
+            _put(queues[0], _END, stop)
+
+    def work(position: int):
+        stage = stages[position]
+        downstream = queues[position + 1] if position + 1 < len(stages) else results
+        if stage.initializer is not None:
+            stage.initializer()
+        ended = False
+        while not ended:
+            record = _get(queues[position], stop)
+            if record is _END:
+                break
+            metrics.set(f"pipeline.{stage.name}.queue_depth", queues[position].qsize())
+            waiting = [record]
+            if stage.batch_size > 1:
+                # Everything already waiting is grouped with this item
+                while len(waiting) < stage.queue_size:
+                    try:
+                        record = queues[position].get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is _END:
+                        ended = True
+                        break
+                    waiting.append(record)
+            for group in stage.groups(waiting):
+                started = time.perf_counter()
+                stage.run(group)
+                seconds = time.perf_counter() - started
+                metrics.observe(f"pipeline.{stage.name}.seconds", seconds)
+                if stage.batch_size > 1:
+                    metrics.observe(f"pipeline.{stage.name}.batch_size", len(group))
+                for record in group:
+                    record["seconds"][stage.name] = seconds
+                    # Failed items skip the remaining stages
+                    if not _put(results if record["error"] else downstream, record, stop):
+                        return
+        with remaining_lock:
+            remaining[position] -= 1
+            last = not remaining[position]
+        if last:
+            if downstream is results:
+                results.put(_END)
+            else:
+                for _ in range(stages[position + 1].workers):
+                    _put(downstream, _END, stop)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for position, stage in enumerate(stages):
+        threads += [threading.Thread(target=work, args=(position,), daemon=True) for _ in range(stage.workers)]
+    for thread in threads:
+        thread.start()
+
+    pending, next_index = {}, 0
+    try:
+        while True:
+            record = _get(results, stop)
+            if record is _END:
+                break
+            if isinstance(record, Exception):
+                raise record
+            pending[record["index"]] = record
+            while next_index in pending:
+                slots.release()
+                yield pending.pop(next_index)
+                next_index += 1
+    finally:
+        stop.set()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Multi-process replica pool for the simplification model.
+
+Each replica is a separate process pinned to a disjoint set of CPU cores,
+with torch intra-op threads matched to the size of that set. Every worker
+loads the model the same way the app does and runs simplify_medical_report.
+Requests go to the least-loaded replica.
+
+Usage:
+    python replica_pool.py --measure 1 2 4 8    # measure, recommend a pool size and save the measurements
+    REPLICA_WORKERS=auto streamlit run app.py   # size the pool from the saved measurements
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from metrics import METRICS
+
+# "module:function" returning (model, tokenizer); loaded inside each worker
+DEFAULT_LOADER = "app:load_medical_model"
+
+# Seconds the app waits for a replica's result before reporting an error; 0 waits
+# forever. Longer than REQUEST_TIMEOUT_SECONDS, which the worker enforces itself.
+REPLICA_TIMEOUT_SECONDS = float(os.environ.get("REPLICA_TIMEOUT_SECONDS", "360"))
+
+# Replicas with fewer threads than this are dominated by per-token overhead
+MIN_THREADS_PER_REPLICA = 2
+
+# Per-replica throughput written by --measure and used to size "auto" pools
+REPLICA_THROUGHPUT = os.environ.get("REPLICA_THROUGHPUT", "replica_throughput.json")
+
+# Short reports used when measuring per-replica throughput
+SAMPLE_REPORTS = [
+    "Mild cardiomegaly. No focal consolidation, pleural effusion or pneumothorax.",
+    "MRI of the left knee demonstrates a complex tear of the posterior horn of the medial meniscus "
+    "with a displaced bucket-handle component and moderate joint effusion.",
+    "CT abdomen: 1.2 cm hypodense lesion in segment VI of the liver, too small to characterize, "
+    "likely a simple cyst. No hydronephrosis. Normal appendix.",
+    "Patient admitted with community-acquired pneumonia, treated with IV ceftriaxone and azithromycin. "
+    "Discharged on oral amoxicillin-clavulanate for five days with follow-up in two weeks."
+]
+
+def available_cores() -> list:
+    """CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def plan_core_sets(n_replicas: int, cores: Optional[list] = None) -> list:
+    """Split cores into n_replicas disjoint, contiguous and near-equal sets"""
+    cores = list(cores if cores is not None else available_cores())
+    n_replicas = max(1, min(n_replicas, len(cores)))
+    size, extra = divmod(len(cores), n_replicas)
+    core_sets, start = [], 0
+    for i in range(n_replicas):
+        end = start + size + (1 if i < extra else 0)
+        core_sets.append(cores[start:end])
+        start = end
+    return core_sets
+
+def recommend_replicas(total_cores: int, throughput_by_threads: dict,
+                       min_threads: int = MIN_THREADS_PER_REPLICA) -> dict:
+    """
+    Pick replica count and threads per replica for a host.
+
+    throughput_by_threads maps threads-per-replica to measured requests/second
+    of a single replica. The choice maximizes replicas * per-replica throughput.
+    """
+    best = None
+    for threads, throughput in sorted(throughput_by_threads.items()):
+        threads = int(threads)
+        if threads > total_cores or (threads < min_threads and total_cores >= min_threads):
+            continue
+        replicas = total_cores // threads
+        expected = replicas * throughput
+        if best is None or expected > best["expected_throughput"]:
+            best = {
+                "replicas": replicas,
+                "threads_per_replica": threads,
+                "expected_throughput": expected,
+                "single_replica_throughput": throughput
+            }
+    if best is None:
+        best = {"replicas": 1, "threads_per_replica": total_cores,
+                "expected_throughput": None, "single_replica_throughput": None}
+    best["total_cores"] = total_cores
+    return best
+
+def load_throughput(path: str = REPLICA_THROUGHPUT) -> Optional[dict]:
+    """Measured {threads per replica: requests/second}, or None if not measured"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return {int(threads): throughput for threads, throughput in json.load(f)["throughput_by_threads"].items()}
+
+def _resolve(spec: str):
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+def _worker_main(worker_id: int, cores: list, loader: str, requests, responses):
+    """Replica process: pin, size torch threads, load the model, serve requests"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    threads = str(max(1, len(cores)))
+    # Must be set before torch is imported in this process
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["MKL_NUM_THREADS"] = threads
+
+    import torch
+    torch.set_num_threads(int(threads))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    from app import simplify_medical_report
+
+    try:
+        model, tokenizer = _resolve(loader)()
+    except Exception as e:
+        responses.put(("failed", worker_id, None, str(e)))
+        return
+    if model is None or tokenizer is None:
+        # load_medical_model reports failures by returning (None, None)
+        responses.put(("failed", worker_id, None, f"{loader} did not return a model"))
+        return
+    responses.put(("ready", worker_id, None, None))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        job_id, text, generation_kwargs = message
+        result = simplify_medical_report(text, model, tokenizer, generation_kwargs=generation_kwargs)
+        responses.put(("done", worker_id, job_id, result))
+
+class ReplicaPool:
+    """
+    Pool of pinned model worker processes with least-loaded dispatch.
+
+    submit() returns a Future resolving to the same result dict that
+    simplify_medical_report returns. Without n_replicas the pool size comes
+    from recommend_replicas() and the measured throughput (REPLICA_THROUGHPUT),
+    or MIN_THREADS_PER_REPLICA cores per replica if nothing was measured.
+    """
+
+    def __init__(self, n_replicas: Optional[int] = None, loader: str = DEFAULT_LOADER,
+                 cores: Optional[list] = None, metrics=METRICS, start_timeout: Optional[float] = None,
+                 throughput_by_threads: Optional[dict] = None):
+        cores = list(cores if cores is not None else available_cores())
+        if n_replicas is None:
+            throughput_by_threads = throughput_by_threads or load_throughput() or {MIN_THREADS_PER_REPLICA: 1.0}
+            n_replicas = recommend_replicas(len(cores), throughput_by_threads)["replicas"]
+        self.core_sets = plan_core_sets(n_replicas, cores)
+        self.metrics = metrics
+
+        context = mp.get_context("spawn")
+        self._responses = context.Queue()
+        self._requests = []
+        self._processes = []
+        for worker_id, core_set in enumerate(self.core_sets):
+            requests = context.Queue()
+            process = context.Process(
+                target=_worker_main,
+                args=(worker_id, core_set, loader, requests, self._responses),
+                name=f"replica-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self._requests.append(requests)
+            self._processes.append(process)
+
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._futures = {}
+        self._in_flight = [0] * len(self._processes)
+        self._owners = {}
+        self._ready = [False] * len(self._processes)
+        self._ready_event = threading.Event()
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, name="replica-collector", daemon=True)
+        self._collector.start()
+
+        if start_timeout is not None and not self._ready_event.wait(start_timeout):
+            self.close()
+            raise RuntimeError("No replica became ready in time")
+
+    @property
+    def size(self) -> int:
+        return len(self._processes)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every replica has loaded its model"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(self._ready):
+            if not any(process.is_alive() for process in self._processes):
+                return False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._ready_event.wait(0.1 if remaining is None else min(0.1, remaining))
+        return True
+
+    def submit(self, text: str, generation_kwargs: Optional[dict] = None) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Replica pool is closed")
+            candidates = [i for i, process in enumerate(self._processes) if process.is_alive()]
+            if not candidates:
+                raise RuntimeError("No live replicas")
+            # Least in-flight work first, preferring replicas that have finished loading
+            worker_id = min(candidates, key=lambda i: (not self._ready[i], self._in_flight[i], i))
+            job_id = next(self._job_ids)
+            self._futures[job_id] = future
+            self._owners[job_id] = worker_id
+            self._in_flight[worker_id] += 1
+            self.metrics.set(f"replicas.in_flight.{worker_id}", self._in_flight[worker_id])
+        self._requests[worker_id].put((job_id, text, generation_kwargs))
+        self.metrics.inc("replicas.jobs_submitted")
+        return future
+
+    def simplify(self, text: str, timeout: Optional[float] = None, generation_kwargs: Optional[dict] = None) -> dict:
+        return self.submit(text, generation_kwargs).result(timeout)
+
+    def load(self) -> list:
+        """In-flight requests per replica"""
+        with self._lock:
+            return list(self._in_flight)
+
+    def _collect(self):
+        while True:
+            try:
+                kind, worker_id, job_id, payload = self._responses.get(timeout=0.5)
+            except queue.Empty:
+                if self._closed:
+                    return
+                self._fail_dead_workers()
+                continue
+            except (EOFError, OSError):
+                return
+
+            if kind == "ready":
+                self._ready[worker_id] = True
+                self._ready_event.set()
+            elif kind == "failed":
+                self.metrics.inc("replicas.load_failures")
+            elif kind == "done":
+                with self._lock:
+                    future = self._futures.pop(job_id, None)
+                    self._owners.pop(job_id, None)
+                    self._in_flight[worker_id] -= 1
+                    self.metrics.set(f"replicas.in_flight.{worker_id}", self._in_flight[worker_id])
+                self.metrics.inc("replicas.jobs_completed")
+                if future is not None:
+                    future.set_result(payload)
+
+    def _fail_dead_workers(self):
+        with self._lock:
+            dead = {i for i, process in enumerate(self._processes) if not process.is_alive()}
+            if not dead:
+                return
+            for job_id in [j for j, owner in self._owners.items() if owner in dead]:
+                future = self._futures.pop(job_id)
+                worker_id = self._owners.pop(job_id)
+                self._in_flight[worker_id] -= 1
+                future.set_exception(RuntimeError(f"Replica {worker_id} exited"))
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._collector.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def measure_replica_throughput(thread_counts, loader: str = DEFAULT_LOADER,
+                               reports=SAMPLE_REPORTS, rounds: int = 2) -> dict:
+    """Requests/second of one replica at each thread count (batch-1, sequential)"""
+    cores = available_cores()
+    results = {}
+    for threads in thread_counts:
+        if threads > len(cores):
+            continue
+        with ReplicaPool(1, loader=loader, cores=cores[:threads]) as pool:
+            if not pool.wait_ready():
+                raise RuntimeError("Replica failed to load the model")
+            pool.simplify(reports[0])  # warm-up
+            started = time.perf_counter()
+            count = 0
+            for _ in range(rounds):
+                for report in reports:
+                    pool.simplify(report)
+                    count += 1
+            results[threads] = count / (time.perf_counter() - started)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-replica throughput and recommend a pool size")
+    parser.add_argument("--measure", nargs="+", type=int, default=[1, 2, 4, 8],
+                        help="Threads-per-replica values to measure")
+    parser.add_argument("--loader", default=DEFAULT_LOADER, help="module:function returning (model, tokenizer)")
+    parser.add_argument("--rounds", type=int, default=2, help="Passes over the sample reports per measurement")
+    parser.add_argument("--out", default=REPLICA_THROUGHPUT, help="Where to save the measurements for REPLICA_WORKERS=auto")
+    args = parser.parse_args()
+
+    throughput = measure_replica_throughput(args.measure, loader=args.loader, rounds=args.rounds)
+    recommendation = recommend_replicas(len(available_cores()), throughput)
+    summary = {"throughput_by_threads": throughput, "recommendation": recommendation}
+    print(json.dumps(summary, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"📝 Wrote {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
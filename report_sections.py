@@ -0,0 +1,85 @@
+"""
+Report structure parser.
+
+Splits radiology and discharge reports into their usual sections (HISTORY,
+FINDINGS, IMPRESSION, PLAN, ...) with a single compiled regex, so sections
+can be simplified in priority order - the impression first - and shown as
+soon as each one is done.
+"""
+
+import re
+from typing import Optional
+
+# Canonical section -> header spellings seen in reports
+SECTION_ALIASES = {
+    "IMPRESSION": ["IMPRESSION", "IMPRESSIONS", "CONCLUSION", "CONCLUSIONS", "SUMMARY", "OPINION"],
+    "DIAGNOSIS": ["DIAGNOSIS", "DIAGNOSES", "DISCHARGE DIAGNOSIS", "DISCHARGE DIAGNOSES",
+                  "ADMISSION DIAGNOSIS", "FINAL DIAGNOSIS", "ASSESSMENT", "ASSESSMENT AND PLAN"],
+    "PLAN": ["PLAN", "RECOMMENDATION", "RECOMMENDATIONS", "FOLLOW-UP", "FOLLOW UP",
+             "DISCHARGE INSTRUCTIONS", "DISPOSITION"],
+    "FINDINGS": ["FINDINGS", "FINDING", "RESULTS", "RESULT"],
+    "MEDICATIONS": ["MEDICATIONS", "DISCHARGE MEDICATIONS", "CURRENT MEDICATIONS"],
+    "HOSPITAL COURSE": ["HOSPITAL COURSE", "BRIEF HOSPITAL COURSE", "CLINICAL COURSE"],
+    "HISTORY": ["HISTORY", "CLINICAL HISTORY", "HISTORY OF PRESENT ILLNESS", "HPI", "INDICATION",
+                "INDICATIONS", "CLINICAL INDICATION", "CLINICAL INFORMATION", "REASON FOR EXAM",
+                "REASON FOR EXAMINATION", "CHIEF COMPLAINT"],
+    "COMPARISON": ["COMPARISON", "COMPARISONS", "PRIOR STUDIES"],
+    "TECHNIQUE": ["TECHNIQUE", "PROCEDURE", "PROTOCOL", "EXAMINATION", "EXAM"]
+}
+
+# Text before the first header, or reports without recognizable headers
+OTHER = "OTHER"
+
+# Simplification order - what patients most want to read comes first
+SECTION_PRIORITY = list(SECTION_ALIASES) + [OTHER]
+
+SECTION_TITLES = {name: name.title() for name in SECTION_PRIORITY}
+SECTION_TITLES[OTHER] = "Other Details"
+
+_CANONICAL = {alias: name for name, aliases in SECTION_ALIASES.items() for alias in aliases}
+_ALTERNATION = "|".join(re.escape(alias).replace(r"\ ", r"\s+") for alias in
+                        sorted(_CANONICAL, key=len, reverse=True))
+
+# A header either starts a line (any case, followed by a colon or the end of
+# the line) or is an upper-case label followed by a colon anywhere, since
+# OCR'd text often loses its line breaks
+_HEADER = re.compile(
+    rf"(?im:^[ \t]*(?P<line>{_ALTERNATION})[ \t]*(?::|[ \t]*$))"
+    rf"|(?P<inline>\b(?:{_ALTERNATION})\b)[ \t]*:"
+)
+
+def _canonical(header: str) -> str:
+    return _CANONICAL[" ".join(header.upper().split())]
+
+def starts_with_header(text: str) -> bool:
+    """True if the text begins with a section header"""
+    match = _HEADER.search(text)
+    return match is not None and not text[:match.start()].strip()
+
+def parse_sections(text: str) -> list:
+    """
+    Split a report into sections in document order.
+
+    Each section is a dict with the canonical name, the header as written
+    and the section body. Text before the first header becomes an OTHER
+    section; a report without headers is a single OTHER section.
+    """
+    sections = []
+    position, current, header = 0, OTHER, None
+    for match in _HEADER.finditer(text):
+        body = text[position:match.start()].strip()
+        if body:
+            sections.append({"name": current, "header": header, "text": body})
+        header = (match.group("line") or match.group("inline")).strip()
+        current = _canonical(header)
+        position = match.end()
+    body = text[position:].strip()
+    if body:
+        sections.append({"name": current, "header": header, "text": body})
+    return sections
+
+def prioritize_sections(sections: list, selected: Optional[list] = None) -> list:
+    """Sections in simplification order, optionally limited to selected names"""
+    if selected is not None:
+        sections = [section for section in sections if section["name"] in selected]
+    return sorted(sections, key=lambda section: SECTION_PRIORITY.index(section["name"]))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Shared, memory-mapped model weights for multi-process serving.
+
+The LoRA adapters are merged into FLAN-T5 once and written to a single
+read-only safetensors file. Replicas then build the model on the meta
+device and point every parameter at a private (copy-on-write) mmap of that
+file instead of reading it into their own memory. The weight pages live in
+the OS page cache once, shared by all replicas, so N replicas cost roughly
+one copy of the weights plus per-process activations.
+
+Usage:
+    python shared_weights.py export [--out ./shared_weights]
+    python shared_weights.py measure [--replicas 4] [--out ./shared_weights]
+
+Replica pool with shared weights:
+    REPLICA_WORKERS=4 REPLICA_LOADER=shared_weights:load_shared_model streamlit run app.py
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import struct
+import sys
+
+# Directory holding config.json, model.safetensors and the tokenizer
+SHARED_WEIGHTS_DIR = os.environ.get("SHARED_WEIGHTS_DIR", "./shared_weights")
+WEIGHTS_FILE = "model.safetensors"
+
+def export_shared_weights(model, tokenizer, out_dir: str = SHARED_WEIGHTS_DIR, model_type: str = None) -> str:
+    """Merge LoRA adapters into the base weights and write one safetensors file"""
+    if hasattr(model, "merge_and_unload"):
+        model = model.merge_and_unload()
+    path = os.path.join(out_dir, WEIGHTS_FILE)
+    if os.path.exists(path):
+        # Previous export is read-only
+        os.remove(path)
+    model.save_pretrained(out_dir, safe_serialization=True)
+    tokenizer.save_pretrained(out_dir)
+    if model_type:
+        with open(os.path.join(out_dir, "model_type.json"), "w") as f:
+            json.dump({"model_type": model_type}, f)
+    # Replicas only ever read the file
+    os.chmod(path, 0o444)
+    return path
+
+def mmap_safetensors(path: str) -> dict:
+    """
+    Map a safetensors file and return tensors that view the mapping.
+
+    The mapping is private (copy-on-write): pages stay shared with the page
+    cache and with other processes as long as nobody writes to them.
+    """
+    import torch
+
+    dtypes = {
+        "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+        "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+        "U8": torch.uint8, "BOOL": torch.bool
+    }
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data = torch.empty(0, dtype=torch.uint8).set_(storage)
+    base = 8 + header_size
+
+    tensors = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        start, end = meta["data_offsets"]
+        raw = data[base + start:base + end]
+        dtype = dtypes[meta["dtype"]]
+        if (base + start) % torch.empty(0, dtype=dtype).element_size():
+            # Misaligned tensor: fall back to a private copy
+            tensors[name] = raw.clone().view(dtype).view(meta["shape"])
+        else:
+            tensors[name] = raw.view(dtype).view(meta["shape"])
+    return tensors
+
+def load_shared_model(weights_dir: str = SHARED_WEIGHTS_DIR):
+    """Build the model on the meta device and attach the mapped weights (replica loader)"""
+    import torch
+    from transformers import AutoConfig, AutoModelForSeq2SeqLM, AutoTokenizer
+
+    config = AutoConfig.from_pretrained(weights_dir)
+    with torch.device("meta"):
+        model = AutoModelForSeq2SeqLM.from_config(config)
+    model.load_state_dict(mmap_safetensors(os.path.join(weights_dir, WEIGHTS_FILE)), strict=False, assign=True)
+    model.tie_weights()
+
+    missing = [name for name, tensor in _named_tensors(model) if tensor.is_meta]
+    if missing:
+        raise RuntimeError(f"Weights missing from {weights_dir}: {', '.join(missing[:5])}")
+    model.eval()
+
+    model_type_file = os.path.join(weights_dir, "model_type.json")
+    if os.path.exists(model_type_file):
+        with open(model_type_file, "r") as f:
+            model._model_type = json.load(f)["model_type"]
+
+    tokenizer = AutoTokenizer.from_pretrained(weights_dir)
+    return model, tokenizer
+
+def _named_tensors(model):
+    yield from model.named_parameters()
+    yield from model.named_buffers()
+
+def mapping_memory(pid: int, path: str) -> dict:
+    """Rss/Pss (bytes) of one process in total and for its mappings of path"""
+    totals = {"rss": 0, "pss": 0, "file_rss": 0, "file_pss": 0}
+    path = os.path.realpath(path)
+    in_file = False
+    with open(f"/proc/{pid}/smaps", "r") as f:
+        for line in f:
+            fields = line.split()
+            if not fields[0].endswith(":"):
+                # Mapping header: address perms offset dev inode [path]
+                in_file = len(fields) >= 6 and fields[5] == path
+                continue
+            key = fields[0][:-1]
+            if key in ("Rss", "Pss"):
+                value = int(fields[1]) * 1024
+                totals[key.lower()] += value
+                if in_file:
+                    totals["file_" + key.lower()] += value
+    return totals
+
+def _measure_worker(weights_dir, ready, done):
+    import torch
+    model, _ = load_shared_model(weights_dir)
+    # Touch every weight page, as serving would
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.float().sum()
+    ready.set()
+    done.wait()
+
+def measure_replica_memory(replicas: int, weights_dir: str = SHARED_WEIGHTS_DIR) -> dict:
+    """Start replicas on the shared weights and report their Rss/Pss"""
+    path = os.path.join(weights_dir, WEIGHTS_FILE)
+    context = mp.get_context("spawn")
+    done = context.Event()
+    workers = []
+    for _ in range(replicas):
+        ready = context.Event()
+        process = context.Process(target=_measure_worker, args=(weights_dir, ready, done), daemon=True)
+        process.start()
+        workers.append((process, ready))
+    try:
+        for process, ready in workers:
+            while not ready.wait(1):
+                if not process.is_alive():
+                    raise RuntimeError("Replica exited before loading the weights")
+        per_process = [mapping_memory(process.pid, path) for process, _ in workers]
+    finally:
+        done.set()
+        for process, _ in workers:
+            process.join(10)
+
+    weights_bytes = os.path.getsize(path)
+    return {
+        "replicas": replicas,
+        "weights_bytes": weights_bytes,
+        "total_rss": sum(m["rss"] for m in per_process),
+        "total_pss": sum(m["pss"] for m in per_process),
+        "weights_rss": sum(m["file_rss"] for m in per_process),
+        "weights_pss": sum(m["file_pss"] for m in per_process),
+        # Pss of the weight mappings summed over replicas ~ one copy when sharing works
+        "weights_copies": sum(m["file_pss"] for m in per_process) / weights_bytes,
+        "per_process": per_process
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared memory-mapped weights for model replicas")
+    parser.add_argument("command", choices=["export", "measure"])
+    parser.add_argument("--out", default=SHARED_WEIGHTS_DIR, help="Shared weights directory")
+    parser.add_argument("--replicas", type=int, default=4, help="Replicas to start for 'measure'")
+    parser.add_argument("--max-copies", type=float, default=1.1,
+                        help="Fail 'measure' if replicas hold more than this many copies of the weights")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from app import load_medical_model, get_model_type
+        model, tokenizer = load_medical_model()
+        if model is None:
+            print("❌ Could not load the medical model")
+            return 1
+        path = export_shared_weights(model, tokenizer, args.out, get_model_type(model))
+        print(f"✅ Wrote {path} ({os.path.getsize(path) / 1e6:.0f} MB)")
+        return 0
+
+    report = measure_replica_memory(args.replicas, args.out)
+    print(json.dumps({k: v for k, v in report.items() if k != "per_process"}, indent=2))
+    if report["weights_copies"] > args.max_copies:
+        print(f"❌ Replicas hold {report['weights_copies']:.2f} copies of the weights")
+        return 1
+    print(f"✅ {args.replicas} replicas share {report['weights_copies']:.2f} copies of the weights")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Synthetic medical reports for performance checks.
+
+Reports are assembled deterministically from phrase banks in the usual
+HISTORY / FINDINGS / IMPRESSION layout, so latency measurements are
+comparable between runs and machines. STANDARD_REPORTS holds one short,
+medium and long report; synthetic_reports() yields any number of varied ones.
+"""
+
+import random
+
+HISTORIES = [
+    "Shortness of breath for two weeks.",
+    "Chest pain radiating to the left arm, history of hypertension.",
+    "Fall from standing height with pain in the right wrist.",
+    "Follow-up of known liver lesion.",
+    "Persistent cough and low-grade fever.",
+    "Right lower quadrant pain, rule out appendicitis."
+]
+
+FINDINGS = [
+    "Mild cardiomegaly without pulmonary vascular congestion.",
+    "No focal consolidation, pleural effusion or pneumothorax.",
+    "Small bilateral pleural effusions with adjacent atelectasis.",
+    "Nondisplaced fracture of the distal radial metaphysis.",
+    "1.2 cm hypodense lesion in segment VI of the liver, too small to characterize.",
+    "The appendix is normal in caliber without periappendiceal inflammation.",
+    "Degenerative changes of the lower thoracic spine with osteophyte formation.",
+    "Complex tear of the posterior horn of the medial meniscus with a displaced fragment.",
+    "Moderate joint effusion with synovial thickening.",
+    "Scattered calcified granulomas, unchanged from the prior examination.",
+    "No hydronephrosis or nephrolithiasis.",
+    "Left ventricular ejection fraction estimated at 45 percent with mild global hypokinesis."
+]
+
+IMPRESSIONS = [
+    "No acute cardiopulmonary process.",
+    "Findings consistent with early congestive heart failure; clinical correlation recommended.",
+    "Distal radius fracture; orthopedic follow-up advised.",
+    "Likely simple hepatic cyst; no further imaging needed.",
+    "Meniscal tear as described; consider orthopedic referral.",
+    "Mildly reduced systolic function; recommend repeat echocardiogram in six months."
+]
+
+# Sentences in the FINDINGS section for each standard length
+LENGTHS = {"short": 2, "medium": 6, "long": 18}
+
+def synthetic_report(length: str = "medium", seed: int = 0) -> str:
+    """One report of the given length ("short", "medium" or "long")"""
+    rng = random.Random(f"{length}-{seed}")
+    sentences = LENGTHS[length]
+    findings = [rng.choice(FINDINGS) for _ in range(sentences)]
+    return (
+        f"HISTORY: {rng.choice(HISTORIES)}\n"
+        f"FINDINGS: {' '.join(findings)}\n"
+        f"IMPRESSION: {rng.choice(IMPRESSIONS)}"
+    )
+
+def synthetic_reports(count: int, seed: int = 0, lengths=("short", "medium", "long")) -> list:
+    """count varied reports cycling through the given lengths"""
+    return [synthetic_report(lengths[i % len(lengths)], seed + i) for i in range(count)]
+
+STANDARD_REPORTS = {length: synthetic_report(length) for length in LENGTHS}
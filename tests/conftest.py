@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app's modules live at the repository root
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def tiny_model():
+    """Small random T5 with the real tokenizer (load_test.load_tiny_model); runs offline"""
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from load_test import load_tiny_model
+
+    # The tokenizer path is relative to the repository root
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        return load_tiny_model()
+    finally:
+        os.chdir(cwd)
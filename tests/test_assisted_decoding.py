@@ -0,0 +1,50 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from assisted_decoding import _tiny_t5, acceptance_report, attach_draft_model, generate_assisted
+from metrics import Metrics
+
+@pytest.fixture
+def draft(tiny_model):
+    _, tokenizer = tiny_model
+    return _tiny_t5(tokenizer, d_model=32, layers=1, seed=1)
+
+def test_draft_is_not_a_submodule(tiny_model, draft):
+    model, _ = tiny_model
+    parameters = sum(p.numel() for p in model.parameters())
+    keys = set(model.state_dict())
+    attach_draft_model(model, draft)
+    try:
+        assert model._draft_model is draft
+        assert sum(p.numel() for p in model.parameters()) == parameters
+        assert set(model.state_dict()) == keys
+        assert "_draft_model" not in dict(model.named_children())
+    finally:
+        del model.__dict__["_draft_model"]
+
+TEXTS = [
+    "Mild cardiomegaly. No pleural effusion or pneumothorax.",
+    "The liver measures 16 cm and shows diffuse fatty infiltration without focal lesion."
+]
+
+@pytest.mark.parametrize("lookahead", [1, 3, 5])
+@pytest.mark.parametrize("same_model", [False, True], ids=["tiny-draft", "self-draft"])
+def test_assisted_matches_greedy(tiny_model, draft, lookahead, same_model):
+    model, tokenizer = tiny_model
+    inputs = tokenizer([f"Simplify this medical text for patients: {text}" for text in TEXTS],
+                       return_tensors="pt", padding=True)
+    kwargs = {"max_new_tokens": 16, "repetition_penalty": 1.1}
+    metrics = Metrics()
+    with torch.no_grad():
+        expected = model.generate(**inputs, **kwargs, num_beams=1, do_sample=False)
+    # A draft identical to the main model has every proposal accepted
+    attach_draft_model(model, model if same_model else draft)
+    try:
+        output = generate_assisted(model, dict(inputs), {**kwargs, "assist_lookahead": lookahead}, metrics)
+    finally:
+        del model.__dict__["_draft_model"]
+    assert tokenizer.batch_decode(output, skip_special_tokens=True) == \
+        tokenizer.batch_decode(expected, skip_special_tokens=True)
+    if same_model:
+        assert acceptance_report(metrics)["acceptance_rate"] == 1.0
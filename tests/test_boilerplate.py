@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from boilerplate import (BoilerplateIndex, learn_index, load_index, looks_clinical, strip_boilerplate,
+                         strip_repeated_lines)
+
+FINDINGS = [
+    "No acute cardiopulmonary process.",
+    "Lungs are clear. Heart size is normal.",
+    "Mild degenerative changes of the lumbar spine.",
+]
+
+def report(i, finding):
+    return (
+        "St. Mary Imaging Services\n"
+        "Confidential patient information\n"
+        f"Accession {1000 + i}\n"
+        f"{finding}\n"
+        f"Additional note {i}\n"
+        "Electronically signed by the reading physician\n"
+        "Thank you for your referral"
+    )
+
+def corpus():
+    return [report(i, FINDINGS[i % len(FINDINGS)]) for i in range(30)]
+
+def test_recurring_findings_are_not_learned():
+    index, examples = learn_index(corpus(), min_docs=5)
+    for finding in FINDINGS:
+        assert not index.matches(finding)
+        for sentence in finding.split(". "):
+            assert not index.matches(sentence)
+    assert "St. Mary Imaging Services" in examples
+    assert "Thank you for your referral" in examples
+
+def test_recurring_findings_survive_stripping():
+    index, _ = learn_index(corpus(), min_docs=5)
+    text = report(99, "No acute cardiopulmonary process. Small left pleural effusion.")
+    cleaned, stats = strip_boilerplate(text, index)
+    assert "No acute cardiopulmonary process." in cleaned
+    assert "Small left pleural effusion." in cleaned
+    assert "St. Mary Imaging Services" not in cleaned
+    assert "St. Mary Imaging Services" in stats["removed"]
+
+def test_mid_report_lines_need_the_known_list():
+    # The sentence recurs in every report, but never at a page edge
+    documents = ["\n".join([f"Line {i}{c}" for c in "abcd"]
+                           + ["This report was dictated using voice recognition software"]
+                           + [f"Line {i}{c}" for c in "efgh"]) for i in range(10)]
+    sentence = "This report was dictated using voice recognition software"
+    index, _ = learn_index(documents, min_docs=5)
+    assert not index.matches(sentence)
+    index, _ = learn_index(documents, min_docs=5, known=[sentence, "No acute cardiopulmonary process."])
+    assert index.matches(sentence)
+    assert not index.matches("No acute cardiopulmonary process.")
+
+def test_clinical_vocabulary():
+    assert looks_clinical("No acute cardiopulmonary process.")
+    assert looks_clinical("Ejection fraction 55%")
+    assert not looks_clinical("Thank you for your referral")
+
+def test_repeated_lines_with_different_values_are_kept():
+    pages = [
+        "City Hospital Laboratory\nPotassium 5.9 mmol/L\nSodium 140 mmol/L\nbody\nPage 1 of 2",
+        "City Hospital Laboratory\nPotassium 3.1 mmol/L\nSodium 128 mmol/L\nbody\nPage 2 of 2",
+    ]
+    cleaned, removed = strip_repeated_lines(pages)
+    assert "Potassium 3.1 mmol/L" in cleaned[1] and "Sodium 128 mmol/L" in cleaned[1]
+    assert removed[1] == ["City Hospital Laboratory", "Page 2 of 2"]
+
+def test_bare_counts_are_not_page_numbers():
+    cleaned, stats = strip_boilerplate("Lymph nodes examined:\n2 of 12\nPage 3\nDone")
+    assert "2 of 12" in cleaned
+    assert stats["removed"] == ["Page 3"]
+
+def test_old_indexes_are_rejected(tmp_path):
+    path = tmp_path / "index.json"
+    path.write_text(json.dumps({"lines": [], "blocks": []}))
+    with pytest.raises(ValueError):
+        load_index(str(path))
+    BoilerplateIndex().save(str(path))
+    assert len(load_index(str(path))) == 0
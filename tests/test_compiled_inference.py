@@ -0,0 +1,67 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import compiled_inference
+from assisted_decoding import _tiny_t5
+from compiled_inference import _serving_copy, compile_model
+
+TEXT = "Simplify this medical text for patients: Mild cardiomegaly. No pleural effusion."
+
+@pytest.fixture
+def stances(monkeypatch):
+    """Records the compiler stance of every compiled call; torch.compile itself is skipped (slow on CPU)"""
+    seen = []
+
+    def fake_compile(fn, **kwargs):
+        def compiled(*args, **kw):
+            seen.append(torch._dynamo.eval_frame._stance.stance)
+            return fn(*args, **kw)
+        return compiled
+
+    monkeypatch.setattr(torch, "compile", fake_compile)
+    return seen
+
+def generate(model, tokenizer):
+    inputs = tokenizer([TEXT], return_tensors="pt", padding="max_length", max_length=32)
+    with torch.no_grad():
+        return model.generate(**inputs, max_new_tokens=8, num_beams=2)
+
+def test_serving_copy_shares_weights(tiny_model):
+    model, _ = tiny_model
+    clone = _serving_copy(model)
+    clone.get_encoder().forward = None
+    assert clone.get_encoder() is not model.get_encoder()
+    assert "forward" not in model.get_encoder().__dict__
+    assert clone.lm_head.weight is model.lm_head.weight
+
+def test_compile_leaves_the_model_untouched(tiny_model, stances, tmp_path):
+    model, tokenizer = tiny_model
+    served = compile_model(model, tokenizer, buckets=(32,), cache_dir=str(tmp_path))
+    assert served._compile_report["mode"] == "compiled"
+    assert "forward" not in model.__dict__ and "forward" not in model.get_encoder().__dict__
+    assert torch.equal(generate(served, tokenizer), generate(model, tokenizer))
+
+def test_stance_is_scoped_to_serving_calls(tiny_model, stances, tmp_path):
+    model, tokenizer = tiny_model
+    served = compile_model(model, tokenizer, buckets=(32,), cache_dir=str(tmp_path))
+    # Warm-up compiles under the default stance
+    assert set(stances) == {"default"}
+    stances.clear()
+    generate(served, tokenizer)
+    assert set(stances) == {compiled_inference.SERVING_STANCE}
+    assert torch._dynamo.eval_frame._stance.stance == "default"
+
+def test_lora_is_merged_into_a_copy(tiny_model, stances, tmp_path):
+    peft = pytest.importorskip("peft")
+    _, tokenizer = tiny_model
+    # A model of its own: LoRA layers are injected into its modules
+    lora = peft.get_peft_model(_tiny_t5(tokenizer, d_model=64, layers=2, seed=2), peft.LoraConfig(r=4, target_modules=["q", "v"], init_lora_weights=False))
+    weights = {name: p.detach().clone() for name, p in lora.named_parameters()}
+    expected = generate(lora, tokenizer)
+
+    served = compile_model(lora, tokenizer, buckets=(32,), cache_dir=str(tmp_path))
+    assert served is not lora and not hasattr(served, "peft_config")
+    assert all(torch.equal(p, weights[name]) for name, p in lora.named_parameters())
+    assert torch.equal(generate(lora, tokenizer), expected)
+    assert torch.equal(generate(served, tokenizer), expected)
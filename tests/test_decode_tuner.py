@@ -0,0 +1,65 @@
+import pytest
+
+from decode_tuner import choose_operating_points, evaluate_config, expand_grid, pareto_front
+
+def result(name, seconds, quality):
+    return {"config": {"name": name}, "mean_seconds": seconds, "quality": quality}
+
+RESULTS = [
+    result("baseline", 2.0, 0.60),
+    result("greedy", 0.5, 0.50),
+    result("beams-2", 1.0, 0.58),
+    result("short", 0.8, 0.45),
+    result("slow", 3.0, 0.55),
+    result("best", 2.5, 0.62),
+    result("tie", 1.0, 0.56)
+]
+
+def names(results):
+    return [r["config"]["name"] for r in results]
+
+def test_pareto_front():
+    assert names(pareto_front(RESULTS)) == ["greedy", "beams-2", "baseline", "best"]
+    assert pareto_front([]) == []
+
+def test_pareto_front_keeps_one_of_equal_results():
+    assert names(pareto_front([result("a", 1.0, 0.5), result("b", 1.0, 0.5)])) == ["a"]
+
+def test_choose_operating_points():
+    baseline = RESULTS[0]
+    points = choose_operating_points(RESULTS, baseline, relative_floor=0.95, degraded_floor=0.8)
+    assert points["floor"] == 0.57
+    assert points["chosen"]["config"]["name"] == "beams-2"
+    assert points["degraded"]["config"]["name"] == "greedy"
+
+def test_choose_operating_points_falls_back_to_the_baseline():
+    baseline = RESULTS[0]
+    # Nothing reaches the floor: keep the baseline, and degrade no further than it
+    points = choose_operating_points(RESULTS, baseline, relative_floor=1.5, degraded_floor=1.2)
+    assert points["chosen"] is baseline
+    assert points["degraded"] is baseline
+
+def test_absolute_quality_floor():
+    baseline = RESULTS[0]
+    points = choose_operating_points(RESULTS, baseline, relative_floor=0.5, degraded_floor=0.5, quality_floor=0.59)
+    assert points["floor"] == 0.59
+    assert points["chosen"]["config"]["name"] == "baseline"
+    assert points["degraded"]["config"]["name"] == "baseline"
+
+def test_expand_grid():
+    configs = expand_grid({"num_beams": [1, 4], "max_new_tokens": [128, 256]})
+    assert len(configs) == 4
+    assert {"num_beams": 4, "max_new_tokens": 128} in configs
+
+def test_expand_grid_drops_length_penalty_for_greedy():
+    configs = expand_grid({"num_beams": [1, 2], "length_penalty": [0.8, 1.0]})
+    assert configs == [{"num_beams": 1}, {"num_beams": 2, "length_penalty": 0.8}, {"num_beams": 2, "length_penalty": 1.0}]
+
+def test_evaluate_config_on_the_tiny_model(tiny_model):
+    model, tokenizer = tiny_model
+    sources = ["Mild cardiomegaly.", "No acute intracranial abnormality."]
+    evaluated = evaluate_config(model, tokenizer, {"num_beams": 2, "max_new_tokens": 8, "max_input_tokens": 64},
+                                sources, ["Your heart is a bit big.", "Your brain scan is normal."])
+    assert 0.0 <= evaluated["quality"] <= 1.0
+    assert evaluated["mean_seconds"] > 0
+    assert evaluated["config"]["num_beams"] == 2
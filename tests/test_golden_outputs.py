@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import golden_outputs
+from golden_outputs import compare_outputs, edit_distance
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = [
+    "Mild cardiomegaly. No pleural effusion.",
+    "Hemoglobin 9.2 g/dL, below the reference range.",
+    "No acute intracranial abnormality."
+]
+
+@pytest.fixture(autouse=True)
+def token_f1_similarity(monkeypatch):
+    # Keep the similarity offline and deterministic
+    monkeypatch.setattr(golden_outputs, "SENTENCE_TRANSFORMERS_AVAILABLE", False)
+
+def run(outputs, seconds):
+    return {
+        "sources": SOURCES,
+        "outputs": outputs,
+        "token_ids": [text.split() for text in outputs],
+        "total_seconds": seconds
+    }
+
+@pytest.mark.parametrize("a, b, distance", [
+    ([], [], 0),
+    ([1, 2, 3], [], 3),
+    ([], [1, 2], 2),
+    ([1, 2, 3], [1, 2, 3], 0),
+    ([1, 2, 3], [1, 3], 1),
+    ([1, 2, 3], [1, 4, 3], 1),
+    ([1, 2, 3, 4], [2, 1, 3, 4, 5], 3),
+    (list("kitten"), list("sitting"), 3)
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b) == distance
+    assert edit_distance(b, a) == distance
+
+def test_identical_outputs():
+    outputs = ["Your heart is a bit big.", "Your hemoglobin is 9.2, which is low.", "Your brain scan is normal."]
+    report = compare_outputs(run(outputs, 6.0), run(list(outputs), 2.0))
+    assert report["exact_match"] == 1.0
+    assert report["mean_token_edit_distance"] == 0.0
+    assert report["mean_similarity"] == 1.0
+    assert report["similarity_method"] == "token F1"
+    assert report["numbers_changed"] == 0
+    assert report["speedup"] == 3.0
+    assert report["worst"] == []
+
+def test_changed_outputs():
+    golden = run(["Your heart is a bit big.", "Your hemoglobin is 9.2, which is low.", "Your brain scan is normal."],
+                 4.0)
+    candidate = run(["Your heart is a bit big.", "Your hemoglobin is 2.9, which is low.", "Your scan is normal."],
+                    4.0)
+    report = compare_outputs(golden, candidate)
+    assert report["exact_match"] == pytest.approx(1 / 3)
+    # One of 7 tokens replaced, one of 5 tokens removed
+    assert report["max_token_edit_distance"] == 0.2
+    assert report["mean_token_edit_distance"] == round((1 / 7 + 1 / 5) / 3, 4)
+    assert report["numbers_changed"] == 1
+    assert report["speedup"] == 1.0
+    assert [case["source"] for case in report["worst"]] == [SOURCES[1], SOURCES[2]]
+
+def test_same_engine_reproduces_its_outputs(monkeypatch):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    monkeypatch.chdir(ROOT)
+    kwargs = {"max_new_tokens": 16, "num_beams": 2, "do_sample": False}
+    golden = {"sources": SOURCES, **golden_outputs.run_outputs(SOURCES, "load_test:load_tiny_model", kwargs, 2)}
+    candidate = golden_outputs.run_outputs(SOURCES, "load_test:load_tiny_model", kwargs, 3)
+    report = compare_outputs(golden, candidate)
+    assert report["examples"] == len(SOURCES)
+    assert report["exact_match"] == 1.0
+    assert report["max_token_edit_distance"] == 0.0
+    assert report["numbers_changed"] == 0
@@ -0,0 +1,62 @@
+import io
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from image_ingest import (MAX_DECODE_BYTES, ImageBudgetError, SessionImageBudget, decode_nbytes,
+                          ingest_image)
+
+def png_claiming(width, height, mode="RGB"):
+    """Small PNG whose header claims width x height; decoding its pixel data would fail"""
+    buffer = io.BytesIO()
+    Image.new(mode, (8, 8)).save(buffer, format="PNG")
+    data = bytearray(buffer.getvalue())
+    # IHDR: length, type, width, height, ... then CRC over type and body
+    data[16:24] = struct.pack(">II", width, height)
+    data[29:33] = struct.pack(">I", zlib.crc32(bytes(data[12:29])))
+    return io.BytesIO(bytes(data))
+
+def encoded(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    buffer.seek(0)
+    return buffer
+
+def test_decode_size_comes_from_the_header():
+    assert decode_nbytes(Image.open(png_claiming(1000, 2000))) == 1000 * 2000 * 4
+    assert decode_nbytes(Image.open(png_claiming(1000, 2000, mode="L"))) == 1000 * 2000
+    # Palette images are converted to grayscale before reducing
+    assert decode_nbytes(Image.open(png_claiming(1000, 2000, mode="P"))) == 2 * 1000 * 2000
+
+def test_oversized_png_is_rejected_before_decoding():
+    budget = SessionImageBudget()
+    # 9000 x 9000 RGB: 81 MP (under the pixel cap) but 324 MB decoded
+    with pytest.raises(ImageBudgetError, match="MB"):
+        ingest_image(png_claiming(9000, 9000), budget, "upload")
+    assert budget.used == 0
+
+def test_budget_is_charged_before_decoding():
+    budget = SessionImageBudget()
+    budget.charge("other", budget.limit - 1_000_000)
+    # Would not fit next to "other"; the truncated pixel data is never read
+    with pytest.raises(ImageBudgetError, match="already holds"):
+        ingest_image(png_claiming(1000, 1000), budget, "upload")
+    assert budget.held == {"other": budget.limit - 1_000_000}
+
+def test_charge_is_lowered_after_reducing():
+    budget = SessionImageBudget()
+    ingested = ingest_image(encoded(Image.new("P", (4000, 4000)), "PNG"), budget, "upload", max_pixels=1_000_000)
+    assert ingested["ocr_size"] == (1000, 1000)
+    assert budget.held == {"upload": ingested["nbytes"]}
+    assert ingested["nbytes"] < 2 * 4000 * 4000
+
+def test_large_jpeg_is_charged_at_its_draft_size():
+    budget = SessionImageBudget()
+    # 8000 x 8000 RGB would be 256 MB at full size; the 1/8 draft is 1 MP grayscale
+    ingested = ingest_image(encoded(Image.new("RGB", (8000, 8000), "white"), "JPEG"), budget, "upload",
+                            max_pixels=1_000_000)
+    assert ingested["draft_used"]
+    assert 8000 * 8000 * 4 > MAX_DECODE_BYTES
+    assert budget.held == {"upload": ingested["nbytes"]}
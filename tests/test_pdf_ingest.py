@@ -0,0 +1,22 @@
+import pytest
+
+pymupdf = pytest.importorskip("pymupdf")
+
+from pdf_ingest import extract_pdf_pages
+
+def pdf(pages):
+    document = pymupdf.open()
+    for number in range(1, pages + 1):
+        document.new_page().insert_text((72, 72), f"Page {number}: hemoglobin within the reference range.")
+    return document.tobytes()
+
+def test_short_pdf_is_not_truncated():
+    pages, truncated = extract_pdf_pages(pdf(3))
+    assert [page["method"] for page in pages] == ["text"] * 3
+    assert truncated == 0
+
+def test_pages_past_the_limit_are_counted():
+    pages, truncated = extract_pdf_pages(pdf(8), max_pages=5)
+    assert [page["page"] for page in pages] == [1, 2, 3, 4, 5]
+    assert truncated == 3
+    assert pages[-1]["text"].startswith("Page 5:")
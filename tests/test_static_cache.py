@@ -0,0 +1,30 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from kv_cache_pool import STATIC_CACHE_AVAILABLE, StaticCachePool, generate_with_static_cache
+
+pytestmark = pytest.mark.skipif(not STATIC_CACHE_AVAILABLE, reason="transformers has no StaticCache")
+
+TEXTS = [
+    "Mild cardiomegaly. No pleural effusion or pneumothorax.",
+    "The liver measures 16 cm and shows diffuse fatty infiltration without focal lesion."
+]
+
+@pytest.fixture
+def inputs(tiny_model):
+    _, tokenizer = tiny_model
+    return tokenizer([f"Simplify this medical text for patients: {text}" for text in TEXTS],
+                     return_tensors="pt", padding=True)
+
+@pytest.mark.parametrize("num_beams", [1, 4])
+def test_static_cache_matches_generate(tiny_model, inputs, num_beams):
+    model, _ = tiny_model
+    kwargs = {"max_new_tokens": 16, "num_beams": num_beams, "do_sample": False, "repetition_penalty": 1.1}
+    with torch.no_grad():
+        expected = model.generate(**inputs, **kwargs)
+        pool = StaticCachePool()
+        # The second call runs on a cache taken back from the pool
+        for _ in range(2):
+            output = generate_with_static_cache(model, dict(inputs), kwargs, pool)
+            assert torch.equal(output, expected)
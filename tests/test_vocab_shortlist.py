@@ -0,0 +1,39 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from vocab_shortlist import generate_with_shortlist
+
+TEXTS = [
+    "Mild cardiomegaly. No pleural effusion or pneumothorax.",
+    "The liver measures 16 cm and shows diffuse fatty infiltration without focal lesion."
+]
+
+@pytest.fixture
+def inputs(tiny_model):
+    model, tokenizer = tiny_model
+    yield tokenizer([f"Simplify this medical text for patients: {text}" for text in TEXTS],
+                    return_tensors="pt", padding=True)
+    # The view is cached on the shared session model
+    model.__dict__.pop("_shortlist_view", None)
+
+@pytest.mark.parametrize("num_beams", [1, 4])
+def test_full_vocabulary_shortlist_matches_generate(tiny_model, inputs, num_beams):
+    model, _ = tiny_model
+    kwargs = {"max_new_tokens": 16, "num_beams": num_beams, "do_sample": False, "repetition_penalty": 1.1}
+    shortlist = torch.arange(model.config.vocab_size)
+    with torch.no_grad():
+        expected = model.generate(**inputs, **kwargs)
+        output = generate_with_shortlist(model, dict(inputs), kwargs, shortlist)
+    assert torch.equal(output, expected)
+
+def test_greedy_shortlist_of_the_output_tokens_matches_generate(tiny_model, inputs):
+    model, _ = tiny_model
+    kwargs = {"max_new_tokens": 16, "num_beams": 1, "do_sample": False, "repetition_penalty": 1.1}
+    with torch.no_grad():
+        expected = model.generate(**inputs, **kwargs)
+        # Only the tokens greedy decoding picks; the input tokens are added per request
+        shortlist = torch.unique(expected)
+        output = generate_with_shortlist(model, dict(inputs), kwargs, shortlist)
+    assert len(shortlist) < model.config.vocab_size
+    assert torch.equal(output, expected)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Reduced output vocabulary for the decoder.
+
+Patient-facing simplifications use a small part of FLAN-T5's 32k-token
+vocabulary. A shortlist is built once from the training corpus targets;
+per request it is merged with the input's token ids, and generation runs on
+a view of the model whose decoder embedding and LM head only hold those
+rows. The output projection, softmax, repetition penalty and beam top-k
+all work on the shortlist; generated ids are mapped back to the full
+vocabulary afterwards.
+
+The shortlist view is built once per model and shortlist and kept on the
+model; a request only gathers the rows of its input tokens that are not
+already in the shortlist.
+
+Usage:
+    python vocab_shortlist.py build [--min-count 2] [--out vocab_shortlist.json]
+    python vocab_shortlist.py validate [--limit 200]
+    VOCAB_SHORTLIST=vocab_shortlist.json streamlit run app.py
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from metrics import METRICS
+
+try:
+    from torch import nn
+    _Module = nn.Module
+except ImportError:
+    _Module = object
+
+# Shortlist file written by `build`; empty disables the shortlist
+VOCAB_SHORTLIST = os.environ.get("VOCAB_SHORTLIST", "")
+DEFAULT_SHORTLIST_FILE = "vocab_shortlist.json"
+
+# Target tokens seen fewer times than this are left out
+MIN_COUNT = 2
+
+_VIEW_LOCK = threading.Lock()
+
+def build_shortlist(tokenizer, targets, min_count: int = MIN_COUNT) -> list:
+    """Token ids used in the corpus targets, plus the special tokens"""
+    counts = Counter()
+    for start in range(0, len(targets), 1000):
+        for ids in tokenizer(list(targets[start:start + 1000]), add_special_tokens=True)["input_ids"]:
+            counts.update(ids)
+    ids = {token for token, count in counts.items() if count >= min_count}
+    ids.update(tokenizer.all_special_ids)
+    return sorted(ids)
+
+def save_shortlist(token_ids: list, path: str, **info):
+    with open(path, "w") as f:
+        json.dump({"token_ids": token_ids, "size": len(token_ids), **info}, f)
+
+@lru_cache(maxsize=4)
+def load_shortlist(path: str = VOCAB_SHORTLIST):
+    """Shortlist token ids as a sorted tensor"""
+    import torch
+
+    with open(path, "r") as f:
+        return torch.tensor(json.load(f)["token_ids"], dtype=torch.long)
+
+def _special_ids(config) -> list:
+    ids = []
+    for name in ("pad_token_id", "eos_token_id", "decoder_start_token_id"):
+        value = getattr(config, name, None)
+        ids.extend(value if isinstance(value, (list, tuple)) else [] if value is None else [value])
+    return ids
+
+def request_token_ids(shortlist, input_ids, special_ids=()):
+    """The shortlist merged with every token of the batch's inputs (and the special tokens)"""
+    import torch
+
+    special = torch.tensor(list(special_ids), dtype=torch.long, device=input_ids.device)
+    return torch.unique(torch.cat([shortlist.to(input_ids.device), input_ids.flatten(), special]))
+
+def _clone(module):
+    # Shares parameters and submodules, but submodules can be swapped on the clone
+    clone = copy.copy(module)
+    clone._modules = dict(module._modules)
+    # A compiled forward (compiled_inference) is bound to the original model
+    clone.__dict__.pop("forward", None)
+    return clone
+
+def _local(token_ids, token):
+    import torch
+
+    if isinstance(token, (list, tuple)):
+        return [_local(token_ids, t) for t in token]
+    if token is None:
+        return None
+    position = int(torch.searchsorted(token_ids, torch.tensor(token, device=token_ids.device)))
+    if position >= len(token_ids) or token_ids[position] != token:
+        raise ValueError(f"Special token {token} is not in the shortlist")
+    return position
+
+def shortlist_model(model, token_ids):
+    """View of the model whose decoder vocabulary is token_ids (local ids 0..n-1)"""
+    from torch import nn
+
+    if hasattr(model, "get_base_model"):
+        # PEFT: the LoRA layers live inside the base model's blocks
+        model = model.get_base_model()
+    token_ids = token_ids.to(model.lm_head.weight.device)
+
+    view = _clone(model)
+    decoder = _clone(model.decoder)
+    decoder.embed_tokens = nn.Embedding.from_pretrained(
+        model.decoder.embed_tokens.weight.index_select(0, token_ids), freeze=True
+    )
+    view.decoder = decoder
+    head = nn.Linear(model.config.d_model, len(token_ids), bias=False,
+                     device=model.lm_head.weight.device, dtype=model.lm_head.weight.dtype)
+    head.weight = nn.Parameter(model.lm_head.weight.index_select(0, token_ids), requires_grad=False)
+    view.lm_head = head
+
+    view.config = copy.deepcopy(model.config)
+    view.generation_config = copy.deepcopy(model.generation_config)
+    view.config.vocab_size = len(token_ids)
+    for config in (view.config, view.generation_config):
+        for name in ("pad_token_id", "eos_token_id", "decoder_start_token_id"):
+            if getattr(config, name, None) is not None:
+                setattr(config, name, _local(token_ids, getattr(config, name)))
+    return view
+
+class _ExtendedEmbedding(_Module):
+    """Shortlist embedding plus rows for a request's own tokens (local ids n, n+1, ...)"""
+
+    def __init__(self, base, extra_weight):
+        super().__init__()
+        self.base = base
+        self.extra_weight = extra_weight
+
+    def forward(self, ids):
+        import torch
+
+        size = self.base.num_embeddings
+        embedded = self.base(ids.clamp(max=size - 1))
+        extra = ids >= size
+        if extra.any():
+            embedded = torch.where(extra.unsqueeze(-1), self.extra_weight[(ids - size).clamp(min=0)], embedded)
+        return embedded
+
+class _ExtendedHead(_Module):
+    """Shortlist LM head plus logits for a request's own tokens"""
+
+    def __init__(self, base, extra_weight):
+        super().__init__()
+        self.base = base
+        self.extra_weight = extra_weight
+
+    def forward(self, hidden):
+        import torch
+
+        return torch.cat([self.base(hidden), hidden @ self.extra_weight.T], dim=-1)
+
+def cached_shortlist_view(model, shortlist):
+    """
+    (vocabulary ids, view) for the shortlist plus the special tokens, built
+    once per model and shortlist and kept on the model as _shortlist_view
+    """
+    import torch
+
+    cached = getattr(model, "_shortlist_view", None)
+    if cached is None or cached[0] is not shortlist:
+        with _VIEW_LOCK:
+            cached = getattr(model, "_shortlist_view", None)
+            if cached is None or cached[0] is not shortlist:
+                special = torch.tensor(_special_ids(model.config), dtype=torch.long)
+                token_ids = torch.unique(torch.cat([shortlist.cpu(), special]))
+                view = shortlist_model(model, token_ids)
+                cached = (shortlist, token_ids.to(view.lm_head.weight.device), view)
+                model._shortlist_view = cached
+    return cached[1], cached[2]
+
+def _extend_view(view, model, extra_ids):
+    """The cached view with rows for extra_ids appended (local ids after the shortlist)"""
+    if hasattr(model, "get_base_model"):
+        model = model.get_base_model()
+    extended = _clone(view)
+    decoder = _clone(view.decoder)
+    decoder.embed_tokens = _ExtendedEmbedding(
+        view.decoder.embed_tokens, model.decoder.embed_tokens.weight.index_select(0, extra_ids)
+    )
+    extended.decoder = decoder
+    extended.lm_head = _ExtendedHead(view.lm_head, model.lm_head.weight.index_select(0, extra_ids))
+    extended.config = copy.copy(view.config)
+    extended.config.vocab_size = view.config.vocab_size + len(extra_ids)
+    return extended
+
+def generate_with_shortlist(model, inputs: dict, generation_kwargs: dict, shortlist, generate=None, metrics=METRICS):
+    """Generate on the shortlisted vocabulary and return full-vocabulary token ids"""
+    import torch
+
+    token_ids, view = cached_shortlist_view(model, shortlist)
+    # Input tokens outside the shortlist (names, rare terms) are added for this request only
+    extra = torch.unique(inputs["input_ids"].to(token_ids.device).flatten())
+    extra = extra[~torch.isin(extra, token_ids)]
+    if len(extra):
+        view = _extend_view(view, model, extra)
+        token_ids = torch.cat([token_ids, extra])
+    metrics.observe("shortlist.size", len(token_ids))
+    if generate is None:
+        outputs = view.generate(**inputs, **generation_kwargs)
+    else:
+        outputs = generate(view, inputs, generation_kwargs)
+    return token_ids.to(outputs.device)[outputs]
+
+def validate(model, tokenizer, sources, shortlist, generation_kwargs: dict, batch_size: int = 8) -> dict:
+    """Compare shortlist and full-vocabulary outputs on an eval set"""
+    import torch
+
+    exact, outside, total_tokens = 0, 0, 0
+    full_seconds = shortlist_seconds = 0.0
+    mismatches = []
+    for start in range(0, len(sources), batch_size):
+        batch = list(sources[start:start + batch_size])
+        inputs = tokenizer([f"Simplify this medical text for patients: {text}" for text in batch],
+                           return_tensors="pt", max_length=512, truncation=True, padding=True)
+        with torch.no_grad():
+            started = time.perf_counter()
+            full = model.generate(**inputs, **generation_kwargs)
+            full_seconds += time.perf_counter() - started
+            started = time.perf_counter()
+            reduced = generate_with_shortlist(model, inputs, generation_kwargs, shortlist)
+            shortlist_seconds += time.perf_counter() - started
+
+        allowed = set(request_token_ids(shortlist, inputs["input_ids"], _special_ids(model.config)).tolist())
+        for source, full_ids, reduced_ids in zip(batch, full, reduced):
+            full_text = tokenizer.decode(full_ids, skip_special_tokens=True)
+            reduced_text = tokenizer.decode(reduced_ids, skip_special_tokens=True)
+            tokens = [t for t in full_ids.tolist() if t != tokenizer.pad_token_id]
+            total_tokens += len(tokens)
+            outside += sum(t not in allowed for t in tokens)
+            if full_text == reduced_text:
+                exact += 1
+            elif len(mismatches) < 5:
+                mismatches.append({"source": source, "full": full_text, "shortlist": reduced_text})
+
+    return {
+        "examples": len(sources),
+        "shortlist_size": len(shortlist),
+        "exact_match": exact / len(sources) if len(sources) else 0.0,
+        # Share of full-vocabulary output tokens the shortlist could not produce
+        "token_miss_rate": outside / total_tokens if total_tokens else 0.0,
+        "full_seconds": round(full_seconds, 2),
+        "shortlist_seconds": round(shortlist_seconds, 2),
+        "speedup": round(full_seconds / shortlist_seconds, 2) if shortlist_seconds else None,
+        "mismatches": mismatches
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Decoder vocabulary shortlist")
+    parser.add_argument("command", choices=["build", "validate"])
+    parser.add_argument("--corpus", default=None, help="Corpus CSV (default: CORPUS_PATH)")
+    parser.add_argument("--out", default=VOCAB_SHORTLIST or DEFAULT_SHORTLIST_FILE, help="Shortlist file")
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT, help="Minimum target frequency for a token")
+    parser.add_argument("--limit", type=int, default=200, help="Eval examples for 'validate'")
+    parser.add_argument("--min-exact", type=float, default=0.95,
+                        help="Fail 'validate' if fewer outputs than this match the full vocabulary")
+    args = parser.parse_args()
+
+    from corpus import CORPUS_PATH, SOURCE_COLUMN, TARGET_COLUMN, load_corpus, split_corpus
+
+    corpus = load_corpus(args.corpus or CORPUS_PATH)
+    train, evaluation = split_corpus(corpus)
+
+    if args.command == "build":
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained("./medical_lora_adapters")
+        token_ids = build_shortlist(tokenizer, train[TARGET_COLUMN].tolist(), args.min_count)
+        save_shortlist(token_ids, args.out, corpus=args.corpus or CORPUS_PATH, rows=len(train),
+                       min_count=args.min_count, vocab_size=len(tokenizer))
+        print(f"✅ Wrote {args.out}: {len(token_ids)} of {len(tokenizer)} tokens "
+              f"({len(token_ids) / len(tokenizer):.0%}) from {len(train)} targets")
+        return 0
+
+    from app import GENERATION_KWARGS, load_medical_model
+
+    model, tokenizer = load_medical_model()
+    if model is None:
+        print("❌ Could not load the medical model")
+        return 1
+    report = validate(model, tokenizer, evaluation[SOURCE_COLUMN].tolist()[:args.limit],
+                      load_shortlist(args.out), GENERATION_KWARGS)
+    print(json.dumps(report, indent=2))
+    if report["exact_match"] < args.min_exact:
+        print(f"❌ Only {report['exact_match']:.1%} of outputs match the full vocabulary")
+        return 1
+    print(f"✅ {report['exact_match']:.1%} of outputs match the full vocabulary ({report['speedup']}x)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())